@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-pass HMDB XML extractor against the XPath tree parser.
+
+Parses every cached HMDB XML file (data/hmdb_xml/*.xml by default) with both
+EnhancedHMDBLookup._parse_hmdb_xml_tree and EnhancedHMDBLookup._parse_hmdb_xml,
+checks that they produce the same information, and reports the timings.
+
+Without a cached corpus, --synthetic N generates N records with large spectra
+and protein_associations sections to benchmark on. --fields also times a
+LazyHMDBRecord that only reads the given fields, and checks that they match the
+full parse.
+
+Usage:
+    python src/benchmark_hmdb_xml_parser.py
+    python src/benchmark_hmdb_xml_parser.py --xml-dir data/hmdb_xml --repeat 3
+    python src/benchmark_hmdb_xml_parser.py --synthetic 200
+    python src/benchmark_hmdb_xml_parser.py --synthetic 200 --fields synonyms
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from enhanced_hmdb_lookup import EnhancedHMDBLookup, HMDB_XML_DIR
+from hmdb_lazy_record import LazyHMDBRecord
+from hmdb_xml_extractor import EXTRACTABLE_FIELDS, XML_BACKEND
+
+logger = logging.getLogger(__name__)
+
+
+def write_synthetic_corpus(directory: str, count: int) -> List[str]:
+    """
+    Write synthetic HMDB metabolite XML files shaped like real records.
+
+    Args:
+        directory (str): Directory to write the files to
+        count (int): Number of files
+
+    Returns:
+        List[str]: Paths of the written files
+    """
+    paths = []
+    for n in range(1, count + 1):
+        peaks = ''.join(
+            f'<peak><id>{i}</id><mass-charge>{i * 1.5}</mass-charge><intensity>{i}</intensity></peak>'
+            for i in range(300)
+        )
+        spectra = ''.join(
+            f'<spectrum><type>Specdb::MsMs</type><spectrum_id>{i}</spectrum_id><peaks>{peaks}</peaks></spectrum>'
+            for i in range(10)
+        )
+        proteins = ''.join(
+            f'<protein><protein_accession>HMDBP{i:05d}</protein_accession><name>Enzyme {i}</name>'
+            f'<description>Enzyme description {i}</description><gene_name>GENE{i}</gene_name></protein>'
+            for i in range(100)
+        )
+        xml = (
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<metabolite>'
+            f'<accession>HMDB{n:07d}</accession><name>Metabolite {n}</name>'
+            f'<description>Description of metabolite {n}.</description>'
+            f'<synonyms>' + ''.join(f'<synonym>1,{i}-Synonym-{n}</synonym>' for i in range(40)) + '</synonyms>'
+            f'<chemical_formula>C6H12O6</chemical_formula><average_molecular_weight>180.16</average_molecular_weight>'
+            f'<monisotopic_molecular_weight>180.06</monisotopic_molecular_weight><iupac_name>Name {n}</iupac_name>'
+            f'<traditional_iupac>Trad {n}</traditional_iupac><cas_registry_number>50-99-7</cas_registry_number>'
+            f'<smiles>OCC1OC(O)C(O)C(O)C1O</smiles><inchi>InChI=1S/C6H12O6</inchi><inchikey>WQZGKKKJIJFFOK</inchikey>'
+            f'<taxonomy><description>Taxonomy {n}</description><direct_parent>Hexoses</direct_parent>'
+            f'<kingdom>Organic compounds</kingdom><super_class>Organic oxygen compounds</super_class>'
+            f'<class>Organooxygen compounds</class><sub_class>Carbohydrates</sub_class>'
+            f'<molecular_framework>Aliphatic heteromonocyclic compounds</molecular_framework></taxonomy>'
+            f'<state>Solid</state><spectra>{spectra}</spectra>'
+            f'<biological_properties><cellular_locations><cellular>Cytoplasm</cellular></cellular_locations>'
+            f'<biospecimen_locations><biospecimen>Blood</biospecimen><biospecimen>Urine</biospecimen></biospecimen_locations>'
+            f'<tissue_locations><tissue>Liver</tissue></tissue_locations>'
+            f'<pathways><pathway><name>Glycolysis</name><smpdb_id>SMP00040</smpdb_id><kegg_map_id>map00010</kegg_map_id>'
+            f'</pathway></pathways>'
+            f'</biological_properties><kegg_id>C{n:05d}</kegg_id><chebi_id>{n + 15000}</chebi_id>'
+            f'<pubchem_compound_id>{n + 1000}</pubchem_compound_id>'
+            f'<ontology><root><term>Physiological effect</term><descendants><descendant><term>Health effect</term>'
+            f'<synonyms><synonym>Ontology synonym {n}</synonym></synonyms></descendant></descendants></root></ontology>'
+            f'<protein_associations>{proteins}</protein_associations></metabolite>\n'
+        )
+        path = os.path.join(directory, f"HMDB{n:07d}_raw.xml")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(xml)
+        paths.append(path)
+    return paths
+
+
+def time_parser(parse: Callable, paths: List[str], repeat: int) -> float:
+    """Best total time, over repeat runs, to parse every file."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            parse(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    parser = argparse.ArgumentParser(description="Benchmark the HMDB XML parsers.")
+    parser.add_argument("--xml-dir", default=HMDB_XML_DIR, help="Directory with cached HMDB XML files")
+    parser.add_argument("--limit", type=int, help="Only use the first N files")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per parser; the best run is reported")
+    parser.add_argument("--synthetic", type=int, help="Benchmark on N generated records instead of the cache")
+    parser.add_argument("--fields", nargs="+", choices=EXTRACTABLE_FIELDS, metavar="FIELD",
+                       help="Also time lazy records that only read these fields")
+    args = parser.parse_args()
+
+    lookup = EnhancedHMDBLookup(record_store=None)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.synthetic:
+            paths = write_synthetic_corpus(temp_dir, args.synthetic)
+        else:
+            paths = sorted(glob.glob(os.path.join(args.xml_dir, '*.xml')))
+        if args.limit:
+            paths = paths[:args.limit]
+        if not paths:
+            logger.error(f"No HMDB XML files found in {args.xml_dir}; use --synthetic N to generate some")
+            return 1
+
+        total_mb = sum(os.path.getsize(path) for path in paths) / 1e6
+        logger.info(f"Corpus: {len(paths)} files, {total_mb:.1f} MB; single-pass backend: {XML_BACKEND}")
+
+        mismatches = [path for path in paths if lookup._parse_hmdb_xml(path) != lookup._parse_hmdb_xml_tree(path)]
+        for path in mismatches[:10]:
+            logger.warning(f"Parsers disagree on {path}")
+
+        timings = [
+            ('XPath tree', time_parser(lookup._parse_hmdb_xml_tree, paths, args.repeat)),
+            ('Single pass', time_parser(lookup._parse_hmdb_xml, paths, args.repeat))
+        ]
+        if args.fields:
+            def read_fields(path: str) -> LazyHMDBRecord:
+                record = LazyHMDBRecord(path, Path(path).read_bytes, lookup._finalize_hmdb_info)
+                record.load(*args.fields)
+                return record
+
+            # The lazy record must give the same values as the full parse for the fields it reads
+            for path in paths:
+                full = lookup._parse_hmdb_xml(path)
+                record = read_fields(path)
+                if any(record.get(field) != full.get(field) for field in args.fields):
+                    logger.warning(f"Lazy record of {path} disagrees with the full parse on {args.fields}")
+                    mismatches.append(path)
+            timings.append((f"Lazy ({', '.join(args.fields)})", time_parser(read_fields, paths, args.repeat)))
+        tree_time, single_time = timings[0][1], timings[1][1]
+
+    logger.info(f"{'Parser':<30}{'Total (s)':>12}{'Per file (ms)':>16}{'MB/s':>10}")
+    for name, elapsed in timings:
+        logger.info(f"{name:<30}{elapsed:>12.3f}{elapsed / len(paths) * 1000:>16.2f}{total_mb / elapsed:>10.1f}")
+    logger.info(f"Speedup: {tree_time / single_time:.2f}x")
+    logger.info(f"Identical output: {len(paths) - len(set(mismatches))}/{len(paths)} files")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
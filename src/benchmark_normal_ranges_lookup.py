@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark the indexed normal ranges lookups of metabolite_hmdb_lookup.
+
+Generates a normal ranges CSV with --rows rows (100,000 by default), then times
+get_metabolite_info_by_hmdb_id, get_metabolite_name_from_hmdb_id and
+get_hmdb_id_from_name against the boolean-mask scans they used to run on every
+call, and checks that both return the same results.
+
+Usage:
+    python src/benchmark_normal_ranges_lookup.py
+    python src/benchmark_normal_ranges_lookup.py --rows 100000 --lookups 500
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+import metabolite_hmdb_lookup as lookup
+
+logger = logging.getLogger(__name__)
+
+
+def write_normal_ranges_csv(path: str, rows: int) -> None:
+    """
+    Write a synthetic normal ranges CSV.
+
+    Every tenth row lists several space-separated HMDB IDs, as summed panels do.
+
+    Args:
+        path (str): Path of the CSV file
+        rows (int): Number of rows
+    """
+    hmdb_values = []
+    for n in range(rows):
+        if n % 10 == 9:
+            hmdb_values.append(f"HMDB{n:07d} HMDB{n + rows:07d} HMDB{n + 2 * rows:07d}")
+        else:
+            hmdb_values.append(f"HMDB{n:07d}")
+    df = pd.DataFrame({
+        'chemical_name': [f"Metabolite {n}" for n in range(rows)],
+        'hmdb': hmdb_values,
+        'low_level': [n * 0.01 for n in range(rows)],
+        'high_level': [n * 0.02 for n in range(rows)],
+        'sd': [None] * rows,
+        'reference': [''] * rows
+    })
+    df.to_csv(path, index=False)
+
+
+def scan_info_by_hmdb_id(df: pd.DataFrame, hmdb_id: str) -> Dict[str, Any]:
+    """The lookup get_metabolite_info_by_hmdb_id used to run: a full boolean-mask scan."""
+    if not lookup.is_valid_hmdb_id(hmdb_id):
+        return {}
+    matches = df[df['hmdb'] == hmdb_id]
+    if matches.empty:
+        return {}
+    info = matches.iloc[0].to_dict()
+    for key, value in info.items():
+        if pd.isna(value):
+            info[key] = None
+    return info
+
+
+def scan_name_from_hmdb_id(df: pd.DataFrame, hmdb_id: str) -> Optional[str]:
+    """The lookup get_metabolite_name_from_hmdb_id used to run."""
+    if not lookup.is_valid_hmdb_id(hmdb_id):
+        return None
+    matches = df[df['hmdb'] == hmdb_id]
+    return None if matches.empty else matches.iloc[0]['chemical_name']
+
+
+def scan_hmdb_id_from_name(df: pd.DataFrame, name: str) -> Optional[str]:
+    """The lookup get_hmdb_id_from_name used to run: lowercases the whole column on every call."""
+    matches = df[df['chemical_name'].str.lower() == name.strip().lower()]
+    if matches.empty:
+        return None
+    hmdb_id = matches.iloc[0]['hmdb']
+    return hmdb_id if lookup.is_valid_hmdb_id(hmdb_id) else None
+
+
+def time_lookups(function: Callable, keys: List[str]) -> tuple:
+    """Time one call per key; returns (seconds, results)."""
+    start = time.perf_counter()
+    results = [function(key) for key in keys]
+    return time.perf_counter() - start, results
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    # Multi-ID rows are expected to fail the name lookup's ID validation
+    logging.getLogger(lookup.__name__).setLevel(logging.ERROR)
+
+    parser = argparse.ArgumentParser(description="Benchmark the indexed normal ranges lookups.")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows in the generated CSV")
+    parser.add_argument("--lookups", type=int, default=200, help="Lookups per function")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the looked-up keys")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    positions = [rng.randrange(args.rows) for _ in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = os.path.join(temp_dir, 'normal_ranges.csv')
+        write_normal_ranges_csv(csv_path, args.rows)
+
+        lookup.clear_cache()
+        df = lookup._load_normal_ranges_csv(csv_path)
+        start = time.perf_counter()
+        lookup._load_normal_ranges_index(csv_path)
+        index_time = time.perf_counter() - start
+
+        ids = [df['hmdb'].iat[position] for position in positions]
+        names = [f"  metabolite {position}" for position in positions]
+        member_ids = [f"HMDB{position + args.rows:07d}" for position in positions]
+
+        cases = [
+            ('info by HMDB ID', ids,
+             lambda key: scan_info_by_hmdb_id(df, key),
+             lambda key: lookup.get_metabolite_info_by_hmdb_id(key, csv_path)),
+            ('name by HMDB ID', ids,
+             lambda key: scan_name_from_hmdb_id(df, key),
+             lambda key: lookup.get_metabolite_name_from_hmdb_id(key, csv_path)),
+            ('HMDB ID by name', names,
+             lambda key: scan_hmdb_id_from_name(df, key),
+             lambda key: lookup.get_hmdb_id_from_name(key, csv_path)),
+        ]
+
+        logger.info(f"Table: {args.rows} rows; index built in {index_time * 1000:.1f} ms")
+        logger.info(f"{'Lookup':<18}{'Scan (us)':>12}{'Index (us)':>12}{'Speedup':>10}{'Identical':>11}")
+        identical = True
+        for name, keys, scan, indexed in cases:
+            scan_time, scan_results = time_lookups(scan, keys)
+            index_time, index_results = time_lookups(indexed, keys)
+            same = scan_results == index_results
+            identical = identical and same
+            logger.info(f"{name:<18}{scan_time / len(keys) * 1e6:>12.1f}{index_time / len(keys) * 1e6:>12.1f}"
+                        f"{scan_time / index_time:>9.0f}x{str(same):>11}")
+
+        found = sum(1 for key in member_ids if lookup.find_metabolites_by_hmdb_id(key, csv_path))
+        logger.info(f"IDs only listed in multi-ID rows found by find_metabolites_by_hmdb_id: "
+                    f"{found}/{len(member_ids)} (expected {sum(1 for p in positions if p % 10 == 9)})")
+
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
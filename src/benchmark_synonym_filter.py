@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark the compiled synonym filter against the original implementation.
+
+Generates --records synonym lists of up to --max-synonyms synonyms each, a mix of
+chemical names and terms the filter rejects, then times the per-synonym
+substring and regex checks that _filter_chemical_synonyms used to run against
+SynonymFilter.filter and SynonymFilter.filter_many, and checks that all of them
+produce the same lists.
+
+Usage:
+    python src/benchmark_synonym_filter.py
+    python src/benchmark_synonym_filter.py --records 5000 --max-synonyms 400
+"""
+
+import argparse
+import logging
+import random
+import re
+import sys
+import time
+from typing import List
+
+from synonym_filter import CHEMICAL_SYNONYM_FILTER, SKIP_TERMS
+
+logger = logging.getLogger(__name__)
+
+CHEMICAL_PATTERNS = [
+    r'\d+,\d+-', r'-\w+ane\b', r'-\w+ene\b', r'-\w+ol\b', r'-\w+one\b', r'-\w+acid\b', r'-\w+amine\b',
+    r'\([A-Z]\d+\)', r'[A-Z]\d+[A-Z]\d+', r'\b[A-Z][a-z]?\d*\b', r'alpha-|beta-|gamma-|delta-',
+    r'\bcis-|\btrans-|\bmeta-|\bpara-|\bortho-'
+]
+
+NAME_PARTS = ['methyl', 'ethyl', 'propyl', 'butyl', 'hydroxy', 'amino', 'oxo', 'phenyl', 'glucose',
+              'acetic acid', 'ethanol', 'propanone', 'C6H12O6', 'alpha-', 'trans-', 'L-', 'D-', '(S)-']
+
+
+def original_filter(synonyms: List[str]) -> List[str]:
+    """_filter_chemical_synonyms as it was before the rules were compiled."""
+    if not synonyms:
+        return []
+    filtered = []
+    for syn in synonyms:
+        if not syn or len(syn) < 2 or len(syn) > 100:
+            continue
+        if any(pattern in syn.lower() for pattern in SKIP_TERMS):
+            continue
+        if any(re.search(pattern, syn) for pattern in CHEMICAL_PATTERNS) or not any(pattern in syn.lower() for pattern in SKIP_TERMS):
+            filtered.append(syn)
+    return filtered[:20]
+
+
+def generate_synonym_lists(records: int, max_synonyms: int, seed: int) -> List[List[str]]:
+    """
+    Generate synonym lists shaped like those of HMDB records.
+
+    Args:
+        records (int): Number of lists
+        max_synonyms (int): Maximum synonyms per list
+        seed (int): Random seed
+
+    Returns:
+        List[List[str]]: Synonym lists
+    """
+    rng = random.Random(seed)
+    skip_terms = sorted(SKIP_TERMS)
+    lists = []
+    for _ in range(records):
+        synonyms = []
+        for _ in range(rng.randint(0, max_synonyms)):
+            name = ''.join(rng.choice(NAME_PARTS) for _ in range(rng.randint(1, 5)))
+            roll = rng.random()
+            if roll < 0.15:
+                name = f"{name} {rng.choice(skip_terms).title()}"
+            elif roll < 0.18:
+                name = name[:1]
+            elif roll < 0.2:
+                name = name * 20
+            synonyms.append(f"{rng.randint(1, 9)},{rng.randint(1, 9)}-{name}" if roll > 0.7 else name)
+        lists.append(synonyms)
+    return lists
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    parser = argparse.ArgumentParser(description="Microbenchmark the synonym filter.")
+    parser.add_argument("--records", type=int, default=2000, help="Number of synonym lists")
+    parser.add_argument("--max-synonyms", type=int, default=300, help="Maximum synonyms per list")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation; the best run is reported")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    lists = generate_synonym_lists(args.records, args.max_synonyms, args.seed)
+    total = sum(len(synonyms) for synonyms in lists)
+    logger.info(f"Corpus: {len(lists)} synonym lists, {total} synonyms")
+
+    implementations = [
+        ('Original', lambda: [original_filter(synonyms) for synonyms in lists]),
+        ('SynonymFilter.filter', lambda: [CHEMICAL_SYNONYM_FILTER.filter(synonyms) for synonyms in lists]),
+        ('SynonymFilter.filter_many', lambda: CHEMICAL_SYNONYM_FILTER.filter_many(lists)),
+    ]
+
+    results = {}
+    timings = {}
+    for name, run in implementations:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[name] = run()
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    baseline = timings['Original']
+    logger.info(f"{'Implementation':<28}{'Total (ms)':>12}{'Per list (us)':>15}{'Speedup':>10}")
+    for name, elapsed in timings.items():
+        logger.info(f"{name:<28}{elapsed * 1000:>12.1f}{elapsed / len(lists) * 1e6:>15.1f}{baseline / elapsed:>9.1f}x")
+
+    identical = all(result == results['Original'] for result in results.values())
+    logger.info(f"Identical output: {identical}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Check that merging enriched rows never alters cached PubChem compound data.
+
+Two HMDB IDs of one metabolite name are enriched and merged into the by-name
+output, as a run does. The first resolves to a CID without literature, the
+second to CID 222, which has one abstract. Merging the second row stores its
+literature list in the by-name entry and then extends that list in place.
+The check then verifies three things for CID 222: the per-CID entry of the
+enricher cache, the get_compound_data memo and a later get_pubchem_info still
+hold exactly the extracted compound data. Any list shared between a row and
+those caches shows up as duplicated abstracts.
+
+Runs offline against a synthetic PUG-View record, with a throwaway cache file.
+
+Usage:
+    python src/check_pubchem_cache_isolation.py
+"""
+
+import copy
+import logging
+import os
+import sys
+import tempfile
+from typing import Any, Dict
+
+from metabolite_data_enricher import MetaboliteDataEnricher, PUBCHEM_CID_CACHE_PREFIX
+from pubchem_data_retriever import PubChemRetriever, clear_compound_data_cache
+
+logger = logging.getLogger(__name__)
+
+# Constants
+CID = '222'
+METABOLITE_NAME = 'Synthetic metabolite'
+# HMDB ID -> PubChem CID of its cross-reference; only CID has literature
+HMDB_CIDS = {'HMDB0000001': '111', 'HMDB0000002': CID}
+
+
+def synthetic_pug_view_record(cid: str) -> Dict[str, Any]:
+    """A PUG-View record with one synonym and the computed properties, and one literature abstract for CID."""
+    literature = [
+        {'TOCHeading': 'NLM Curated PubMed Citations', 'Information': [
+            {'Reference': {'Title': 'A study', 'Author': ['A. Author'], 'PMID': '1'},
+             'Value': {'StringWithMarkup': [{'String': 'Abstract text.'}]}}
+        ]}
+    ] if cid == CID else []
+    return {
+        'Record': {
+            'RecordType': 'CID',
+            'RecordNumber': int(cid),
+            'RecordTitle': METABOLITE_NAME,
+            'Section': [
+                {'TOCHeading': 'Names and Identifiers', 'Section': [
+                    {'TOCHeading': 'Synonyms', 'Section': [
+                        {'TOCHeading': 'Depositor-Supplied Synonyms',
+                         'Information': [{'Value': {'StringWithMarkup': [{'String': METABOLITE_NAME}]}}]}
+                    ]}
+                ]},
+                {'TOCHeading': 'Chemical and Physical Properties', 'Section': [
+                    {'TOCHeading': 'Computed Properties', 'Information': [
+                        {'Name': 'Molecular Weight', 'Value': {'String': '180.16'}},
+                        {'Name': 'Molecular Formula', 'Value': {'String': 'C6H12O6'}}
+                    ]}
+                ]},
+                {'TOCHeading': 'Literature', 'Section': literature}
+            ]
+        }
+    }
+
+
+def seed_hmdb_entry(enricher: MetaboliteDataEnricher, hmdb_id: str, cid: str) -> None:
+    """Cache a successful HMDB entry whose cross-reference gives the CID, so nothing is downloaded."""
+    enricher.cache[hmdb_id] = {
+        'hmdb_id': hmdb_id,
+        'synonyms': [],
+        'chemical_classes': [],
+        'description': '',
+        'pubchem_cid': cid,
+        'source': 'HMDB',
+        'success': True
+    }
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for name in ('metabolite_data_enricher', 'pubchem_data_retriever'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    PubChemRetriever._load_record = lambda self, cid: synthetic_pug_view_record(cid)
+    clear_compound_data_cache()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        enricher = MetaboliteDataEnricher(cache_file=os.path.join(temp_dir, 'cache.pkl'))
+        for hmdb_id, cid in HMDB_CIDS.items():
+            seed_hmdb_entry(enricher, hmdb_id, cid)
+
+        expected_data = PubChemRetriever().get_compound_data(CID)
+        enriched_data = {}
+        enriched_data_by_name = {METABOLITE_NAME: {'metabolite_name': METABOLITE_NAME, 'hmdb_id_list': []}}
+        for hmdb_id, cid in HMDB_CIDS.items():
+            enriched_metabolite = enricher.enrich_metabolite(hmdb_id, METABOLITE_NAME)
+            if cid == CID:
+                expected_entry = copy.deepcopy(enricher.cache[f"{PUBCHEM_CID_CACHE_PREFIX}{CID}"])
+            enricher._merge_enriched_metabolite(enriched_data, enriched_data_by_name, METABOLITE_NAME,
+                                                hmdb_id, enriched_metabolite, {})
+
+        failures = []
+        if enricher.cache[f"{PUBCHEM_CID_CACHE_PREFIX}{CID}"] != expected_entry:
+            failures.append("the per-CID entry of the enricher cache")
+        if PubChemRetriever().get_compound_data(CID) != expected_data:
+            failures.append("the get_compound_data memo")
+        abstracts = enricher.get_pubchem_info(METABOLITE_NAME, 'HMDB0000002')['literature_abstracts']
+        if len(abstracts) != len(expected_data['literature']):
+            failures.append(f"get_pubchem_info ({len(abstracts)} abstracts instead of {len(expected_data['literature'])})")
+
+    for failure in failures:
+        logger.error(f"Merging two rows with CID {CID} altered {failure}")
+    if not failures:
+        logger.info(f"Cached PubChem data of CID {CID} is unchanged after merging {len(HMDB_CIDS)} rows")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,23 @@
 Enhanced HMDB lookup wrapper class for metabolite data enrichment.
 """
 
+import io
 import logging
 import os
-import re
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import IO, Collection, Dict, Any, Optional, List, Tuple, Union
 from bs4 import BeautifulSoup
+from service_limits import service_call, HMDB_HOST
+from hmdb_record_store import HMDB_STORE_FILE, open_record_store
+from hmdb_xml_extractor import extract_hmdb_fields
+from hmdb_parsed_cache import HMDB_PARSED_CACHE_FILE, ParsedRecordCache
+from hmdb_xml_pack import HMDB_XML_PACK_FILE, open_xml_pack
+from synonym_filter import CHEMICAL_SYNONYM_FILTER
+from hmdb_lazy_record import LazyHMDBRecord
 from metabolite_hmdb_lookup import (
     get_hmdb_id_from_name,
     get_metabolite_name_from_hmdb_id,
@@ -23,23 +32,79 @@ logger = logging.getLogger(__name__)
 HMDB_XML_DIR = 'data/hmdb_xml'
 HMDB_CACHE_DIR = 'data/hmdb_cache'
 HMDB_BASE_URL = 'https://hmdb.ca/metabolites'
+HMDB_TIMEOUT = (10, 60)  # (connect, read) timeouts in seconds for HMDB downloads
+DEFAULT_POOL_SIZE = 2
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Bytes written per chunk while streaming a download
 
 class EnhancedHMDBLookup:
     """Wrapper class for HMDB lookup functionality with XML support."""
 
-    def __init__(self, csv_file: str = "src/input/normal_ranges_with_all_HMDB_IDs.csv"):
+    def __init__(self, csv_file: str = "src/input/normal_ranges_with_all_HMDB_IDs.csv",
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout: Tuple[float, float] = HMDB_TIMEOUT,
+                 record_store: Optional[str] = HMDB_STORE_FILE,
+                 parsed_cache: Optional[str] = HMDB_PARSED_CACHE_FILE,
+                 xml_pack: Optional[str] = HMDB_XML_PACK_FILE):
+        """
+        Initialize the lookup.
+
+        The instance is meant to be long-lived and shared between threads, so that
+        downloads reuse keep-alive connections to hmdb.ca.
+
+        Args:
+            csv_file (str): Path to the normal ranges CSV file
+            pool_size (int): Maximum number of idle connections kept open to HMDB
+            timeout (Tuple[float, float]): (connect, read) timeouts in seconds for downloads
+            record_store (Optional[str]): Record store built from the HMDB dump, read before
+                                          downloading (see hmdb_record_store); None to disable
+            parsed_cache (Optional[str]): Cache of parsed XML files (see hmdb_parsed_cache); None to disable
+            xml_pack (Optional[str]): Packed XML archive (see hmdb_xml_pack), used instead of per-ID
+                                      XML files once it has been created; None to disable
+        """
         self.csv_file = csv_file
         self.cache: Dict[str, Any] = {}
+        self.timeout = timeout
+        self.record_store = open_record_store(record_store) if record_store else None
+        self.parsed_cache = ParsedRecordCache(parsed_cache) if parsed_cache else None
+        self.xml_pack = open_xml_pack(xml_pack) if xml_pack else None
+        self.requests_made = 0
+        self._stats_lock = threading.Lock()
         
         # Create necessary directories
         os.makedirs(HMDB_XML_DIR, exist_ok=True)
         os.makedirs(HMDB_CACHE_DIR, exist_ok=True)
         
-        # Set up session for downloads
+        # Set up a pooled session for downloads
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Metabolite Research Tool) AppleWebKit/537.36'
         })
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+    def save_parsed_cache(self) -> None:
+        """Write newly parsed XML records to the parsed record cache."""
+        if self.parsed_cache is not None:
+            self.parsed_cache.save()
+
+    def get_request_stats(self) -> Dict[str, int]:
+        """
+        Get download statistics, to confirm that connections are being reused.
+
+        Returns:
+            Dict[str, int]: Requests made, connections opened, and requests served on a reused connection
+        """
+        connections = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        return {
+            'requests': self.requests_made,
+            'connections_opened': connections,
+            'connections_reused': max(0, self.requests_made - connections)
+        }
 
     def get_hmdb_id(self, metabolite_name: str) -> Optional[str]:
         """Get HMDB ID for a metabolite name."""
@@ -49,10 +114,16 @@ class EnhancedHMDBLookup:
         """Get metabolite name for an HMDB ID."""
         return get_metabolite_name_from_hmdb_id(hmdb_id, self.csv_file)
 
-    def get_hmdb_info(self, hmdb_id: str) -> Dict[str, Any]:
+    def get_hmdb_info(self, hmdb_id: str, fields: Optional[Collection[str]] = None) -> Dict[str, Any]:
         """
         Get comprehensive metabolite information by HMDB ID.
         First checks local XML file, downloads if not present.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            fields (Optional[Collection[str]]): Only parse these XML fields (see
+                hmdb_xml_extractor.EXTRACTABLE_FIELDS), for callers that need a few
+                of them; all fields by default
         """
         try:
             # Initialize result with success flag
@@ -66,6 +137,14 @@ class EnhancedHMDBLookup:
                 result.update(basic_info)
             
             # Then enrich with XML data
+            if fields is not None:
+                record = self.get_hmdb_record(hmdb_id)
+                if record is not None:
+                    record.load(*fields)
+                    result.update((field, record[field]) for field in fields if field in record)
+                    result['hmdb_success'] = True
+                return result
+
             xml_info = self._get_hmdb_xml_info(hmdb_id)
             if xml_info:
                 result.update(xml_info)
@@ -77,6 +156,43 @@ class EnhancedHMDBLookup:
             logger.error(f"Error getting metabolite info for {hmdb_id}: {e}")
             return {'hmdb_success': False}
 
+    def get_hmdb_record(self, hmdb_id: str) -> Optional[LazyHMDBRecord]:
+        """
+        Get a lazy record of an HMDB ID, whose fields are only parsed when read.
+
+        Uses the same sources as _get_hmdb_xml_info (record store, XML pack, XML
+        file, download). A fully parsed record in the parsed record cache is
+        reused as is.
+
+        Args:
+            hmdb_id (str): HMDB ID
+
+        Returns:
+            Optional[LazyHMDBRecord]: The record, or None if its XML is not available
+        """
+        try:
+            if not self._has_local_xml(hmdb_id):
+                if self._download_hmdb_xml(hmdb_id) is None:
+                    return None
+
+            if self.record_store is not None and self.record_store.resolve(hmdb_id):
+                return LazyHMDBRecord(hmdb_id, lambda: self.record_store.get_xml(hmdb_id), self._finalize_hmdb_info)
+
+            if self.xml_pack is not None and hmdb_id in self.xml_pack:
+                cached = None
+                if self.parsed_cache is not None:
+                    cached = self.parsed_cache.get(f"{self.xml_pack.path}#{hmdb_id}",
+                                                   fingerprint=self.xml_pack.get_location(hmdb_id))
+                return LazyHMDBRecord(hmdb_id, lambda: self.xml_pack.get_xml(hmdb_id), self._finalize_hmdb_info, cached)
+
+            xml_path = self._get_hmdb_xml_path(hmdb_id)
+            cached = self.parsed_cache.get(xml_path) if self.parsed_cache is not None else None
+            return LazyHMDBRecord(hmdb_id, lambda: Path(xml_path).read_bytes(), self._finalize_hmdb_info, cached)
+
+        except Exception as e:
+            logger.error(f"Error getting HMDB record for {hmdb_id}: {e}")
+            return None
+
     def get_diet_advice(self, hmdb_id: str, status: str) -> Dict[str, Any]:
         """Get diet advice by HMDB ID and status."""
         return get_diet_advice_by_hmdb_id(hmdb_id, status)
@@ -84,50 +200,129 @@ class EnhancedHMDBLookup:
     def _get_hmdb_xml_info(self, hmdb_id: str) -> Dict[str, Any]:
         """
         Get metabolite information from HMDB XML file.
-        Downloads XML if not present locally.
+        Reads the local record store first, then the XML pack or the per-ID XML
+        file, and downloads the XML if none of them has it.
         """
         try:
-            xml_path = self._get_hmdb_xml_path(hmdb_id)
-            
+            if self.record_store is not None:
+                xml = self.record_store.get_xml(hmdb_id)
+                if xml is not None:
+                    return self._parse_hmdb_xml(io.BytesIO(xml))
+
             # Download XML if not present
-            if not os.path.exists(xml_path):
-                if not self._download_hmdb_xml(hmdb_id):
+            if not self._has_local_xml(hmdb_id):
+                if self._download_hmdb_xml(hmdb_id) is None:
                     return {}
+
+            if self.xml_pack is not None and hmdb_id in self.xml_pack:
+                return self._get_packed_xml_info(hmdb_id)
+
+            xml_path = self._get_hmdb_xml_path(hmdb_id)
             
+            # Reuse the parsed record while the file and the parser are unchanged
+            if self.parsed_cache is not None:
+                info = self.parsed_cache.get(xml_path)
+                if info is not None:
+                    return info
+
             # Parse XML and extract information
-            return self._parse_hmdb_xml(xml_path)
+            info = self._parse_hmdb_xml(xml_path)
+            if info and self.parsed_cache is not None:
+                self.parsed_cache.put(xml_path, info)
+            return info
             
         except Exception as e:
             logger.error(f"Error getting HMDB XML info for {hmdb_id}: {e}")
             return {}
 
+    def _get_packed_xml_info(self, hmdb_id: str) -> Dict[str, Any]:
+        """Parse a record of the XML pack, reusing its parsed record while it is unchanged."""
+        key = f"{self.xml_pack.path}#{hmdb_id}"
+        location = self.xml_pack.get_location(hmdb_id)
+        if self.parsed_cache is not None:
+            info = self.parsed_cache.get(key, fingerprint=location)
+            if info is not None:
+                return info
+
+        info = self._parse_hmdb_xml(io.BytesIO(self.xml_pack.get_xml(hmdb_id)))
+        if info and self.parsed_cache is not None:
+            self.parsed_cache.put(key, info, fingerprint=location)
+        return info
+
+    def _has_local_xml(self, hmdb_id: str) -> bool:
+        """Check whether the XML of an ID can be read without downloading it."""
+        if self.record_store is not None and self.record_store.resolve(hmdb_id):
+            return True
+        if self.xml_pack is not None and hmdb_id in self.xml_pack:
+            return True
+        return os.path.exists(self._get_hmdb_xml_path(hmdb_id))
+
     def _get_hmdb_xml_path(self, hmdb_id: str) -> str:
         """Get path to HMDB XML file for given ID."""
         return os.path.join(HMDB_XML_DIR, f"{hmdb_id}_raw.xml")
 
-    def _download_hmdb_xml(self, hmdb_id: str) -> bool:
+    def _download_hmdb_xml(self, hmdb_id: str) -> Optional[int]:
         """
         Download HMDB XML file for given ID.
-        Returns True if successful, False otherwise.
+
+        The body is streamed to a temporary file in chunks and renamed into place,
+        so a large record is never held in memory and an interrupted download
+        never leaves a truncated XML file behind. Once an XML pack exists, the
+        file is added to the pack instead.
+
+        Args:
+            hmdb_id (str): HMDB ID
+
+        Returns:
+            Optional[int]: Number of bytes written, or None if the download failed
         """
+        xml_path = self._get_hmdb_xml_path(hmdb_id)
+        temp_file = f"{xml_path}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
             xml_url = f"{HMDB_BASE_URL}/{hmdb_id}.xml"
-            response = self.session.get(xml_url)
-            response.raise_for_status()
-            
-            xml_path = self._get_hmdb_xml_path(hmdb_id)
-            with open(xml_path, 'wb') as f:
-                f.write(response.content)
+            size = 0
+            with service_call(HMDB_HOST):
+                with self._stats_lock:
+                    self.requests_made += 1
+                with self.session.get(xml_url, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+                    with open(temp_file, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            size += len(chunk)
+
+            if self.xml_pack is not None:
+                self.xml_pack.add_file(hmdb_id, temp_file)
+                os.remove(temp_file)
+            else:
+                os.replace(temp_file, xml_path)
             
-            logger.info(f"Downloaded HMDB XML for {hmdb_id}")
-            return True
+            logger.info(f"Downloaded HMDB XML for {hmdb_id} ({size} bytes)")
+            return size
             
         except Exception as e:
             logger.error(f"Error downloading HMDB XML for {hmdb_id}: {e}")
-            return False
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            return None
+
+    def _parse_hmdb_xml(self, xml_path: Union[str, IO[bytes]]) -> Dict[str, Any]:
+        """Parse HMDB XML file (or an open file object) and extract relevant information."""
+        try:
+            # Collect every field in a single streaming pass over the document
+            return self._finalize_hmdb_info(extract_hmdb_fields(xml_path))
+
+        except Exception as e:
+            logger.error(f"Error parsing HMDB XML {xml_path}: {e}")
+            return {}
 
-    def _parse_hmdb_xml(self, xml_path: str) -> Dict[str, Any]:
-        """Parse HMDB XML file and extract relevant information."""
+    def _parse_hmdb_xml_tree(self, xml_path: Union[str, IO[bytes]]) -> Dict[str, Any]:
+        """
+        Parse HMDB XML file with one XPath search per field.
+
+        Superseded by the single-pass extractor used in _parse_hmdb_xml; kept as the
+        reference implementation for benchmark_hmdb_xml_parser.py.
+        """
         try:
             tree = ET.parse(xml_path)
             root = tree.getroot()
@@ -135,7 +330,8 @@ class EnhancedHMDBLookup:
             # Extract basic information
             info = {
                 'description': self._get_xml_text(root, './/description'),
-                'synonyms': self._filter_chemical_synonyms(self._get_xml_list(root, './/synonyms/synonym')),
+                # Only the metabolite's own synonyms; <ontology> terms have <synonyms> of their own
+                'synonyms': self._get_xml_list(root, './synonyms/synonym'),
                 'chemical_formula': self._get_xml_text(root, './/chemical_formula'),
                 'average_molecular_weight': self._get_xml_text(root, './/average_molecular_weight'),
                 'monisotopic_molecular_weight': self._get_xml_text(root, './/monisotopic_molecular_weight'),
@@ -146,6 +342,9 @@ class EnhancedHMDBLookup:
                 'inchi': self._get_xml_text(root, './/inchi'),
                 'inchikey': self._get_xml_text(root, './/inchikey'),
                 'state': self._get_xml_text(root, './/state'),
+                'pubchem_compound_id': self._get_xml_text(root, 'pubchem_compound_id'),
+                'chebi_id': self._get_xml_text(root, 'chebi_id'),
+                'kegg_id': self._get_xml_text(root, 'kegg_id'),
                 'taxonomy': {
                     'description': self._get_xml_text(root, './/taxonomy/description'),
                     'direct_parent': self._get_xml_text(root, './/taxonomy/direct_parent'),
@@ -160,32 +359,36 @@ class EnhancedHMDBLookup:
                     'biospecimen_locations': self._get_xml_list(root, './/biospecimen_locations/biospecimen'),
                     'tissue_locations': self._get_xml_list(root, './/tissue_locations/tissue'),
                     'pathways': self._get_xml_list(root, './/pathways/pathway/name')
-                },
-                # Extract chemical classes from taxonomy
-                'chemical_classes': []
+                }
             }
-            
-            # Build chemical classes from taxonomy
-            taxonomy = info.get('taxonomy', {})
-            for class_type in ['direct_parent', 'sub_class', 'class', 'super_class', 'kingdom']:
-                if class_type in taxonomy and taxonomy[class_type]:
-                    info['chemical_classes'].append(taxonomy[class_type])
-            
-            # Clean up empty values
-            info = {k: v for k, v in info.items() if v}
-            if 'taxonomy' in info and not any(info['taxonomy'].values()):
-                del info['taxonomy']
-            if 'biological_properties' in info and not any(info['biological_properties'].values()):
-                del info['biological_properties']
-            if 'chemical_classes' in info and not info['chemical_classes']:
-                del info['chemical_classes']
-            
-            return info
+            return self._finalize_hmdb_info(info)
             
         except Exception as e:
             logger.error(f"Error parsing HMDB XML {xml_path}: {e}")
             return {}
 
+    def _finalize_hmdb_info(self, info: Dict[str, Any]) -> Dict[str, Any]:
+        """Filter the synonyms, derive the chemical classes and drop empty values from raw XML fields."""
+        info['synonyms'] = self._filter_chemical_synonyms(info.get('synonyms', []))
+
+        # Build chemical classes from taxonomy
+        info['chemical_classes'] = []
+        taxonomy = info.get('taxonomy', {})
+        for class_type in ['direct_parent', 'sub_class', 'class', 'super_class', 'kingdom']:
+            if class_type in taxonomy and taxonomy[class_type]:
+                info['chemical_classes'].append(taxonomy[class_type])
+        
+        # Clean up empty values
+        info = {k: v for k, v in info.items() if v}
+        if 'taxonomy' in info and not any(info['taxonomy'].values()):
+            del info['taxonomy']
+        if 'biological_properties' in info and not any(info['biological_properties'].values()):
+            del info['biological_properties']
+        if 'chemical_classes' in info and not info['chemical_classes']:
+            del info['chemical_classes']
+        
+        return info
+
     def _get_xml_text(self, root: ET.Element, xpath: str) -> str:
         """Get text content of first matching XML element."""
         try:
@@ -210,60 +413,6 @@ class EnhancedHMDBLookup:
             synonyms: List of potential synonyms to filter
         
         Returns:
-            List of filtered chemical synonyms
+            List of filtered chemical synonyms (at most 20, see synonym_filter)
         """
-        if not synonyms:
-            return []
-        
-        filtered = []
-        
-        # Skip patterns that indicate non-synonym content
-        skip_patterns = {
-            # Taxonomic terms
-            'flora', 'fauna', 'kingdom', 'class', 'family', 'species', 'genus',
-            'gramineae', 'papilionoideae', 'legume', 'soy', 'cucurbits', 'gourds',
-            # Medical/biological terms
-            'disease', 'leukaemia', 'digestion', 'stool', 'fecal', 'faecal', 'faeces',
-            'cytoplasm', 'cytoplasma', 'cell', 'tissue', 'organ', 'enzyme', 'protein',
-            # General descriptive terms
-            'extract', 'powder', 'liquid', 'solution', 'mixture', 'derivative',
-            'sample', 'preparation', 'fraction', 'component',
-            # Locations/sources
-            'plant', 'animal', 'human', 'bacterial', 'fungal', 'tissue', 'blood', 'urine',
-            'serum', 'plasma', 'saliva', 'cerebrospinal', 'csf',
-            # Process terms
-            'metabolism', 'synthesis', 'degradation', 'pathway', 'cycle',
-            # Biological roles/effects
-            'inhibitor', 'activator', 'substrate', 'cofactor', 'vitamin',
-            'hormone', 'neurotransmitter', 'receptor', 'enzyme'
-        }
-        
-        # Look for patterns that suggest a chemical name
-        chemical_patterns = [
-            r'\d+,\d+-',  # e.g., 1,3-
-            r'-\w+ane\b',  # e.g., -ethane, -propane
-            r'-\w+ene\b',  # e.g., -ethene, -propene
-            r'-\w+ol\b',   # e.g., -ethanol, -propanol
-            r'-\w+one\b',  # e.g., -ethanone, -propanone
-            r'-\w+acid\b', # e.g., -acetic acid
-            r'-\w+amine\b', # e.g., -ethylamine
-            r'\([A-Z]\d+\)', # e.g., (C4)
-            r'[A-Z]\d+[A-Z]\d+', # e.g., C6H12
-            r'\b[A-Z][a-z]?\d*\b', # Chemical symbols
-            r'alpha-|beta-|gamma-|delta-', # Greek letter prefixes
-            r'\bcis-|\btrans-|\bmeta-|\bpara-|\bortho-' # Chemical prefixes
-        ]
-        
-        for syn in synonyms:
-            if not syn or len(syn) < 2 or len(syn) > 100:
-                continue
-                
-            # Skip if contains unwanted patterns
-            if any(pattern in syn.lower() for pattern in skip_patterns):
-                continue
-                
-            # Accept if it looks like a chemical name or doesn't match any exclusion patterns
-            if any(re.search(pattern, syn) for pattern in chemical_patterns) or not any(pattern in syn.lower() for pattern in skip_patterns):
-                filtered.append(syn)
-        
-        return filtered[:20]  # Limit to top 20 synonyms
+        return CHEMICAL_SYNONYM_FILTER.filter(synonyms)
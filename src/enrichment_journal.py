@@ -0,0 +1,170 @@
+"""
+Enrichment Journal
+
+Append-only JSON Lines journal of finished enrichment tasks. Each line records one
+(HMDB ID, metabolite name) pair together with its enriched record, and is flushed
+to disk as soon as the task finishes, so a run that dies part-way through can be
+resumed by replaying the journal instead of starting over.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Task = Tuple[str, str]
+
+
+class EnrichmentJournal:
+    """Append-only journal of completed (HMDB ID, metabolite name) enrichment tasks."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the journal.
+
+        Args:
+            path (str): Path to the JSON Lines journal file
+        """
+        self.path = path
+        self.offsets: Dict[Task, int] = {}
+        self._file = None
+        self._reader = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def open(self, resume: bool = False) -> Dict[Task, int]:
+        """
+        Open the journal for appending.
+
+        Only the byte offset of each entry is kept in memory; records are read
+        back one at a time with read_record.
+
+        Args:
+            resume (bool): Replay and keep existing entries instead of starting a new journal
+
+        Returns:
+            Dict: Byte offsets of the tasks already completed, keyed by (HMDB ID, name)
+        """
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.offsets = {}
+
+        if resume and Path(self.path).exists():
+            self.offsets, valid_length = self._replay()
+            # Drop a partially written last line so new entries start on a clean line
+            if valid_length < os.path.getsize(self.path):
+                logger.warning(f"Discarding incomplete trailing entry in journal {self.path}")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid_length)
+            logger.info(f"Replayed {len(self.offsets)} completed tasks from journal {self.path}")
+            self._file = open(self.path, 'ab')
+            self._size = valid_length
+        else:
+            self._file = open(self.path, 'wb')
+            self._size = 0
+
+        return dict(self.offsets)
+
+    def _replay(self) -> Tuple[Dict[Task, int], int]:
+        """
+        Index every complete entry in the journal.
+
+        Returns:
+            Tuple: (byte offset of the latest entry per task, byte length of the valid part of the file)
+        """
+        offsets: Dict[Task, int] = {}
+        valid_length = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                offsets[(entry['hmdb_id'], entry['metabolite_name'])] = valid_length
+                valid_length += len(line)
+        return offsets, valid_length
+
+    def append(self, hmdb_id: str, metabolite_name: str, record: Dict[str, Any]) -> None:
+        """
+        Durably record a finished task.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            metabolite_name (str): Metabolite name
+            record (Dict): Enriched metabolite record
+        """
+        line = json.dumps({
+            'hmdb_id': hmdb_id,
+            'metabolite_name': metabolite_name,
+            'record': record
+        }).encode('utf-8') + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.offsets[(hmdb_id, metabolite_name)] = self._size
+            self._size += len(line)
+
+    def read_record(self, task: Task) -> Dict[str, Any]:
+        """
+        Read the latest journaled record of a task.
+
+        Every call returns a fresh copy, so callers may modify it freely.
+
+        Args:
+            task (Tuple[str, str]): (HMDB ID, metabolite name)
+
+        Returns:
+            Dict: Enriched metabolite record
+        """
+        with self._lock:
+            if self._reader is None:
+                self._reader = open(self.path, 'rb')
+            self._reader.seek(self.offsets[task])
+            line = self._reader.readline()
+        return json.loads(line)['record']
+
+    def close(self) -> None:
+        """Close the journal file."""
+        with self._lock:
+            for handle in (self._file, self._reader):
+                if handle is not None:
+                    handle.close()
+            self._file = None
+            self._reader = None
+
+
+def merge_journals(sources: List[str], path: str) -> int:
+    """
+    Concatenate the complete entries of several journals into one.
+
+    Used to combine the journals written by shard runs. An incomplete trailing
+    line left by a shard that died mid-write is skipped.
+
+    Args:
+        sources (List[str]): Paths of the journals to combine
+        path (str): Path of the combined journal
+
+    Returns:
+        int: Number of entries written
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    entries = 0
+    with open(path, 'wb') as out:
+        for source in sources:
+            with open(source, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        logger.warning(f"Skipping incomplete trailing entry in journal {source}")
+                        break
+                    out.write(line)
+                    entries += 1
+        out.flush()
+        os.fsync(out.fileno())
+    logger.info(f"Merged {entries} entries from {len(sources)} journals into {path}")
+    return entries
@@ -0,0 +1,116 @@
+"""
+Lazy HMDB record.
+
+A LazyHMDBRecord wraps the XML of one metabolite (from an XML file, the XML pack
+or the record store) without parsing it. Each field is extracted the first time
+it is read, with extract_hmdb_fields restricted to the fields being loaded, and
+is memoized afterwards. A caller that only reads a few early fields, such as
+synonyms or inchikey, only pays for parsing the head of the document.
+"""
+
+import io
+import logging
+from typing import Any, Callable, Dict, Optional
+
+from hmdb_xml_extractor import CROSS_REFERENCE_FIELDS, EXTRACTABLE_FIELDS, FIRST_TEXT_FIELDS, extract_hmdb_fields
+
+logger = logging.getLogger(__name__)
+
+# Key order of a fully parsed record, as produced by EnhancedHMDBLookup._parse_hmdb_xml
+RECORD_FIELD_ORDER = (
+    ('description', 'synonyms') + FIRST_TEXT_FIELDS[1:] + CROSS_REFERENCE_FIELDS
+    + ('taxonomy', 'biological_properties', 'chemical_classes')
+)
+
+
+class LazyHMDBRecord:
+    """HMDB metabolite record whose fields are parsed on first access and then memoized."""
+
+    __slots__ = ('hmdb_id', '_read_xml', '_finalize', '_values', '_loaded')
+
+    def __init__(self, hmdb_id: str, read_xml: Callable[[], Optional[bytes]],
+                 finalize: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 values: Optional[Dict[str, Any]] = None):
+        """
+        Wrap the XML of a record.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            read_xml (Callable): Returns the raw XML document of the record
+            finalize (Callable): Turns raw extracted fields into record values
+                                 (EnhancedHMDBLookup._finalize_hmdb_info)
+            values (Optional[Dict]): Fully parsed record, e.g. from the parsed record cache;
+                                     the XML is then never read
+        """
+        self.hmdb_id = hmdb_id
+        self._read_xml = read_xml
+        self._finalize = finalize
+        self._values: Dict[str, Any] = dict(values) if values is not None else {}
+        self._loaded = set(EXTRACTABLE_FIELDS) if values is not None else set()
+
+    def load(self, *fields: str) -> None:
+        """
+        Parse the given fields that have not been loaded yet, in a single pass.
+
+        Reading several fields is cheaper after loading them together than
+        after reading them one at a time.
+
+        Args:
+            *fields (str): Field names (see hmdb_xml_extractor.EXTRACTABLE_FIELDS)
+        """
+        missing = [field for field in fields if field not in self._loaded and field in EXTRACTABLE_FIELDS]
+        if not missing:
+            return
+        # The chemical classes are derived from the taxonomy, which is then read anyway
+        if 'chemical_classes' in missing and 'taxonomy' not in self._loaded:
+            missing.append('taxonomy')
+
+        try:
+            xml = self._read_xml()
+            if xml is None:
+                logger.error(f"No XML available for HMDB record {self.hmdb_id}")
+                return
+            values = self._finalize(extract_hmdb_fields(io.BytesIO(xml), fields=missing))
+        except Exception as e:
+            logger.error(f"Error parsing fields {missing} of HMDB record {self.hmdb_id}: {e}")
+            return
+
+        for field in missing:
+            self._loaded.add(field)
+            if field in values:
+                self._values[field] = values[field]
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """
+        Get a field, parsing it on first access.
+
+        Args:
+            field (str): Field name
+            default (Any): Value returned when the record has no value for the field
+
+        Returns:
+            Any: Field value, or default (also for fields the extractor does not know)
+        """
+        self.load(field)
+        return self._values.get(field, default)
+
+    def __getitem__(self, field: str) -> Any:
+        self.load(field)
+        return self._values[field]
+
+    def __contains__(self, field: str) -> bool:
+        self.load(field)
+        return field in self._values
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get every field of the record.
+
+        Returns:
+            Dict: The record as EnhancedHMDBLookup._parse_hmdb_xml returns it
+        """
+        self.load(*EXTRACTABLE_FIELDS)
+        return {field: self._values[field] for field in RECORD_FIELD_ORDER if field in self._values}
+
+    def __repr__(self) -> str:
+        return f"LazyHMDBRecord({self.hmdb_id!r}, loaded={sorted(self._loaded)})"
@@ -0,0 +1,140 @@
+"""
+Parsed HMDB record cache.
+
+Keeps the dicts that EnhancedHMDBLookup._parse_hmdb_xml extracts from the
+data/hmdb_xml/*.xml files, so a run with a cold in-memory cache does not have to
+parse every XML file again. The cache is a single msgpack document compressed
+with zstd, loaded once and written back atomically.
+
+Each entry is keyed by the absolute path of the XML file and is only used while
+the file's size and modification time and the extractor's PARSER_VERSION are
+unchanged; a stale entry is simply parsed again and replaced. Records read from
+an XML pack are keyed by '{pack path}#{HMDB ID}' and fingerprinted by their
+offset and length in the pack instead.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import msgpack
+import zstandard
+
+from hmdb_xml_extractor import PARSER_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Constants
+HMDB_PARSED_CACHE_FILE = 'data/hmdb_parsed_cache.msgpack.zst'
+CACHE_FORMAT_VERSION = 1
+ZSTD_LEVEL = 3
+
+
+class ParsedRecordCache:
+    """Cache of parsed HMDB XML records, invalidated by file fingerprint and parser version."""
+
+    def __init__(self, path: str = HMDB_PARSED_CACHE_FILE):
+        """
+        Load the cache file if it exists.
+
+        Args:
+            path (str): Path to the cache file
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # Entries keep the record packed, so every get returns a fresh copy
+        self._entries: Dict[str, list] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """Read the cache file; an unreadable or outdated file is treated as empty."""
+        if not os.path.exists(self.path):
+            return
+        start_time = time.time()
+        try:
+            with open(self.path, 'rb') as f:
+                data = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(f.read()), raw=False)
+            if data.get('format') != CACHE_FORMAT_VERSION:
+                logger.info(f"Ignoring parsed HMDB cache {self.path} written in an older format")
+                return
+            self._entries = data.get('entries', {})
+            logger.info(f"Loaded {len(self._entries)} parsed HMDB records from {self.path} "
+                        f"in {(time.time() - start_time) * 1000:.1f} ms")
+        except Exception as e:
+            logger.error(f"Error loading parsed HMDB cache {self.path}: {e}")
+            self._entries = {}
+
+    @staticmethod
+    def _fingerprint(xml_path: str) -> Optional[list]:
+        """Size, modification time and parser version that an entry for the file must match."""
+        try:
+            stat = os.stat(xml_path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns, PARSER_VERSION]
+
+    def get(self, xml_path: str, fingerprint: Optional[list] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the parsed record of an XML file, if it is still valid.
+
+        Args:
+            xml_path (str): Path to the HMDB XML file, or the key of a packed record
+            fingerprint (Optional[list]): Version of a packed record that the entry must match;
+                                          taken from the file's size and mtime by default
+
+        Returns:
+            Optional[Dict]: Parsed record, or None if it has to be parsed again
+        """
+        key = os.path.abspath(xml_path)
+        fingerprint = self._fingerprint(xml_path) if fingerprint is None else list(fingerprint) + [PARSER_VERSION]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or fingerprint is None or entry[:3] != fingerprint:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return msgpack.unpackb(entry[3], raw=False)
+
+    def put(self, xml_path: str, info: Dict[str, Any], fingerprint: Optional[list] = None) -> None:
+        """
+        Store the parsed record of an XML file.
+
+        Args:
+            xml_path (str): Path to the HMDB XML file, or the key of a packed record
+            info (Dict): Record produced by the parser
+            fingerprint (Optional[list]): Version of a packed record, as passed to get
+        """
+        fingerprint = self._fingerprint(xml_path) if fingerprint is None else list(fingerprint) + [PARSER_VERSION]
+        if fingerprint is None:
+            return
+        packed = msgpack.packb(info, use_bin_type=True)
+        with self._lock:
+            self._entries[os.path.abspath(xml_path)] = fingerprint + [packed]
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache back to disk if anything changed, replacing the file atomically."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                packed = msgpack.packb({'format': CACHE_FORMAT_VERSION, 'entries': self._entries}, use_bin_type=True)
+                temp_file = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_file, 'wb') as f:
+                    f.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(packed))
+                os.replace(temp_file, self.path)
+                self._dirty = False
+                logger.info(f"Saved {len(self._entries)} parsed HMDB records to {self.path}")
+            except Exception as e:
+                logger.error(f"Error saving parsed HMDB cache {self.path}: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+HMDB XML Prefetcher
+
+Downloads the HMDB XML file of every HMDB ID in the input CSV that is not yet
+available locally, before enrichment starts. Otherwise each missing XML would
+be downloaded lazily, one at a time, in the middle of enrichment.
+
+The downloads run concurrently through EnhancedHMDBLookup._download_hmdb_xml.
+That method streams each body to disk, writes the file atomically, and holds a
+service_call slot, so the per-host concurrency and rate limits for hmdb.ca
+still apply.
+
+The rate limit, not the worker count, sets the throughput. With the default
+hmdb.ca token bucket (0.5 requests per second, burst of 5), the first 5 files
+start at once and the rest at 2-second intervals, so N missing files take at
+least (N - 5) * 2 seconds: about 30 files per minute, whatever --workers is.
+What concurrency buys is that slow responses overlap instead of adding up.
+--rate raises the hmdb.ca rate for the prefetch process only; choose it
+within what hmdb.ca tolerates.
+
+Usage:
+    python src/hmdb_prefetch.py
+    python src/hmdb_prefetch.py --input src/input/normal_ranges_with_all_HMDB_IDs.csv --workers 4
+    python src/hmdb_prefetch.py --rate 1 --burst 5
+"""
+
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from enhanced_hmdb_lookup import EnhancedHMDBLookup
+from metabolite_hmdb_lookup import is_valid_hmdb_id
+from service_limits import (
+    SERVICE_CONCURRENCY, SERVICE_RATE_LIMITS, DEFAULT_RATE_LIMIT, HMDB_HOST, set_service_rate_limit
+)
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_INPUT_CSV = "src/input/normal_ranges_with_all_HMDB_IDs.csv"
+PROGRESS_INTERVAL = 50  # Log progress every N finished downloads
+
+
+def read_hmdb_ids(csv_file: str, sample_size: Optional[int] = None) -> List[str]:
+    """
+    Read the unique, valid HMDB IDs of an input CSV, in input order.
+
+    Args:
+        csv_file (str): Input CSV with an 'hmdb' column of space-separated IDs
+        sample_size (Optional[int]): Only read the first N rows, as the enricher does
+
+    Returns:
+        List[str]: HMDB IDs, without NOID placeholders and invalid IDs
+    """
+    df = pd.read_csv(csv_file)
+    if sample_size:
+        df = df.head(sample_size)
+
+    hmdb_ids = {}
+    for value in df['hmdb']:
+        if not isinstance(value, str):
+            continue
+        for hmdb_id in value.split():
+            if 'NOID' not in hmdb_id and is_valid_hmdb_id(hmdb_id):
+                hmdb_ids.setdefault(hmdb_id, None)
+    return list(hmdb_ids)
+
+
+def find_missing_hmdb_ids(hmdb_ids: List[str], lookup: EnhancedHMDBLookup) -> List[str]:
+    """
+    Select the HMDB IDs whose record is not in the record store, the XML pack or an XML file.
+
+    Args:
+        hmdb_ids (List[str]): HMDB IDs to check
+        lookup (EnhancedHMDBLookup): Lookup whose local sources are checked
+
+    Returns:
+        List[str]: HMDB IDs that would have to be downloaded
+    """
+    return [hmdb_id for hmdb_id in hmdb_ids if not lookup._has_local_xml(hmdb_id)]
+
+
+def estimate_prefetch_seconds(count: int) -> float:
+    """
+    Lower bound on the time to download files under the current hmdb.ca rate limit.
+
+    Args:
+        count (int): Number of files to download
+
+    Returns:
+        float: Seconds before the last download can start, ignoring response times
+    """
+    rate, capacity = SERVICE_RATE_LIMITS.get(HMDB_HOST, DEFAULT_RATE_LIMIT)
+    return max(0, count - int(capacity)) / rate
+
+
+def prefetch_hmdb_xml(hmdb_ids: List[str], lookup: Optional[EnhancedHMDBLookup] = None,
+                      workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Download every missing HMDB XML file concurrently.
+
+    Args:
+        hmdb_ids (List[str]): HMDB IDs the run needs
+        lookup (Optional[EnhancedHMDBLookup]): Lookup whose session to download with; a new
+                                               one sized to the worker count by default
+        workers (Optional[int]): Concurrent downloads; defaults to the hmdb.ca concurrency limit
+
+    Returns:
+        Dict: Download statistics (requested, missing, downloaded, failed, bytes, seconds)
+    """
+    workers = max(1, workers or SERVICE_CONCURRENCY.get(HMDB_HOST, 1))
+    if lookup is None:
+        lookup = EnhancedHMDBLookup(pool_size=workers, parsed_cache=None)
+
+    missing = find_missing_hmdb_ids(hmdb_ids, lookup)
+    stats = {
+        'requested': len(hmdb_ids),
+        'missing': len(missing),
+        'downloaded': 0,
+        'failed': 0,
+        'bytes': 0,
+        'seconds': 0.0
+    }
+    rate, capacity = SERVICE_RATE_LIMITS.get(HMDB_HOST, DEFAULT_RATE_LIMIT)
+    logger.info(f"HMDB prefetch: {len(hmdb_ids)} IDs, {len(hmdb_ids) - len(missing)} available locally, "
+                f"{len(missing)} to download with {workers} workers at {rate:g} requests/s (burst {capacity:g}), "
+                f"at least {estimate_prefetch_seconds(len(missing)):.0f} seconds")
+    if not missing:
+        return stats
+
+    start_time = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hmdb-prefetch") as executor:
+        futures = {executor.submit(lookup._download_hmdb_xml, hmdb_id): hmdb_id for hmdb_id in missing}
+        for future in as_completed(futures):
+            size = future.result()
+            if size is None:
+                stats['failed'] += 1
+            else:
+                stats['downloaded'] += 1
+                stats['bytes'] += size
+            finished = stats['downloaded'] + stats['failed']
+            if finished % PROGRESS_INTERVAL == 0:
+                elapsed = time.time() - start_time
+                logger.info(f"HMDB prefetch: {finished}/{len(missing)} finished, "
+                            f"{stats['bytes'] / 1e6 / elapsed:.2f} MB/s")
+
+    stats['seconds'] = time.time() - start_time
+    log_prefetch_stats(stats)
+    return stats
+
+
+def log_prefetch_stats(stats: Dict[str, Any]) -> None:
+    """Log the throughput of a prefetch run."""
+    seconds = max(stats['seconds'], 1e-9)
+    logger.info(f"HMDB prefetch completed: {stats['downloaded']} downloaded, {stats['failed']} failed, "
+                f"{stats['bytes'] / 1e6:.1f} MB in {stats['seconds']:.1f} seconds "
+                f"({stats['downloaded'] / seconds:.2f} files/s, {stats['bytes'] / 1e6 / seconds:.2f} MB/s)")
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Download the missing HMDB XML files of an input CSV.")
+    parser.add_argument("--input", default=DEFAULT_INPUT_CSV, help="Input CSV file with HMDB IDs")
+    parser.add_argument("--sample-size", type=int, help="Only prefetch the first N rows")
+    parser.add_argument("--workers", type=int,
+                       help="Concurrent downloads (default: the hmdb.ca concurrency limit)")
+    parser.add_argument("--rate", type=float,
+                       help=f"hmdb.ca requests per second for this prefetch "
+                            f"(default: {SERVICE_RATE_LIMITS[HMDB_HOST][0]:g})")
+    parser.add_argument("--burst", type=float,
+                       help=f"hmdb.ca burst capacity with --rate (default: {SERVICE_RATE_LIMITS[HMDB_HOST][1]:g})")
+    args = parser.parse_args()
+
+    try:
+        if args.rate:
+            set_service_rate_limit(HMDB_HOST, args.rate, args.burst or SERVICE_RATE_LIMITS[HMDB_HOST][1])
+        stats = prefetch_hmdb_xml(read_hmdb_ids(args.input, args.sample_size), workers=args.workers)
+        return 1 if stats['failed'] else 0
+
+    except Exception as e:
+        logger.error(f"Error prefetching HMDB XML files: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
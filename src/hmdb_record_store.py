@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+HMDB Record Store
+
+Local, indexed store of HMDB metabolite records built from the full HMDB XML dump
+(hmdb_metabolites.xml, or the hmdb_metabolites.zip it is distributed as).
+
+The dump is stream-parsed with iterparse and every <metabolite> element is cleared
+as soon as it has been stored, so ingestion runs in constant memory regardless of
+the dump size. Each record is kept as compressed XML in a SQLite database, indexed
+by its accession and by all of its secondary accessions, so EnhancedHMDBLookup can
+read records locally instead of downloading them one request at a time.
+
+Usage:
+    python src/hmdb_record_store.py ingest hmdb_metabolites.zip
+    python src/hmdb_record_store.py lookup HMDB0000001
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Constants
+HMDB_STORE_FILE = 'data/hmdb_records.sqlite'
+INGEST_BATCH_SIZE = 1000  # Records per transaction while ingesting
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metabolites (
+    accession TEXT PRIMARY KEY,
+    xml BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accessions (
+    accession TEXT PRIMARY KEY,
+    primary_accession TEXT NOT NULL
+);
+"""
+
+
+def _local_name(tag: str) -> str:
+    """Strip the namespace from an element tag ('{http://www.hmdb.ca}name' -> 'name')."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _strip_namespaces(element: ET.Element) -> None:
+    """Remove namespaces from an element and its descendants, in place."""
+    for node in element.iter():
+        if isinstance(node.tag, str) and node.tag.startswith('{'):
+            node.tag = _local_name(node.tag)
+
+
+@contextmanager
+def _open_dump(dump_path: str) -> Iterator[IO[bytes]]:
+    """Open an HMDB XML dump, reading the XML member directly from a .zip archive."""
+    if zipfile.is_zipfile(dump_path):
+        with zipfile.ZipFile(dump_path) as archive:
+            members = [name for name in archive.namelist() if name.endswith('.xml')]
+            if not members:
+                raise ValueError(f"No XML file found in {dump_path}")
+            with archive.open(members[0]) as f:
+                yield f
+    else:
+        with open(dump_path, 'rb') as f:
+            yield f
+
+
+def iter_dump_records(source: IO[bytes]) -> Iterator[Tuple[str, List[str], bytes]]:
+    """
+    Stream the metabolite records of an HMDB XML dump.
+
+    Only the <metabolite> element being read is held in memory: each one is
+    serialized and then cleared and detached from the document root.
+
+    Args:
+        source (IO[bytes]): Open dump file
+
+    Yields:
+        Tuple: (accession, secondary accessions, namespace-free XML of the record)
+    """
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        # Records are the direct children of the <hmdb> root element
+        if depth != 1 or _local_name(element.tag) != 'metabolite':
+            continue
+
+        _strip_namespaces(element)
+        accession = (element.findtext('accession') or '').strip()
+        secondary = [
+            (node.text or '').strip()
+            for node in element.findall('secondary_accessions/accession')
+            if node.text and node.text.strip()
+        ]
+        if accession:
+            yield accession, secondary, ET.tostring(element, encoding='utf-8')
+        else:
+            logger.warning("Skipping metabolite record without an accession")
+
+        element.clear()
+        root.remove(element)
+
+
+class HMDBRecordStore:
+    """SQLite store of HMDB metabolite XML records, keyed by primary and secondary accession."""
+
+    def __init__(self, path: str = HMDB_STORE_FILE):
+        """
+        Open (or create) the store.
+
+        Args:
+            path (str): Path to the SQLite database
+        """
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # A single connection shared by all threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def ingest(self, dump_path: str) -> int:
+        """
+        Load every metabolite of an HMDB XML dump into the store.
+
+        Existing records with the same accession are replaced, so a newer dump can
+        be ingested over an older one.
+
+        Args:
+            dump_path (str): Path to hmdb_metabolites.xml or hmdb_metabolites.zip
+
+        Returns:
+            int: Number of metabolite records ingested
+        """
+        start_time = time.time()
+        count = 0
+        records = []
+        aliases = []
+
+        with _open_dump(dump_path) as source:
+            for accession, secondary, xml in iter_dump_records(source):
+                records.append((accession, zlib.compress(xml)))
+                aliases.append((accession, accession))
+                aliases.extend((alias, accession) for alias in secondary)
+                count += 1
+
+                if len(records) >= INGEST_BATCH_SIZE:
+                    self._write_batch(records, aliases)
+                    records, aliases = [], []
+                    logger.info(f"Ingested {count} HMDB records")
+
+        self._write_batch(records, aliases)
+        logger.info(f"Ingested {count} HMDB records from {dump_path} into {self.path} "
+                    f"in {time.time() - start_time:.1f} seconds")
+        return count
+
+    def _write_batch(self, records: List[Tuple[str, bytes]], aliases: List[Tuple[str, str]]) -> None:
+        """Store a batch of records and their accession aliases in one transaction."""
+        if not records:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO metabolites (accession, xml) VALUES (?, ?)", records)
+            self._conn.executemany("INSERT OR REPLACE INTO accessions (accession, primary_accession) VALUES (?, ?)", aliases)
+
+    def resolve(self, hmdb_id: str) -> Optional[str]:
+        """
+        Resolve a primary or secondary accession to the primary accession.
+
+        Args:
+            hmdb_id (str): HMDB ID, current or legacy
+
+        Returns:
+            Optional[str]: Primary accession, or None if the store does not know the ID
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT primary_accession FROM accessions WHERE accession = ?", (hmdb_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_xml(self, hmdb_id: str) -> Optional[bytes]:
+        """
+        Get the XML of a metabolite record.
+
+        Args:
+            hmdb_id (str): HMDB ID, current or legacy
+
+        Returns:
+            Optional[bytes]: Namespace-free <metabolite> XML, or None if not in the store
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT m.xml FROM accessions a JOIN metabolites m ON m.accession = a.primary_accession "
+                "WHERE a.accession = ?", (hmdb_id,)
+            ).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM metabolites").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def open_record_store(path: str = HMDB_STORE_FILE) -> Optional[HMDBRecordStore]:
+    """
+    Open the record store if it has been built.
+
+    Args:
+        path (str): Path to the SQLite database
+
+    Returns:
+        Optional[HMDBRecordStore]: The store, or None if no dump has been ingested at that path
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return HMDBRecordStore(path)
+    except sqlite3.Error as e:
+        logger.error(f"Error opening HMDB record store {path}: {e}")
+        return None
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Build and query the local HMDB record store.")
+    parser.add_argument("--store", default=HMDB_STORE_FILE, help="Path to the SQLite record store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest an HMDB XML dump (.xml or .zip)")
+    ingest_parser.add_argument("dump", help="Path to hmdb_metabolites.xml or hmdb_metabolites.zip")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Print the XML record of an HMDB ID")
+    lookup_parser.add_argument("hmdb_id", help="Primary or secondary HMDB accession")
+
+    args = parser.parse_args()
+
+    try:
+        store = HMDBRecordStore(args.store)
+        if args.command == "ingest":
+            store.ingest(args.dump)
+        else:
+            xml = store.get_xml(args.hmdb_id)
+            if xml is None:
+                logger.error(f"{args.hmdb_id} is not in the record store {args.store}")
+                return 1
+            print(xml.decode('utf-8'))
+        store.close()
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error running HMDB record store command: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Single-pass HMDB XML field extractor.
+
+Collects every field EnhancedHMDBLookup needs from a metabolite XML document in
+one streaming pass, instead of running a separate descendant (.//x) search over
+the whole tree for each field.
+
+The spectra and protein_associations subtrees make up most of a large record and
+hold none of the fields, so they are cut out of the raw bytes as the document is
+fed to the parser, and the parser never sees them. Every remaining element is
+cleared as soon as it has been read. The document is fed in chunks, so a request
+for a few early fields stops reading it once they have been found.
+
+Uses lxml when it is installed and falls back to xml.etree.ElementTree.
+"""
+
+from typing import IO, Any, Collection, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    from lxml import etree as _etree
+    XML_BACKEND = 'lxml'
+except ImportError:
+    import xml.etree.ElementTree as _etree
+    XML_BACKEND = 'ElementTree'
+
+# Version of the parsed record format; bump whenever extract_hmdb_fields or
+# EnhancedHMDBLookup._finalize_hmdb_info changes, to invalidate the parsed record cache
+PARSER_VERSION = 3
+
+# Subtrees that never hold a field we extract
+SKIPPED_SUBTREES = frozenset({'spectra', 'protein_associations'})
+
+# Bytes of the document fed to the parser at a time; parsing stops between chunks once
+# every requested field has been read
+FEED_CHUNK_SIZE = 16 * 1024
+
+# Fields taken from the first element with this tag anywhere in the document
+FIRST_TEXT_FIELDS = (
+    'description', 'chemical_formula', 'average_molecular_weight', 'monisotopic_molecular_weight',
+    'iupac_name', 'traditional_iupac', 'cas_registry_number', 'smiles', 'inchi', 'inchikey', 'state'
+)
+
+# Cross-references to other databases, taken from the element with this tag directly under
+# the <metabolite> root (pathways, for instance, hold unrelated KEGG map IDs)
+CROSS_REFERENCE_FIELDS = ('pubchem_compound_id', 'chebi_id', 'kegg_id')
+
+# Taxonomy fields, taken from the first element with this tag directly under <taxonomy>
+TAXONOMY_FIELDS = (
+    'description', 'direct_parent', 'kingdom', 'super_class', 'class', 'sub_class', 'molecular_framework'
+)
+
+# List fields: (parent tag, element tag) -> field name
+LIST_FIELDS = {
+    ('synonyms', 'synonym'): 'synonyms',
+    ('cellular_locations', 'cellular'): 'cellular_locations',
+    ('biospecimen_locations', 'biospecimen'): 'biospecimen_locations',
+    ('tissue_locations', 'tissue'): 'tissue_locations',
+}
+
+# List fields read only from their container directly under the <metabolite> root; HMDB repeats
+# <synonyms> inside <ontology> descendants, where they name ontology terms, not the metabolite
+ROOT_LIST_FIELDS = frozenset({'synonyms'})
+
+# Fields that can be requested from extract_hmdb_fields; 'chemical_classes' is derived from the taxonomy
+EXTRACTABLE_FIELDS = FIRST_TEXT_FIELDS + CROSS_REFERENCE_FIELDS + (
+    'synonyms', 'taxonomy', 'biological_properties', 'chemical_classes'
+)
+
+# Container element of each grouped field: once the container directly under the root has
+# ended, the field is complete. biological_properties is not included: its lists are
+# collected wherever their containers occur, so the whole document has to be read
+GROUP_CONTAINERS = {'synonyms': 'synonyms', 'taxonomy': 'taxonomy'}
+
+
+def _local_name(tag: Any) -> str:
+    """Strip the namespace from an element tag; comments and processing instructions have none."""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _text(element) -> str:
+    """Stripped text of an element, as _get_xml_text returns it."""
+    return element.text.strip() if element.text else ""
+
+
+def _find_open_tag(data: bytes, open_tag: bytes, start: int, end: int) -> int:
+    """Position of the first open_tag (matching the whole tag name) starting in data[start:end], or -1."""
+    while True:
+        position = data.find(open_tag, start, end + len(open_tag) + 1)
+        if position < 0 or position >= end:
+            return -1
+        # Make sure the whole tag name matched (not e.g. <spectra_count>)
+        following = data[position + len(open_tag):position + len(open_tag) + 1]
+        if following in (b'>', b'/', b' ', b'\t', b'\r', b'\n'):
+            return position
+        start = position + 1
+
+
+def iter_document_segments(data: bytes, chunk_size: int = FEED_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield a raw XML document in chunks, with every skipped subtree replaced by an empty element.
+
+    The document is only scanned as far as the chunks are consumed, so a reader
+    that stops early never pays for the rest of it. Relies on the skipped
+    elements never nesting inside themselves, which holds for HMDB records.
+    Namespace-prefixed forms are left alone and are skipped by the parser loop
+    instead.
+
+    Args:
+        data (bytes): Raw XML document
+        chunk_size (int): Maximum size of the chunks of unskipped content
+
+    Yields:
+        bytes: Consecutive pieces of the document without the skipped subtrees
+    """
+    tags = [(b'<' + tag.encode('ascii'), b'</' + tag.encode('ascii') + b'>') for tag in sorted(SKIPPED_SUBTREES)]
+    position = 0
+    length = len(data)
+    while position < length:
+        window_end = min(length, position + chunk_size)
+        start, open_tag, close_tag = -1, b'', b''
+        for tag_open, tag_close in tags:
+            found = _find_open_tag(data, tag_open, position, window_end)
+            if found >= 0 and (start < 0 or found < start):
+                start, open_tag, close_tag = found, tag_open, tag_close
+        if start < 0:
+            yield data[position:window_end]
+            position = window_end
+            continue
+
+        # Hand over what precedes the subtree before scanning for its end
+        if start > position:
+            yield data[position:start]
+            position = start
+
+        tag_end = data.find(b'>', start)
+        if tag_end < 0:
+            break
+        if data[tag_end - 1:tag_end] == b'/':
+            end = tag_end + 1
+        else:
+            close = data.find(close_tag, tag_end)
+            if close < 0:
+                break
+            end = close + len(close_tag)
+        yield open_tag + b'/>'
+        position = end
+
+    # An unterminated skipped element is passed through unchanged
+    if position < length:
+        yield data[position:]
+
+
+def drop_skipped_subtrees(data: bytes) -> bytes:
+    """
+    Replace every skipped subtree in a raw XML document with an empty element.
+
+    Args:
+        data (bytes): Raw XML document
+
+    Returns:
+        bytes: The document without the content of the skipped subtrees
+    """
+    return b''.join(iter_document_segments(data, chunk_size=max(1, len(data))))
+
+
+def _iter_parse_events(data: bytes) -> Iterator[Tuple[str, Any]]:
+    """Parse events of a raw XML document, fed to the parser one segment at a time."""
+    parser = _etree.XMLPullParser(events=('start', 'end'))
+    for segment in iter_document_segments(data):
+        parser.feed(segment)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def extract_hmdb_fields(source: Union[str, IO[bytes]], fields: Optional[Collection[str]] = None) -> Dict[str, Any]:
+    """
+    Extract the HMDB fields of a metabolite XML document in a single pass.
+
+    Produces the same values as the XPath queries of the tree parser: single
+    fields come from the first matching element in document order (cross-references
+    from the first one directly under the root), and list fields keep every match
+    in document order (synonyms only from the <synonyms> directly under the root) (an element whose text is only
+    whitespace contributes an empty string, as in _get_xml_list). The one
+    deliberate difference is that elements inside the skipped subtrees, such as
+    a protein's <description>, are never matched.
+
+    With fields, only those fields are collected, and parsing stops as soon as
+    all of them are complete: a single field once its element has been read, the
+    synonyms or the taxonomy once their element under the root has ended. The
+    biological_properties lists gather matches from the whole document, so a
+    request for them reads it to the end. A request for early fields such as
+    synonyms, inchi or inchikey only reads the head of the document.
+
+    Args:
+        source (Union[str, IO[bytes]]): Path to the XML file, or an open binary file
+        fields (Optional[Collection[str]]): Fields to extract (see EXTRACTABLE_FIELDS); all by default
+
+    Returns:
+        Dict: Raw fields with 'taxonomy' and 'biological_properties' sub-dicts;
+              synonyms are not filtered yet. With fields, only the requested fields
+              (and the taxonomy, for chemical_classes) are present.
+    """
+    if fields is not None:
+        unknown = set(fields) - set(EXTRACTABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown HMDB fields: {sorted(unknown)}")
+        wanted = set(fields)
+        if 'chemical_classes' in wanted:
+            wanted.add('taxonomy')
+        wanted.discard('chemical_classes')
+    else:
+        wanted = set(EXTRACTABLE_FIELDS) - {'chemical_classes'}
+
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            data = f.read()
+    else:
+        data = source.read()
+
+    first_fields = frozenset(field for field in FIRST_TEXT_FIELDS if field in wanted)
+    root_fields = frozenset(field for field in CROSS_REFERENCE_FIELDS if field in wanted)
+    want_taxonomy = 'taxonomy' in wanted
+    list_fields = dict(LIST_FIELDS)
+    if 'synonyms' not in wanted:
+        del list_fields[('synonyms', 'synonym')]
+    want_pathways = 'biological_properties' in wanted
+    if not want_pathways:
+        list_fields = {key: field for key, field in list_fields.items() if field == 'synonyms'}
+
+    # Stop early only when a subset was requested; a full extraction reads the whole document
+    pending = set(wanted) if fields is not None else None
+
+    first_text: Dict[str, str] = {}
+    cross_references: Dict[str, str] = {}
+    taxonomy: Dict[str, str] = {}
+    lists: Dict[str, List[str]] = {field: [] for field in LIST_FIELDS.values()}
+    lists['pathways'] = []
+
+    # Element claimed at its start event for each single-value field, so the first
+    # match in document order wins; its text is read at the end event
+    claimed: Dict[Any, Any] = {}
+    stack: List[str] = []
+    skip_depth = 0
+
+    for event, element in _iter_parse_events(data):
+        tag = _local_name(element.tag)
+
+        if event == 'start':
+            stack.append(tag)
+            if skip_depth or tag in SKIPPED_SUBTREES:
+                skip_depth += 1
+                continue
+            if tag in first_fields and tag not in first_text and tag not in claimed:
+                claimed[tag] = element
+            if want_taxonomy and tag in TAXONOMY_FIELDS and ('taxonomy', tag) not in claimed:
+                parent = stack[-2] if len(stack) > 1 else ''
+                if parent == 'taxonomy':
+                    claimed[('taxonomy', tag)] = element
+            continue
+
+        stack.pop()
+        if skip_depth:
+            skip_depth -= 1
+            element.clear()
+            continue
+
+        parent = stack[-1] if stack else ''
+        if claimed.get(tag) is element:
+            first_text[tag] = _text(element)
+            if pending is not None:
+                pending.discard(tag)
+        if parent == 'taxonomy' and claimed.get(('taxonomy', tag)) is element:
+            taxonomy[tag] = _text(element)
+        if tag in root_fields and len(stack) == 1 and tag not in cross_references:
+            cross_references[tag] = _text(element)
+            if pending is not None:
+                pending.discard(tag)
+        field = list_fields.get((parent, tag))
+        if field in ROOT_LIST_FIELDS and len(stack) != 2:
+            field = None
+        if field and element.text:
+            lists[field].append(element.text.strip())
+        elif (want_pathways and tag == 'name' and parent == 'pathway' and len(stack) > 1
+              and stack[-2] == 'pathways' and element.text):
+            lists['pathways'].append(element.text.strip())
+
+        if pending is not None and tag in GROUP_CONTAINERS and len(stack) == 1:
+            pending.discard(GROUP_CONTAINERS[tag])
+            if not pending:
+                break
+        elif pending is not None and not pending:
+            break
+
+        # Children have been read by the time their parent ends; the document root is kept
+        if stack:
+            element.clear()
+
+    # Same key order as the tree parser
+    info = {'description': first_text.get('description', ''), 'synonyms': lists['synonyms']}
+    info.update((field, first_text.get(field, '')) for field in FIRST_TEXT_FIELDS[1:])
+    info.update((field, cross_references.get(field, '')) for field in CROSS_REFERENCE_FIELDS)
+    info['taxonomy'] = {field: taxonomy.get(field, '') for field in TAXONOMY_FIELDS}
+    info['biological_properties'] = {
+        'cellular_locations': lists['cellular_locations'],
+        'biospecimen_locations': lists['biospecimen_locations'],
+        'tissue_locations': lists['tissue_locations'],
+        'pathways': lists['pathways']
+    }
+    if fields is not None:
+        info = {key: value for key, value in info.items() if key in wanted}
+    return info
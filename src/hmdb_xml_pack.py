@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+HMDB XML Pack
+
+Packed replacement for the data/hmdb_xml directory, which holds one
+uncompressed {id}_raw.xml file per metabolite. A pack is made of two files:
+
+- data/hmdb_xml.pack: append-only archive of independent zstd frames, one per
+  metabolite XML document;
+- data/hmdb_xml.pack.idx: append-only text index with one
+  "HMDB ID<TAB>offset<TAB>length" line per frame.
+
+The pack is read through mmap, so a lookup costs one index lookup, a slice of
+the mapped file and the decompression of a single frame. A record that is added
+again is appended, and the later index line wins. Index lines that point past
+the end of the pack, left behind by an interrupted write, are ignored on open.
+
+Several processes (e.g. the shards of a sharded run) may append to one pack.
+Every append holds an exclusive flock on the pack file, takes its offset from
+the size of the file and first reads the index lines other processes appended
+since, so writers never record overlapping frames. Records added by other
+processes are also picked up when an ID is not found.
+
+Usage:
+    python src/hmdb_xml_pack.py migrate
+    python src/hmdb_xml_pack.py migrate --xml-dir data/hmdb_xml --remove
+    python src/hmdb_xml_pack.py lookup HMDB0000001
+"""
+
+import argparse
+import fcntl
+import glob
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+# Constants
+HMDB_XML_PACK_FILE = 'data/hmdb_xml.pack'
+XML_FILE_SUFFIX = '_raw.xml'
+ZSTD_LEVEL = 9  # Packing is done once per record, reads only pay for decompression
+
+
+class HMDBXMLPack:
+    """Append-only archive of zstd-compressed HMDB XML documents with an ID -> offset index."""
+
+    def __init__(self, path: str = HMDB_XML_PACK_FILE):
+        """
+        Open (or create) the pack and load its index.
+
+        Args:
+            path (str): Path to the pack file; the index is stored next to it as {path}.idx
+        """
+        self.path = path
+        self.index_path = f"{path}.idx"
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._pack = open(path, 'ab')
+        self._reader = open(path, 'rb')
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        self._index_position = 0  # Bytes of the index file read into offsets so far
+        with self._lock, self._file_lock():
+            self._load_index()
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the exclusive lock on the pack file that serializes writers across processes."""
+        fcntl.flock(self._pack.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._pack.fileno(), fcntl.LOCK_UN)
+
+    def _load_index(self) -> None:
+        """
+        Read the index, dropping entries for frames that were not completely written.
+
+        A torn last line is cut off the index file, so the next entry starts on a line of its own.
+        Must be called with the file lock held, so no other writer is in the middle of a line.
+        """
+        self._refresh_index(log_dropped=True)
+        if os.path.exists(self.index_path) and self._index_position < os.path.getsize(self.index_path):
+            logger.warning(f"Ignored a torn last entry in {self.index_path}")
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(self._index_position)
+
+    def _refresh_index(self, log_dropped: bool = False) -> None:
+        """
+        Read the complete index lines appended since the last read, by this or other processes.
+
+        Must be called with the thread lock held.
+
+        Args:
+            log_dropped (bool): Warn about entries pointing past the end of the pack
+        """
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) <= self._index_position:
+            return
+        size = os.fstat(self._reader.fileno()).st_size
+        dropped = 0
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_position)
+            for line in f:
+                # A line without its newline is still being written (or was torn); read it next time
+                if not line.endswith(b'\n'):
+                    break
+                self._index_position += len(line)
+                parts = line.decode('utf-8').rstrip('\n').split('\t')
+                if len(parts) != 3 or int(parts[1]) + int(parts[2]) > size:
+                    dropped += 1
+                    continue
+                self.offsets[parts[0]] = (int(parts[1]), int(parts[2]))
+        if dropped and log_dropped:
+            logger.warning(f"Ignored {dropped} incomplete entries in {self.index_path}")
+
+    def _find(self, hmdb_id: str) -> Optional[Tuple[int, int]]:
+        """Location of a record, reading new index lines if it is not known yet; thread lock held."""
+        location = self.offsets.get(hmdb_id)
+        if location is None:
+            self._refresh_index()
+            location = self.offsets.get(hmdb_id)
+        return location
+
+    def add(self, hmdb_id: str, xml: bytes) -> int:
+        """
+        Append the XML document of a metabolite.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            xml (bytes): Raw XML document
+
+        Returns:
+            int: Compressed size of the record in the pack
+        """
+        frame = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(xml)
+        with self._lock, self._file_lock():
+            # Other processes may have appended since; the offset is the end of the file as it is now
+            self._refresh_index()
+            if os.path.getsize(self.index_path) > self._index_position:
+                # A torn line left by a writer that died; the new line must not be appended to it
+                self._index.truncate(self._index_position)
+            offset = os.fstat(self._pack.fileno()).st_size
+            self._pack.write(frame)
+            self._pack.flush()
+            # The index line is only written once its frame is in the file
+            line = f"{hmdb_id}\t{offset}\t{len(frame)}\n"
+            self._index.write(line)
+            self._index.flush()
+            self._index_position += len(line.encode('utf-8'))
+            self.offsets[hmdb_id] = (offset, len(frame))
+        return len(frame)
+
+    def add_file(self, hmdb_id: str, xml_path: str) -> int:
+        """
+        Append the XML document of a metabolite from a file.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            xml_path (str): Path to the XML file
+
+        Returns:
+            int: Compressed size of the record in the pack
+        """
+        with open(xml_path, 'rb') as f:
+            return self.add(hmdb_id, f.read())
+
+    def get_xml(self, hmdb_id: str) -> Optional[bytes]:
+        """
+        Get the XML document of a metabolite.
+
+        Args:
+            hmdb_id (str): HMDB ID
+
+        Returns:
+            Optional[bytes]: Raw XML document, or None if the pack does not hold the ID
+        """
+        with self._lock:
+            location = self._find(hmdb_id)
+            if location is None:
+                return None
+            offset, length = location
+            # Map the file again once it has grown past the current mapping
+            if self._map is None or offset + length > len(self._map):
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+            frame = self._map[offset:offset + length]
+        return zstandard.ZstdDecompressor().decompress(frame)
+
+    def get_location(self, hmdb_id: str) -> Optional[Tuple[int, int]]:
+        """Offset and length of a record in the pack, which change whenever it is added again."""
+        with self._lock:
+            return self._find(hmdb_id)
+
+    def sync(self) -> None:
+        """Flush the pack and its index to disk."""
+        with self._lock:
+            for f in (self._pack, self._index):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __contains__(self, hmdb_id: str) -> bool:
+        with self._lock:
+            return self._find(hmdb_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.offsets)
+
+    def close(self) -> None:
+        """Close the pack files."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            for f in (self._pack, self._index, self._reader):
+                f.close()
+
+
+def open_xml_pack(path: str = HMDB_XML_PACK_FILE) -> Optional[HMDBXMLPack]:
+    """
+    Open the XML pack if it has been created.
+
+    Args:
+        path (str): Path to the pack file
+
+    Returns:
+        Optional[HMDBXMLPack]: The pack, or None if no pack has been created at that path
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return HMDBXMLPack(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error opening HMDB XML pack {path}: {e}")
+        return None
+
+
+def migrate_xml_dir(xml_dir: str, pack: HMDBXMLPack, remove: bool = False) -> int:
+    """
+    Move the per-metabolite XML files of a directory into a pack.
+
+    Files whose ID is already in the pack are skipped (and removed, with remove),
+    so an interrupted migration can simply be run again.
+
+    Args:
+        xml_dir (str): Directory with {id}_raw.xml files
+        pack (HMDBXMLPack): Pack to add the files to
+        remove (bool): Delete each file once the pack is synced to disk
+
+    Returns:
+        int: Number of files added to the pack
+    """
+    start_time = time.time()
+    paths = sorted(glob.glob(os.path.join(xml_dir, f"*{XML_FILE_SUFFIX}")))
+    added = 0
+    raw_bytes = 0
+    packed_bytes = 0
+
+    for path in paths:
+        hmdb_id = os.path.basename(path)[:-len(XML_FILE_SUFFIX)]
+        if hmdb_id in pack:
+            continue
+        raw_bytes += os.path.getsize(path)
+        packed_bytes += pack.add_file(hmdb_id, path)
+        added += 1
+        if added % 10000 == 0:
+            logger.info(f"Packed {added} HMDB XML files")
+
+    pack.sync()
+    if remove:
+        for path in paths:
+            if os.path.basename(path)[:-len(XML_FILE_SUFFIX)] in pack:
+                os.remove(path)
+
+    ratio = raw_bytes / packed_bytes if packed_bytes else 0
+    logger.info(f"Packed {added} of {len(paths)} HMDB XML files from {xml_dir} into {pack.path} "
+                f"in {time.time() - start_time:.1f} seconds: {raw_bytes / 1e6:.1f} MB -> "
+                f"{packed_bytes / 1e6:.1f} MB ({ratio:.1f}x)")
+    return added
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Build and query the packed HMDB XML archive.")
+    parser.add_argument("--pack", default=HMDB_XML_PACK_FILE, help="Path to the XML pack")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Move the files of an hmdb_xml directory into the pack")
+    migrate_parser.add_argument("--xml-dir", default='data/hmdb_xml', help="Directory with {id}_raw.xml files")
+    migrate_parser.add_argument("--remove", action="store_true", help="Delete the files once they are packed")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Print the XML document of an HMDB ID")
+    lookup_parser.add_argument("hmdb_id", help="HMDB accession")
+
+    args = parser.parse_args()
+
+    try:
+        pack = HMDBXMLPack(args.pack)
+        if args.command == "migrate":
+            migrate_xml_dir(args.xml_dir, pack, remove=args.remove)
+        else:
+            xml = pack.get_xml(args.hmdb_id)
+            if xml is None:
+                logger.error(f"{args.hmdb_id} is not in the XML pack {args.pack}")
+                return 1
+            print(xml.decode('utf-8'))
+        pack.close()
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error running HMDB XML pack command: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,9 @@ from datetime import datetime
 from typing import Dict, Any, List
 from urllib.parse import quote
 
+from pubchem_cid_cache import get_shared_cid_cache
+from service_limits import service_call, PUBCHEM_HOST
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,7 +24,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Constants
-RATE_LIMIT_DELAY = 0.5  # seconds between API calls to avoid rate limiting
+PUG_REST_URL = 'https://pubchem.ncbi.nlm.nih.gov/rest/pug'
 
 class PubChemLookup:
     """
@@ -35,6 +38,47 @@ class PubChemLookup:
         self.session.headers.update({
             'User-Agent': 'MetaboliteDataEnricher/1.0 (research project; contact@example.com)'
         })
+        # Identifier -> CID resolutions shared with the other PubChem clients, across runs
+        self.cid_cache = get_shared_cid_cache()
+    
+    def _search_compound(self, id_type: str, identifier: str, search_url: str) -> Dict[str, Any]:
+        """
+        Fetch the PubChem compound record found by a search, consulting the CID cache first.
+
+        An identifier the cache has resolved is fetched directly by its CID; one the cache
+        knows PubChem does not have is not searched again until its miss expires.
+
+        Args:
+            id_type (str): Identifier type in the CID cache ('hmdb' or 'name')
+            identifier (str): HMDB ID or name
+            search_url (str): PUG REST URL searching the compound by the identifier
+
+        Returns:
+            Dict[str, Any]: PUG REST compound record (PC_Compounds)
+
+        Raises:
+            LookupError: If the cache knows that the identifier does not resolve
+            requests.RequestException: If the request fails
+        """
+        cid = self.cid_cache.get(id_type, identifier) if self.cid_cache is not None else None
+        if cid == '':
+            raise LookupError(f"PubChem has no compound for {id_type} '{identifier}' (cached miss)")
+        if cid:
+            search_url = f"{PUG_REST_URL}/compound/cid/{cid}/JSON"
+
+        with service_call(PUBCHEM_HOST):
+            response = self.session.get(search_url, timeout=30)
+        if response.status_code == 404 and not cid and self.cid_cache is not None:
+            self.cid_cache.put(id_type, identifier, '')
+        response.raise_for_status()
+        data = response.json()
+
+        if not cid and self.cid_cache is not None:
+            compounds = data.get('PC_Compounds') or [{}]
+            found = compounds[0].get('id', {}).get('id', {}).get('cid')
+            if found:
+                self.cid_cache.put(id_type, identifier, str(found))
+        return data
     
     def get_pubchem_info(self, metabolite_name: str, hmdb_id: str = "") -> Dict[str, Any]:
         """
@@ -63,11 +107,9 @@ class PubChemLookup:
             if hmdb_id and hmdb_id != 'NOID00000':
                 try:
                     # Try direct lookup by HMDB ID using xref endpoint (most reliable method)
-                    search_url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/xref/RegistryID/{hmdb_id}/JSON"
+                    search_url = f"{PUG_REST_URL}/compound/xref/RegistryID/{hmdb_id}/JSON"
                     logger.info(f"Searching PubChem by HMDB ID: {hmdb_id} for {metabolite_name}")
-                    response = self.session.get(search_url, timeout=30)
-                    response.raise_for_status()
-                    data = response.json()
+                    data = self._search_compound('hmdb', hmdb_id, search_url)
                     logger.debug(f"PubChem HMDB ID search successful for {hmdb_id}")
                 except Exception as hmdb_search_error:
                     logger.warning(f"Failed to find {metabolite_name} (HMDB ID: {hmdb_id}) in PubChem by HMDB ID, falling back to name search: {hmdb_search_error}")
@@ -75,11 +117,9 @@ class PubChemLookup:
             # If HMDB ID search failed or wasn't available, try by name
             if data is None:
                 try:
-                    search_url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{quote(metabolite_name)}/JSON"
+                    search_url = f"{PUG_REST_URL}/compound/name/{quote(metabolite_name)}/JSON"
                     logger.info(f"Searching PubChem by name: {metabolite_name}")
-                    response = self.session.get(search_url, timeout=30)
-                    response.raise_for_status()
-                    data = response.json()
+                    data = self._search_compound('name', metabolite_name, search_url)
                     logger.debug(f"PubChem name search successful for {metabolite_name}")
                 except Exception as name_search_error:
                     logger.error(f"Error fetching PubChem data for {metabolite_name}: {name_search_error}")
@@ -147,9 +187,6 @@ class PubChemLookup:
             
             # Cache the result
             self.cache[cache_key] = info
-
-            # Rate limiting
-            time.sleep(RATE_LIMIT_DELAY)
             
             return info
             
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+InChIKey -> CID Index
+
+Offline index that resolves InChIKeys to PubChem CIDs without any request. It is
+built from PubChem's bulk CID-InChI-Key file
+(https://ftp.ncbi.nlm.nih.gov/pubchem/Compound/Extras/CID-InChI-Key.gz), which
+has one "CID<TAB>InChI<TAB>InChIKey" line per compound.
+
+The index file has an 8-byte header and then fixed-width records sorted by key.
+Each record is 19 bytes:
+- the 25 letters of the InChIKey as a 15-byte big-endian base-26 number, so
+  byte order equals key order;
+- the CID as a 4-byte big-endian integer.
+When several CIDs share an InChIKey, the lowest CID is kept. A lookup
+binary-searches the memory-mapped file, touching about 27 records for all of
+PubChem.
+
+Ingestion sorts the bulk file in chunks written to temporary run files and
+merges them, so memory stays bounded whatever the file size.
+
+Usage:
+    python src/inchikey_cid_index.py ingest CID-InChI-Key.gz
+    python src/inchikey_cid_index.py lookup BSYNRYMUTXBXSQ-UHFFFAOYSA-N
+"""
+
+import argparse
+import gzip
+import heapq
+import logging
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import IO, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Constants
+INCHIKEY_INDEX_FILE = 'data/inchikey_cid.idx'
+INDEX_MAGIC = b'IKCID\x00\x01\x00'  # Format name and version
+KEY_SIZE = 15     # 26**25 < 2**120
+CID_SIZE = 4
+RECORD_SIZE = KEY_SIZE + CID_SIZE
+INGEST_CHUNK_RECORDS = 5_000_000  # Records sorted in memory per run file (~100 MB)
+
+INCHIKEY_PATTERN = re.compile(r'^[A-Z]{14}-[A-Z]{10}-[A-Z]$')
+# Maps the letters of an InChIKey to base-26 digits, so int(..., 26) can pack them
+_BASE26_DIGITS = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', '0123456789abcdefghijklmnop', '-')
+
+
+def encode_inchikey(inchikey: str) -> Optional[bytes]:
+    """
+    Pack an InChIKey into its sortable 15-byte form.
+
+    Args:
+        inchikey (str): InChIKey, e.g. 'BSYNRYMUTXBXSQ-UHFFFAOYSA-N'
+
+    Returns:
+        Optional[bytes]: Packed key, or None if the string is not a standard InChIKey
+    """
+    inchikey = inchikey.strip().upper()
+    if not INCHIKEY_PATTERN.match(inchikey):
+        return None
+    return int(inchikey.translate(_BASE26_DIGITS), 26).to_bytes(KEY_SIZE, 'big')
+
+
+def _open_bulk_file(path: str) -> IO[str]:
+    """Open the bulk file, decompressing it on the fly if it is gzipped."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='ascii', errors='replace')
+    return open(path, 'r', encoding='ascii', errors='replace')
+
+
+def _read_run(path: str) -> Iterator[bytes]:
+    """Read the records of a sorted run file."""
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(RECORD_SIZE * 65536)
+            if not block:
+                return
+            for offset in range(0, len(block), RECORD_SIZE):
+                yield block[offset:offset + RECORD_SIZE]
+
+
+def _write_run(records: List[bytes], directory: str) -> str:
+    """Sort records and write them to a new run file; returns its path."""
+    records.sort()
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(b''.join(records))
+    return path
+
+
+def build_inchikey_index(bulk_path: str, index_path: str = INCHIKEY_INDEX_FILE,
+                         chunk_records: int = INGEST_CHUNK_RECORDS) -> int:
+    """
+    Build the index from a PubChem CID-InChI-Key bulk file.
+
+    The index is written next to its final path and moved into place when complete,
+    so an interrupted build leaves any previous index untouched.
+
+    Args:
+        bulk_path (str): Path to CID-InChI-Key(.gz)
+        index_path (str): Path of the index to write
+        chunk_records (int): Records sorted in memory at a time
+
+    Returns:
+        int: Number of InChIKeys in the index
+    """
+    start_time = time.time()
+    Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+    directory = os.path.dirname(os.path.abspath(index_path))
+    runs = []
+    records = []
+    lines = 0
+    skipped = 0
+
+    try:
+        with _open_bulk_file(bulk_path) as f:
+            for line in f:
+                lines += 1
+                parts = line.rstrip('\n').split('\t')
+                key = encode_inchikey(parts[-1]) if len(parts) >= 2 else None
+                if key is None or not parts[0].isdigit() or int(parts[0]) >= 2 ** 32:
+                    skipped += 1
+                    continue
+                records.append(key + int(parts[0]).to_bytes(CID_SIZE, 'big'))
+                if len(records) >= chunk_records:
+                    runs.append(_write_run(records, directory))
+                    records = []
+                    logger.info(f"Sorted {lines} lines of {bulk_path} into {len(runs)} runs")
+        if records:
+            runs.append(_write_run(records, directory))
+        records = []
+
+        # Merge the runs; for a key listed with several CIDs the lowest CID sorts first and is kept
+        count = 0
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as out:
+            out.write(INDEX_MAGIC)
+            previous_key = None
+            buffer = []
+            for record in heapq.merge(*(_read_run(run) for run in runs)):
+                key = record[:KEY_SIZE]
+                if key == previous_key:
+                    continue
+                previous_key = key
+                buffer.append(record)
+                count += 1
+                if len(buffer) >= 65536:
+                    out.write(b''.join(buffer))
+                    buffer = []
+            out.write(b''.join(buffer))
+        os.replace(temp_path, index_path)
+    finally:
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
+
+    logger.info(f"Indexed {count} InChIKeys from {lines} lines of {bulk_path} ({skipped} skipped) "
+                f"into {index_path} in {time.time() - start_time:.1f} seconds "
+                f"({os.path.getsize(index_path) / 1e6:.1f} MB)")
+    return count
+
+
+class InChIKeyCIDIndex:
+    """Read-only, memory-mapped InChIKey -> CID index."""
+
+    def __init__(self, path: str = INCHIKEY_INDEX_FILE):
+        """
+        Open the index.
+
+        Args:
+            path (str): Path to an index built by build_inchikey_index
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        size = os.path.getsize(path)
+        if size < len(INDEX_MAGIC) or (size - len(INDEX_MAGIC)) % RECORD_SIZE:
+            self._file.close()
+            raise ValueError(f"{path} is not an InChIKey index (size {size})")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an InChIKey index (bad header)")
+        self._count = (size - len(INDEX_MAGIC)) // RECORD_SIZE
+
+    def get(self, inchikey: str) -> Optional[str]:
+        """
+        Look up the CID of an InChIKey.
+
+        Args:
+            inchikey (str): InChIKey
+
+        Returns:
+            Optional[str]: CID, or None if the index does not contain the key
+        """
+        key = encode_inchikey(inchikey)
+        if key is None:
+            return None
+        data = self._map
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            offset = len(INDEX_MAGIC) + middle * RECORD_SIZE
+            probe = data[offset:offset + KEY_SIZE]
+            if probe < key:
+                low = middle + 1
+            elif probe > key:
+                high = middle
+            else:
+                return str(int.from_bytes(data[offset + KEY_SIZE:offset + RECORD_SIZE], 'big'))
+        return None
+
+    def __contains__(self, inchikey: str) -> bool:
+        return self.get(inchikey) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        """Close the index."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+
+
+def open_inchikey_index(path: str = INCHIKEY_INDEX_FILE) -> Optional[InChIKeyCIDIndex]:
+    """
+    Open the InChIKey index if it has been built.
+
+    Args:
+        path (str): Path to the index
+
+    Returns:
+        Optional[InChIKeyCIDIndex]: The index, or None if no index has been built at that path
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return InChIKeyCIDIndex(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error opening InChIKey index {path}: {e}")
+        return None
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Build and query the offline InChIKey -> PubChem CID index.")
+    parser.add_argument("--index", default=INCHIKEY_INDEX_FILE, help="Path to the index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Build the index from a PubChem CID-InChI-Key file")
+    ingest_parser.add_argument("bulk_file", help="Path to CID-InChI-Key or CID-InChI-Key.gz")
+    ingest_parser.add_argument("--chunk-records", type=int, default=INGEST_CHUNK_RECORDS,
+                               help="Records sorted in memory at a time")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Print the CID of an InChIKey")
+    lookup_parser.add_argument("inchikey", help="InChIKey")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "ingest":
+            build_inchikey_index(args.bulk_file, args.index, chunk_records=args.chunk_records)
+            return 0
+
+        index = InChIKeyCIDIndex(args.index)
+        cid = index.get(args.inchikey)
+        index.close()
+        if cid is None:
+            logger.error(f"{args.inchikey} is not in the InChIKey index {args.index}")
+            return 1
+        print(cid)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error running InChIKey index command: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
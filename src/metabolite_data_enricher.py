@@ -10,12 +10,15 @@ Separated from diet advice generation for better modularity and maintainability.
 """
 
 import argparse
+import hashlib
 import json
 import os
 import re
 import sys
 import time
 import copy
+import threading
+import zlib
 import pandas as pd
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple, Union
@@ -25,6 +28,11 @@ from dotenv import load_dotenv
 import requests
 from bs4 import BeautifulSoup
 import pickle
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+
+from service_limits import service_call, PUBCHEM_HOST, OPENROUTER_HOST
+from hmdb_xml_extractor import EXTRACTABLE_FIELDS
+from enrichment_journal import EnrichmentJournal, merge_journals
 
 # Configure logging
 # Create logs directory if it doesn't exist
@@ -48,9 +56,23 @@ logger.debug(f"Environment variable source confirmation - OPENROUTER_API_KEY is
 
 # Constants
 CACHE_FILE = "data/metabolite_enrichment_cache.pkl"
+# Bump whenever a change to the enrichment logic should invalidate records reused by --since
+ENRICHER_VERSION = "1.2.0"
 ENRICHED_JSON_FILE = "data/metabolite_enriched_data.json"
 ENRICHED_CSV_FILE = "data/enriched_normal_ranges.csv"
-RATE_LIMIT_DELAY = 2  # Seconds between API calls
+JOURNAL_FILE = "data/metabolite_enrichment_journal.jsonl"
+DEFAULT_INPUT_CSV = "src/input/normal_ranges_with_all_HMDB_IDs.csv"
+ENRICHED_BY_NAME_JSON_FILE = "data/metabolite_enriched_data_by_name.json"
+STREAM_CSV_CHUNK_SIZE = 1000  # CSV rows buffered at a time when streaming outputs
+CID_RACE_WINDOW = 4  # CID search strategies in flight at once per metabolite with race_cid_strategies
+# HMDB fields always read in a field-restricted run (hmdb_fields), so PubChem CIDs are still
+# resolved from the structure instead of by name. They sit near the head of a record; the
+# cross-references (pubchem_compound_id, chebi_id, kegg_id) come near its end and are only
+# read when requested, as reading them would mean parsing the whole record
+HMDB_IDENTIFIER_FIELDS = ('inchikey', 'inchi', 'smiles')
+PUBCHEM_CID_CACHE_PREFIX = "pubchem_cid:"  # Cache keys of the PubChem compound info per CID
+# Write-only PubChem entries of older versions, keyed by CID and metabolite name
+LEGACY_PUBCHEM_CACHE_KEY = re.compile(r'^pubchem_\d+_')
 
 # Perplexity models via OpenRouter for metabolite enrichment
 PERPLEXITY_FALLBACK_MODELS = [
@@ -64,9 +86,24 @@ PERPLEXITY_FALLBACK_MODELS = [
 class MetaboliteDataEnricher:
     """Class for enriching metabolite information from multiple data sources."""
 
-    def __init__(self, cache_file: str = CACHE_FILE, use_perplexity_first: bool = False, refresh_cache: bool = False, force_pubchem: bool = False, include_health_conditions: bool = False, include_food_recommendations: bool = False):
+    def __init__(self, cache_file: str = CACHE_FILE, use_perplexity_first: bool = False, refresh_cache: bool = False, force_pubchem: bool = False, include_health_conditions: bool = False, include_food_recommendations: bool = False, workers: int = 1, parallel_sources: bool = False, race_cid_strategies: bool = False, hmdb_fields: Optional[List[str]] = None):
         self.cache_file = cache_file
         self.cache = self.load_cache()
+        # Guards self.cache when metabolites are enriched by several workers at once
+        self._cache_lock = threading.RLock()
+        self.workers = max(1, workers or 1)
+        # Fetch the independent sources of one metabolite concurrently (see _get_sources_concurrently)
+        self.parallel_sources = parallel_sources
+        self._source_executor = None
+        # Run the PubChem CID search strategies concurrently (see _race_pubchem_cid_candidates)
+        self.race_cid_strategies = race_cid_strategies
+        self._race_executor = None
+        # Only parse these HMDB XML fields, plus the identifiers (see _get_hmdb_fields); all fields when None
+        self.hmdb_fields = self._get_hmdb_fields(hmdb_fields)
+        # Long-lived HMDB client, created on first use (see _get_hmdb_lookup)
+        self.hmdb_lookup = None
+        # Shared PubChem CID resolver, created on first use (see _get_cid_resolver)
+        self.cid_resolver = None
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Metabolite Research Tool) AppleWebKit/537.36'
@@ -93,6 +130,11 @@ class MetaboliteDataEnricher:
             try:
                 with open(self.cache_file, 'rb') as f:
                     cache = pickle.load(f)
+                legacy_keys = [key for key in cache if isinstance(key, str) and LEGACY_PUBCHEM_CACHE_KEY.match(key)]
+                for key in legacy_keys:
+                    del cache[key]
+                if legacy_keys:
+                    logger.info(f"Dropped {len(legacy_keys)} unused PubChem entries keyed by CID and name from the cache")
                 logger.info(f"Loaded cache with {len(cache)} entries")
                 return cache
             except Exception as e:
@@ -103,9 +145,15 @@ class MetaboliteDataEnricher:
         """Save cache to disk."""
         try:
             Path(self.cache_file).parent.mkdir(parents=True, exist_ok=True)
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump(self.cache, f)
-            logger.info(f"Saved cache with {len(self.cache)} entries")
+            # Write to a temporary file and rename it, so a crash mid-write never corrupts the cache
+            temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with self._cache_lock:
+                with open(temp_file, 'wb') as f:
+                    pickle.dump(self.cache, f)
+                os.replace(temp_file, self.cache_file)
+                logger.info(f"Saved cache with {len(self.cache)} entries")
+            if self.hmdb_lookup is not None:
+                self.hmdb_lookup.save_parsed_cache()
         except Exception as e:
             logger.error(f"Failed to save cache: {e}")
 
@@ -126,14 +174,15 @@ class MetaboliteDataEnricher:
         cache_key = f"perplexity_{hmdb_id}_{metabolite_name}"
         if cache_key in self.cache and not self.refresh_cache:
             logger.debug(f"Using cached Perplexity data for {metabolite_name} (HMDB ID: {hmdb_id})")
-            result = self.cache[cache_key]
-            # Add timing information for cached results
-            if 'timing' not in result:
-                result['timing'] = {
-                    'source': 'perplexity',
-                    'elapsed_seconds': 0.0,
-                    'from_cache': True
-                }
+            with self._cache_lock:
+                result = self.cache[cache_key]
+                # Add timing information for cached results
+                if 'timing' not in result:
+                    result['timing'] = {
+                        'source': 'perplexity',
+                        'elapsed_seconds': 0.0,
+                        'from_cache': True
+                    }
             return result
         
         if self.refresh_cache:
@@ -167,10 +216,8 @@ class MetaboliteDataEnricher:
                 logger.debug(f"Perplexity API fetch took {elapsed_time:.2f} seconds for {metabolite_name} ({hmdb_id})")
 
                 # Cache the result
-                self.cache[cache_key] = info
-
-                # Rate limiting
-                time.sleep(RATE_LIMIT_DELAY)
+                with self._cache_lock:
+                    self.cache[cache_key] = info
 
                 return info
             else:
@@ -189,7 +236,8 @@ class MetaboliteDataEnricher:
                     'success': False
                 }
                 
-                self.cache[cache_key] = empty_info
+                with self._cache_lock:
+                    self.cache[cache_key] = empty_info
                 return empty_info
 
         except Exception as e:
@@ -210,7 +258,8 @@ class MetaboliteDataEnricher:
                 'error': True
             }
             
-            self.cache[cache_key] = empty_info
+            with self._cache_lock:
+                self.cache[cache_key] = empty_info
             return empty_info
 
     def _create_perplexity_metabolite_prompt(self, hmdb_id: str, metabolite_name: str) -> str:
@@ -305,12 +354,13 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 }
 
                 logger.debug(f"Sending request to OpenRouter API with model {model}")
-                response = self.session.post(
-                    'https://openrouter.ai/api/v1/chat/completions',
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
-                )
+                with service_call(OPENROUTER_HOST):
+                    response = self.session.post(
+                        'https://openrouter.ai/api/v1/chat/completions',
+                        headers=headers,
+                        json=payload,
+                        timeout=timeout
+                    )
 
                 if response.status_code == 200:
                     data = response.json()
@@ -467,15 +517,16 @@ Focus on providing accurate, scientific information from reliable biochemical an
         # Start timing
         start_time = time.time()
         
-        if hmdb_id in self.cache and not self.refresh_cache:
-            result = self.cache[hmdb_id]
-            # Add timing information for cached results
-            if 'timing' not in result:
-                result['timing'] = {
-                    'source': 'hmdb',
-                    'elapsed_seconds': 0.0,
-                    'from_cache': True
-                }
+        if hmdb_id in self.cache and not self.refresh_cache and not self._needs_hmdb_refetch(self.cache[hmdb_id]):
+            with self._cache_lock:
+                result = self.cache[hmdb_id]
+                # Add timing information for cached results
+                if 'timing' not in result:
+                    result['timing'] = {
+                        'source': 'hmdb',
+                        'elapsed_seconds': 0.0,
+                        'from_cache': True
+                    }
             return result
 
         # Skip NOID metabolites for HMDB lookup
@@ -483,10 +534,8 @@ Focus on providing accurate, scientific information from reliable biochemical an
             return self._create_empty_hmdb_info(hmdb_id)
 
         try:
-            # Use EnhancedHMDBLookup to fetch data
-            from enhanced_hmdb_lookup import EnhancedHMDBLookup
-            hmdb_lookup = EnhancedHMDBLookup()
-            hmdb_data = hmdb_lookup.get_hmdb_info(hmdb_id)
+            # Use the shared EnhancedHMDBLookup to fetch data; a field-restricted run parses the XML lazily
+            hmdb_data = self._get_hmdb_lookup().get_hmdb_info(hmdb_id, fields=self.hmdb_fields)
             
             # Process the data to match the expected format
             info = {
@@ -501,10 +550,20 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 'class': hmdb_data.get('taxonomy', {}).get('class', ''),
                 'sub_class': hmdb_data.get('taxonomy', {}).get('sub_class', ''),
                 'direct_parent': hmdb_data.get('taxonomy', {}).get('direct_parent', ''),
+                # Structure and cross-references let get_pubchem_info resolve the CID without a name search
+                'inchi': hmdb_data.get('inchi', ''),
+                'inchikey': hmdb_data.get('inchikey', ''),
+                'smiles': hmdb_data.get('smiles', ''),
+                'pubchem_cid': hmdb_data.get('pubchem_compound_id', ''),
+                'chebi_id': hmdb_data.get('chebi_id', ''),
+                'kegg_id': hmdb_data.get('kegg_id', ''),
                 'source': 'HMDB',
                 'timestamp': datetime.now().isoformat(),
                 'success': hmdb_data.get('hmdb_success', False)
             }
+            if self.hmdb_fields is not None:
+                # Lets a later run that needs more fields tell the entry is incomplete
+                info['hmdb_fields'] = list(self.hmdb_fields)
 
             # Calculate time taken
             end_time = time.time()
@@ -520,10 +579,8 @@ Focus on providing accurate, scientific information from reliable biochemical an
             logger.debug(f"HMDB fetch took {elapsed_time:.2f} seconds for {hmdb_id}")
             
             # Cache the result
-            self.cache[hmdb_id] = info
-
-            # Rate limiting
-            time.sleep(RATE_LIMIT_DELAY)
+            with self._cache_lock:
+                self.cache[hmdb_id] = info
 
             return info
 
@@ -545,17 +602,23 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 'error': True
             }
             
-            self.cache[hmdb_id] = empty_info
+            with self._cache_lock:
+                self.cache[hmdb_id] = empty_info
             return empty_info
 
-    def get_pubchem_info(self, metabolite_name: str, hmdb_id: str = "") -> Dict[str, Any]:
+    def get_pubchem_info(self, metabolite_name: str, hmdb_id: str = "",
+                         hmdb_info: Optional[Dict[str, Any]] = None,
+                         original_name_cid: Optional[Future] = None) -> Dict[str, Any]:
         """
         Get additional information from PubChem using HMDB data as a bridge.
-        Priority order: CID from HMDB > InChI > SMILES > Chemical name
+        Priority order: CID from HMDB > InChIKey > InChI > SMILES > Chemical name
 
         Args:
             metabolite_name (str): Name of the metabolite
             hmdb_id (str): HMDB ID for cache key
+            hmdb_info (Optional[Dict]): HMDB information already fetched for hmdb_id
+            original_name_cid (Optional[Future]): Lookup of the CID by the original name that
+                                                  is already running, used as the last resort
 
         Returns:
             Dict containing additional chemical information
@@ -567,9 +630,8 @@ Focus on providing accurate, scientific information from reliable biochemical an
         start_time = time.time()
 
         # Step 1: Get identifiers from HMDB data
-        hmdb_info = {}
-        if hmdb_id:
-            hmdb_info = self.get_hmdb_info(hmdb_id)
+        if hmdb_info is None:
+            hmdb_info = self.get_hmdb_info(hmdb_id) if hmdb_id else {}
 
         # Step 2: Try to determine PubChem CID using priority order
         cid = ""
@@ -583,52 +645,22 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 search_method = "HMDB CID"
                 logger.info(f"Found PubChem CID {cid} from HMDB data for {metabolite_name}")
 
-        # Priority 2: Try InChI string from HMDB
-        if not cid and hmdb_info.get('success'):
-            inchi = hmdb_info.get('inchi', '')
-            if inchi:
-                cid = self._get_cid_by_inchi(inchi)
-                if cid:
-                    search_method = "HMDB InChI"
-                    logger.info(f"Found PubChem CID {cid} using InChI from HMDB for {metabolite_name}")
-
-        # Priority 3: Try SMILES string from HMDB
-        if not cid and hmdb_info.get('success'):
-            smiles = hmdb_info.get('smiles', '')
-            if smiles:
-                cid = self._get_cid_by_smiles(smiles)
-                if cid:
-                    search_method = "HMDB SMILES"
-                    logger.info(f"Found PubChem CID {cid} using SMILES from HMDB for {metabolite_name}")
-
-        # Priority 4: Try chemical names from HMDB (common name, IUPAC name, synonyms)
-        if not cid and hmdb_info.get('success'):
-            name_candidates = []
-            
-            # Add HMDB names in order of preference
-            if hmdb_info.get('common_name'):
-                name_candidates.append(hmdb_info['common_name'])
-            if hmdb_info.get('iupac_name'):
-                name_candidates.append(hmdb_info['iupac_name'])
-            
-            # Add top synonyms
-            synonyms = hmdb_info.get('synonyms', [])
-            name_candidates.extend(synonyms[:5])  # Try top 5 synonyms
-            
-            for name in name_candidates:
-                if name and name.strip():
-                    cid = self._get_cid_by_name(name.strip())
-                    if cid:
-                        search_method = f"HMDB name: {name[:30]}..."
-                        logger.info(f"Found PubChem CID {cid} using HMDB name '{name}' for {metabolite_name}")
-                        break
-
-        # Priority 5: Fall back to original metabolite name
-        if not cid:
-            cid = self._get_cid_by_name(metabolite_name)
+        # Priority 2-6: Search PubChem by the HMDB InChIKey, InChI, SMILES and names, then the original name
+        if not cid and self.race_cid_strategies:
+            cid, search_method = self._race_pubchem_cid_candidates(
+                self._pubchem_cid_candidates(metabolite_name, hmdb_info), original_name_cid)
             if cid:
-                search_method = "Original name"
-                logger.info(f"Found PubChem CID {cid} using original name for {metabolite_name}")
+                logger.info(f"Found PubChem CID {cid} using {search_method} for {metabolite_name}")
+        elif not cid:
+            for namespace, identifier, method in self._pubchem_cid_candidates(metabolite_name, hmdb_info):
+                if method == "Original name" and original_name_cid is not None:
+                    cid = original_name_cid.result()
+                else:
+                    cid = self._get_cid_resolver().resolve(namespace, identifier)
+                if cid:
+                    search_method = method
+                    logger.info(f"Found PubChem CID {cid} using {method} for {metabolite_name}")
+                    break
 
         if not cid:
             logger.warning(f"No PubChem CID found for {metabolite_name} using any method, skipping PubChem enrichment.")
@@ -652,34 +684,27 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 'search_methods_tried': search_method or 'All methods failed'
             }
 
-        # Step 3: Get compound data from PubChem using CID
-        retriever = PubChemRetriever()
-        compound_data = retriever.get_compound_data(cid)
-
-        synonyms = compound_data.get('synonyms', [])
-        logger.info(f"Retrieved {len(synonyms)} synonyms from PubChem for {metabolite_name} (CID: {cid}, Method: {search_method})")
-
-        # Extract bioactivity data and join into biological summary
-        bioactivity_list = compound_data.get('bioactivity', [])
-        biological_summary = '. '.join(bioactivity_list) if bioactivity_list else ''
-
-        # Extract classifications and taxonomy data
-        classifications = compound_data.get('classifications', {})
-        taxonomy = compound_data.get('taxonomy', {})
+        # Step 3: Get compound data from PubChem using CID, reading through the per-CID cache, so a CID
+        # reached from several rows or runs is only fetched and extracted once. The entry is copied
+        # both ways, so merging the rows that share it never alters the cached lists and dicts
+        cache_key = f"{PUBCHEM_CID_CACHE_PREFIX}{cid}"
+        with self._cache_lock:
+            compound_info = None if self.refresh_cache else copy.deepcopy(self.cache.get(cache_key))
+        from_cache = compound_info is not None
+        if compound_info is None:
+            compound_data = PubChemRetriever().get_compound_data(cid)
+            compound_info = self._pubchem_compound_info(compound_data)
+            # Compound data that could not be retrieved is not cached, so it is fetched again next time
+            if any(compound_data.values()):
+                with self._cache_lock:
+                    self.cache[cache_key] = copy.deepcopy(compound_info)
+
+        logger.info(f"Retrieved {len(compound_info['pubchem_synonyms'])} synonyms from PubChem for {metabolite_name} "
+                    f"(CID: {cid}, Method: {search_method}{', cached' if from_cache else ''})")
 
         info = {
             'pubchem_cid': cid,
-            'molecular_formula': compound_data.get('properties', {}).get('molecular_formula', ''),
-            'molecular_weight': compound_data.get('properties', {}).get('molecular_weight', ''),
-            'canonical_smiles': '',  # Not parsed in retriever, could be added if needed
-            'inchi': '',             # Not parsed in retriever, could be added if needed
-            'pubchem_synonyms': synonyms,
-            'compound_description': compound_data.get('description', ''),
-            'biological_summary': biological_summary,
-            'pharmacology': '',  # Could be extracted from bioactivity if needed
-            'literature_abstracts': compound_data.get('literature', []),
-            'classifications': classifications,
-            'pubchem_taxonomy': taxonomy,
+            **compound_info,
             'search_method': search_method,
             'source': 'PubChem',
             'timestamp': datetime.now().isoformat(),
@@ -691,12 +716,39 @@ Focus on providing accurate, scientific information from reliable biochemical an
         info['timing'] = {
             'source': 'pubchem',
             'elapsed_seconds': elapsed_time,
-            'from_cache': False
+            'from_cache': from_cache
         }
-
-        self.cache[f"pubchem_{cid}_{metabolite_name}"] = info
         return info
 
+    @staticmethod
+    def _pubchem_compound_info(compound_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the PubChem fields of an enriched record that depend only on the CID.
+
+        Args:
+            compound_data (Dict): Output of PubChemRetriever.get_compound_data
+
+        Returns:
+            Dict: Compound fields of the get_pubchem_info result
+        """
+        # Extract bioactivity data and join into biological summary
+        bioactivity_list = compound_data.get('bioactivity', [])
+        biological_summary = '. '.join(bioactivity_list) if bioactivity_list else ''
+
+        return {
+            'molecular_formula': compound_data.get('properties', {}).get('molecular_formula', ''),
+            'molecular_weight': compound_data.get('properties', {}).get('molecular_weight', ''),
+            'canonical_smiles': '',  # Not parsed in retriever, could be added if needed
+            'inchi': '',             # Not parsed in retriever, could be added if needed
+            'pubchem_synonyms': compound_data.get('synonyms', []),
+            'compound_description': compound_data.get('description', ''),
+            'biological_summary': biological_summary,
+            'pharmacology': '',  # Could be extracted from bioactivity if needed
+            'literature_abstracts': compound_data.get('literature', []),
+            'classifications': compound_data.get('classifications', {}),
+            'pubchem_taxonomy': compound_data.get('taxonomy', {})
+        }
+
     def _extract_pubchem_synonyms(self, cid: str) -> list:
         """
         Extract synonyms for a compound from PubChem using the PUG View API.
@@ -712,7 +764,8 @@ Focus on providing accurate, scientific information from reliable biochemical an
         
         try:
             url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{cid}/JSON?heading=Synonyms"
-            response = self.session.get(url, timeout=30)
+            with service_call(PUBCHEM_HOST):
+                response = self.session.get(url, timeout=30)
             
             if response.status_code != 200:
                 logger.warning(f"Failed to get PubChem synonyms for CID {cid}: {response.status_code}")
@@ -765,7 +818,8 @@ Focus on providing accurate, scientific information from reliable biochemical an
             pugview_url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{cid}/JSON"
             logger.info(f"Fetching additional PubChem data for CID {cid}")
             
-            response = self.session.get(pugview_url, timeout=30)
+            with service_call(PUBCHEM_HOST):
+                response = self.session.get(pugview_url, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -966,6 +1020,18 @@ Focus on providing accurate, scientific information from reliable biochemical an
         
         return abstracts
 
+    def _get_cid_by_inchikey(self, inchikey: str) -> str:
+        """
+        Get PubChem CID using InChIKey.
+        
+        Args:
+            inchikey (str): InChIKey
+            
+        Returns:
+            str: PubChem CID or empty string if not found
+        """
+        return self._get_cid_resolver().resolve('inchikey', inchikey)
+
     def _get_cid_by_inchi(self, inchi: str) -> str:
         """
         Get PubChem CID using InChI string.
@@ -976,20 +1042,7 @@ Focus on providing accurate, scientific information from reliable biochemical an
         Returns:
             str: PubChem CID or empty string if not found
         """
-        try:
-            import requests
-            from urllib.parse import quote
-            url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/inchi/{quote(inchi)}/cids/JSON"
-            response = requests.get(url, timeout=20)
-            if response.status_code == 200:
-                data = response.json()
-                if "IdentifierList" in data and "CID" in data["IdentifierList"]:
-                    cid_list = data["IdentifierList"]["CID"]
-                    if cid_list:
-                        return str(cid_list[0])
-        except Exception as e:
-            logger.debug(f"Error getting CID by InChI: {e}")
-        return ""
+        return self._get_cid_resolver().resolve('inchi', inchi)
 
     def _get_cid_by_smiles(self, smiles: str) -> str:
         """
@@ -1001,20 +1054,7 @@ Focus on providing accurate, scientific information from reliable biochemical an
         Returns:
             str: PubChem CID or empty string if not found
         """
-        try:
-            import requests
-            from urllib.parse import quote
-            url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/smiles/{quote(smiles)}/cids/JSON"
-            response = requests.get(url, timeout=20)
-            if response.status_code == 200:
-                data = response.json()
-                if "IdentifierList" in data and "CID" in data["IdentifierList"]:
-                    cid_list = data["IdentifierList"]["CID"]
-                    if cid_list:
-                        return str(cid_list[0])
-        except Exception as e:
-            logger.debug(f"Error getting CID by SMILES: {e}")
-        return ""
+        return self._get_cid_resolver().resolve('smiles', smiles)
 
     def _get_cid_by_name(self, name: str) -> str:
         """
@@ -1026,20 +1066,168 @@ Focus on providing accurate, scientific information from reliable biochemical an
         Returns:
             str: PubChem CID or empty string if not found
         """
+        return self._get_cid_resolver().resolve('name', name)
+
+    def _get_cid_resolver(self):
+        """
+        Get (or lazily create) the PubChem CID resolver shared by all workers.
+
+        It remembers every identifier it has resolved for the rest of the run, and
+        across runs through the shared PubChem CID cache, so identifiers are only
+        sent to PubChem once (misses once per TTL). InChIKeys are resolved offline
+        when the InChIKey index has been built (see inchikey_cid_index). With
+        refresh_cache, resolutions of earlier runs are not read, only overwritten.
+
+        Returns:
+            PubChemCIDResolver: Shared resolver
+        """
+        with self._cache_lock:
+            if self.cid_resolver is None:
+                from inchikey_cid_index import open_inchikey_index
+                from pubchem_cid_cache import get_shared_cid_cache
+                from pubchem_cid_resolver import PubChemCIDResolver
+                self.cid_resolver = PubChemCIDResolver(cid_cache=get_shared_cid_cache(),
+                                                       inchikey_index=open_inchikey_index(),
+                                                       refresh=self.refresh_cache)
+            return self.cid_resolver
+
+    def _pubchem_cid_candidates(self, metabolite_name: str, hmdb_info: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        """
+        List the identifiers a PubChem CID is searched by when HMDB does not provide one.
+        
+        Priority order: InChIKey > InChI > SMILES > HMDB names > original name
+        
+        Args:
+            metabolite_name (str): Name of the metabolite
+            hmdb_info (Dict): HMDB information of the metabolite
+            
+        Returns:
+            List[Tuple[str, str, str]]: (PubChem namespace, identifier, search method) in priority order
+        """
+        candidates = []
+        if hmdb_info.get('success'):
+            # An exact structure match with a short URL first
+            if hmdb_info.get('inchikey'):
+                candidates.append(('inchikey', hmdb_info['inchikey'], "HMDB InChIKey"))
+            if hmdb_info.get('inchi'):
+                candidates.append(('inchi', hmdb_info['inchi'], "HMDB InChI"))
+            if hmdb_info.get('smiles'):
+                candidates.append(('smiles', hmdb_info['smiles'], "HMDB SMILES"))
+
+            # HMDB names in order of preference: common name, IUPAC name, top 5 synonyms
+            name_candidates = []
+            if hmdb_info.get('common_name'):
+                name_candidates.append(hmdb_info['common_name'])
+            if hmdb_info.get('iupac_name'):
+                name_candidates.append(hmdb_info['iupac_name'])
+            name_candidates.extend(hmdb_info.get('synonyms', [])[:5])
+            for name in name_candidates:
+                if name and name.strip():
+                    candidates.append(('name', name.strip(), f"HMDB name: {name[:30]}..."))
+
+        # Fall back to the original metabolite name
+        candidates.append(('name', metabolite_name, "Original name"))
+        return candidates
+
+    def _race_pubchem_cid_candidates(self, candidates: List[Tuple[str, str, str]],
+                                     original_name_cid: Optional[Future] = None) -> Tuple[str, str]:
+        """
+        Try the CID search strategies of a metabolite concurrently instead of one after another.
+
+        Up to CID_RACE_WINDOW strategies are in flight at once, in priority order, and
+        the window is refilled as they finish. A strategy's answer is taken once every
+        higher-priority strategy has come back without a CID, so the result is the
+        same as with the sequential search; only slow misses and timeouts overlap.
+        Strategies that have not started by then are cancelled. Requests that are
+        already running cannot be interrupted: they finish in the background, and
+        their answers still go to the resolver's caches.
+
+        Args:
+            candidates (List[Tuple[str, str, str]]): Output of _pubchem_cid_candidates
+            original_name_cid (Optional[Future]): Lookup of the CID by the original name that
+                                                  is already running, used for that strategy
+
+        Returns:
+            Tuple[str, str]: (PubChem CID, search method), or empty strings if no strategy found a CID
+        """
+        resolver = self._get_cid_resolver()
+        executor = self._get_race_executor()
+        futures: List[Future] = []
+
+        def launch() -> None:
+            """Start strategies in priority order until the window is full."""
+            while len(futures) < len(candidates) and sum(1 for f in futures if not f.done()) < CID_RACE_WINDOW:
+                namespace, identifier, method = candidates[len(futures)]
+                if method == "Original name" and original_name_cid is not None:
+                    futures.append(original_name_cid)
+                    continue
+                known = resolver.lookup(namespace, identifier)
+                if known is not None:
+                    future = Future()
+                    future.set_result(known)
+                else:
+                    future = executor.submit(resolver.resolve, namespace, identifier)
+                futures.append(future)
+
         try:
-            import requests
-            from urllib.parse import quote
-            url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{quote(name)}/cids/JSON"
-            response = requests.get(url, timeout=20)
-            if response.status_code == 200:
-                data = response.json()
-                if "IdentifierList" in data and "CID" in data["IdentifierList"]:
-                    cid_list = data["IdentifierList"]["CID"]
-                    if cid_list:
-                        return str(cid_list[0])
-        except Exception as e:
-            logger.debug(f"Error getting CID by name '{name}': {e}")
-        return ""
+            for index, (_, _, method) in enumerate(candidates):
+                launch()
+                while not futures[index].done():
+                    wait([f for f in futures if not f.done()], return_when=FIRST_COMPLETED)
+                    launch()
+                try:
+                    cid = futures[index].result()
+                except Exception as e:
+                    logger.debug(f"CID search by {method} failed: {e}")
+                    cid = ""
+                if cid:
+                    return cid, method
+            return "", ""
+        finally:
+            for future in futures:
+                if future is not original_name_cid:
+                    future.cancel()
+
+    def _get_race_executor(self) -> ThreadPoolExecutor:
+        """Get (or lazily create) the thread pool for racing CID search strategies."""
+        with self._cache_lock:
+            if self._race_executor is None:
+                self._race_executor = ThreadPoolExecutor(max_workers=CID_RACE_WINDOW * self.workers,
+                                                         thread_name_prefix='enricher-cid-race')
+            return self._race_executor
+
+    def _resolve_pubchem_cids(self, tasks: List[Tuple[str, str]]) -> None:
+        """
+        Resolve the PubChem CIDs of many metabolites ahead of enrichment.
+
+        The candidate identifiers of every task whose HMDB record has no CID are
+        deduplicated across the run and resolved concurrently, one priority tier at a
+        time, so get_pubchem_info finds its answers in the shared resolver. Each unique
+        identifier that is not cached still costs one PubChem request.
+
+        Args:
+            tasks (List[Tuple[str, str]]): (HMDB ID, metabolite name) pairs whose HMDB records are cached
+        """
+        candidates = {}
+        with self._cache_lock:
+            for hmdb_id, metabolite_name in tasks:
+                hmdb_info = self.cache.get(hmdb_id, {}) if 'NOID' not in hmdb_id else {}
+                if hmdb_info.get('success') and hmdb_info.get('pubchem_cid'):
+                    continue
+                candidates[(hmdb_id, metabolite_name)] = [
+                    (namespace, identifier) for namespace, identifier, _ in self._pubchem_cid_candidates(metabolite_name, hmdb_info)
+                ]
+        if not candidates:
+            return
+
+        logger.info(f"Resolving PubChem CIDs for {len(candidates)} of {len(tasks)} metabolites without a CID from HMDB")
+        resolver = self._get_cid_resolver()
+        resolver.resolve_candidates(candidates)
+        stats = resolver.get_stats()
+        logger.info(f"PubChem CID resolution: {stats['identifiers']} identifiers resolved, "
+                    f"{stats['index_hits']} from the InChIKey index, {stats['cache_hits']} from the CID cache, "
+                    f"with {stats['requests']} requests "
+                    f"({stats['errors']} failed)")
 
     def _extract_any_text_from_section(self, section: Dict) -> str:
         """
@@ -1086,23 +1274,27 @@ Focus on providing accurate, scientific information from reliable biochemical an
         logger.info(f"Enriching {metabolite_name} ({hmdb_id})")
 
         # Initialize info containers
-        perplexity_info = {}
+        perplexity_info = None
         hmdb_info = {}
         pubchem_info = {}
 
-        # Always get HMDB information first
-        hmdb_info = self.get_hmdb_info(hmdb_id)
+        if self.parallel_sources:
+            hmdb_info, pubchem_info, perplexity_info = self._get_sources_concurrently(hmdb_id, metabolite_name)
+        else:
+            # Always get HMDB information first
+            hmdb_info = self.get_hmdb_info(hmdb_id)
+
+            # Always get PubChem information second, bridging from the HMDB data
+            pubchem_info = self.get_pubchem_info(metabolite_name, hmdb_id, hmdb_info=hmdb_info)
         hmdb_success = hmdb_info.get('success', False)
-        
-        # Always get PubChem information second
-        pubchem_info = self.get_pubchem_info(metabolite_name, hmdb_id)
         pubchem_success = pubchem_info.get('success', False)
         
         # Use Perplexity only if both HMDB and PubChem fail (or if explicitly configured to use first)
         if self.use_perplexity_first:
             # Use Perplexity regardless of other sources (if explicitly configured)
             logger.info(f"Using Perplexity for {metabolite_name} (configured to use first)")
-            perplexity_info = self.get_perplexity_metabolite_info(hmdb_id, metabolite_name)
+            if perplexity_info is None:
+                perplexity_info = self.get_perplexity_metabolite_info(hmdb_id, metabolite_name)
         elif not (hmdb_success or pubchem_success):
             # Use Perplexity only as fallback when both HMDB and PubChem failed
             logger.info(f"Using Perplexity as fallback for {metabolite_name} after HMDB and PubChem failed")
@@ -1153,7 +1345,10 @@ Focus on providing accurate, scientific information from reliable biochemical an
             'biological_roles': perplexity_info.get('biological_roles', []),
             'database_ids': {
                 'hmdb_id': hmdb_id,
-                'pubchem_cid': pubchem_info.get('pubchem_cid', '')
+                'pubchem_cid': pubchem_info.get('pubchem_cid', ''),
+                'chebi_id': hmdb_info.get('chebi_id', ''),
+                'kegg_id': hmdb_info.get('kegg_id', ''),
+                'inchikey': hmdb_info.get('inchikey', '')
             },
             'data_sources': {
                 'perplexity_success': perplexity_info.get('success', False),
@@ -1164,9 +1359,13 @@ Focus on providing accurate, scientific information from reliable biochemical an
             },
             'enrichment_metadata': {
                 'enriched_timestamp': datetime.now().isoformat(),
-                'enricher_version': '1.0.0'
+                'enricher_version': ENRICHER_VERSION,
+                'input_fingerprint': self._enrichment_fingerprint(hmdb_id, metabolite_name)
             }
         }
+        if self.hmdb_fields is not None:
+            # Marks the record as built from a subset of the HMDB fields (see is_full_enriched_output)
+            enriched_metabolite['enrichment_metadata']['hmdb_fields'] = list(self.hmdb_fields)
 
         # Add health conditions if requested
         if self.include_health_conditions:
@@ -1216,6 +1415,68 @@ Focus on providing accurate, scientific information from reliable biochemical an
         # Return the enriched data
         return enriched_metabolite
 
+    def _get_sources_concurrently(self, hmdb_id: str, metabolite_name: str) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Fetch the independent sources of one metabolite at the same time.
+
+        Perplexity (when configured to be used first) does not depend on anything,
+        so it runs alongside HMDB and PubChem. PubChem needs the HMDB identifiers,
+        except for its last resort, the lookup by the original name: while the HMDB
+        record still has to be downloaded, that lookup is started speculatively, at the
+        cost of one PubChem request that is wasted whenever HMDB yields a CID. Records
+        that are cached or available locally return their cross-references right away,
+        so no speculative lookup is started for them.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            metabolite_name (str): Metabolite name
+
+        Returns:
+            Tuple: (HMDB info, PubChem info, Perplexity info or None if it was not requested)
+        """
+        executor = self._get_source_executor()
+        perplexity_future = None
+        if self.use_perplexity_first:
+            perplexity_future = executor.submit(self.get_perplexity_metabolite_info, hmdb_id, metabolite_name)
+
+        original_name_cid = None
+        if 'NOID' in hmdb_id:
+            original_name_cid = executor.submit(self._get_cid_by_name, metabolite_name)
+        elif hmdb_id not in self.cache or self.refresh_cache or self._needs_hmdb_refetch(self.cache[hmdb_id]):
+            if not self._get_hmdb_lookup()._has_local_xml(hmdb_id):
+                original_name_cid = executor.submit(self._get_cid_by_name, metabolite_name)
+
+        hmdb_info = self.get_hmdb_info(hmdb_id)
+        pubchem_info = self.get_pubchem_info(metabolite_name, hmdb_id, hmdb_info=hmdb_info,
+                                             original_name_cid=original_name_cid)
+        perplexity_info = perplexity_future.result() if perplexity_future is not None else None
+        return hmdb_info, pubchem_info, perplexity_info
+
+    def _get_hmdb_lookup(self):
+        """
+        Get (or lazily create) the HMDB client shared by all workers.
+
+        Its connection pool is sized to the worker count, so downloads keep reusing
+        the same keep-alive connections to hmdb.ca.
+
+        Returns:
+            EnhancedHMDBLookup: Shared HMDB client
+        """
+        with self._cache_lock:
+            if self.hmdb_lookup is None:
+                from enhanced_hmdb_lookup import EnhancedHMDBLookup
+                self.hmdb_lookup = EnhancedHMDBLookup(pool_size=self.workers)
+            return self.hmdb_lookup
+
+    def _get_source_executor(self) -> ThreadPoolExecutor:
+        """Get (or lazily create) the thread pool for concurrent source calls."""
+        with self._cache_lock:
+            if self._source_executor is None:
+                # At most two side calls (Perplexity, speculative CID lookup) per metabolite in flight
+                self._source_executor = ThreadPoolExecutor(max_workers=2 * self.workers,
+                                                           thread_name_prefix='enricher-source')
+            return self._source_executor
+
     def _extract_synonyms(self, soup: BeautifulSoup) -> List[str]:
         """Extract synonyms from HMDB page."""
         synonyms = []
@@ -1330,11 +1591,73 @@ Focus on providing accurate, scientific information from reliable biochemical an
             'class': '',
             'sub_class': '',
             'direct_parent': '',
+            'inchi': '',
+            'inchikey': '',
+            'smiles': '',
+            'pubchem_cid': '',
+            'chebi_id': '',
+            'kegg_id': '',
             'source': 'HMDB',
             'timestamp': datetime.now().isoformat(),
             'success': False
         }
 
+    @staticmethod
+    def _lacks_cross_references(hmdb_info: Dict[str, Any]) -> bool:
+        """
+        Check whether a cached HMDB entry predates the cross-reference fields.
+
+        Such entries were cached without their InChI, SMILES and PubChem CID and are fetched
+        again (from the local XML), so the PubChem CID does not have to be searched by name.
+
+        Args:
+            hmdb_info (Dict): Cached HMDB information
+
+        Returns:
+            bool: True if the entry was successful but has no 'pubchem_cid' key
+        """
+        return bool(hmdb_info.get('success')) and 'pubchem_cid' not in hmdb_info
+
+    @staticmethod
+    def _get_hmdb_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+        """
+        Get the HMDB XML fields a field-restricted run parses.
+
+        Args:
+            fields (Optional[List[str]]): Requested fields (see hmdb_xml_extractor.EXTRACTABLE_FIELDS),
+                                          or None to parse every field
+
+        Returns:
+            Optional[List[str]]: The requested fields followed by HMDB_IDENTIFIER_FIELDS, or None
+        """
+        if fields is None:
+            return None
+        unknown = set(fields) - set(EXTRACTABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown HMDB fields: {sorted(unknown)}")
+        return list(dict.fromkeys(list(fields) + list(HMDB_IDENTIFIER_FIELDS)))
+
+    def _needs_hmdb_refetch(self, hmdb_info: Dict[str, Any]) -> bool:
+        """
+        Check whether a cached HMDB entry cannot be used by this run.
+
+        An entry is fetched again when it predates the cross-reference fields, or when it
+        comes from a field-restricted run and lacks fields this run parses.
+
+        Args:
+            hmdb_info (Dict): Cached HMDB information
+
+        Returns:
+            bool: True if the entry has to be fetched again
+        """
+        if self._lacks_cross_references(hmdb_info):
+            return True
+        if 'hmdb_fields' not in hmdb_info:
+            return False
+        if self.hmdb_fields is None:
+            return True
+        return not set(self.hmdb_fields) <= set(hmdb_info['hmdb_fields'])
+
     def _determine_primary_source(self, hmdb_info: Dict[str, Any], pubchem_info: Dict[str, Any], perplexity_info: Dict[str, Any]) -> str:
         """
         Determine the primary data source based on the prioritization order: HMDB > PubChem > Perplexity.
@@ -1539,54 +1862,161 @@ Focus on providing accurate, scientific information from reliable biochemical an
 
         return ' | '.join(desc_parts)
 
+    def process_single_metabolite(self, metabolite_name: str, hmdb_id: Optional[str] = None,
+                                  csv_file: str = DEFAULT_INPUT_CSV) -> Dict[str, Dict[str, Any]]:
+        """
+        Enrich a single metabolite on demand.
+
+        Without an HMDB ID, the HMDB IDs and original values are taken from the
+        rows of the input CSV with that name (case-insensitive). A name that is not
+        in the input is enriched as a NOID metabolite. The results are added to
+        enriched_data and enriched_data_by_name.
+
+        Args:
+            metabolite_name (str): Metabolite name
+            hmdb_id (Optional[str]): HMDB ID, if known
+            csv_file (str): Input CSV to look the metabolite up in
+
+        Returns:
+            Dict: Enriched metabolite data keyed by HMDB ID
+        """
+        rows = []
+        if hmdb_id:
+            rows.append((metabolite_name, [hmdb_id], {}))
+        elif Path(csv_file).exists():
+            df = pd.read_csv(csv_file)
+            matches = df[df['chemical_name'].str.lower() == metabolite_name.strip().lower()]
+            rows = [row for row in self._plan_enrichment(matches)['rows'] if row[1]]
+        if not rows:
+            logger.warning(f"No HMDB ID known for {metabolite_name}, enriching it as a NOID metabolite")
+            rows.append((metabolite_name, ['NOID00000'], {}))
+
+        tasks = list(dict.fromkeys((hmdb_id, name) for name, hmdb_ids, _ in rows for hmdb_id in hmdb_ids))
+        task_results = dict(zip(tasks, self._enrich_jobs(tasks)))
+
+        enriched_data = {}
+        for name, hmdb_ids, original_data in rows:
+            if name not in self.enriched_data_by_name:
+                self.enriched_data_by_name[name] = {
+                    'metabolite_name': name,
+                    'hmdb_id_list': [],
+                    'original_data': original_data
+                }
+            for row_hmdb_id in hmdb_ids:
+                enriched_metabolite = copy.deepcopy(task_results[(row_hmdb_id, name)])
+                self._merge_enriched_metabolite(enriched_data, self.enriched_data_by_name, name,
+                                                row_hmdb_id, enriched_metabolite, original_data)
+        self._add_database_ids_summary(self.enriched_data_by_name)
+        self.enriched_data.update(enriched_data)
+        self.save_cache()
+        return enriched_data
+
+    def _enrichment_fingerprint(self, hmdb_id: str, metabolite_name: str) -> str:
+        """
+        Fingerprint everything an enriched record depends on apart from the upstream data.
+
+        Covers the (HMDB ID, name) pair, the enricher version and the options that
+        change what enrich_metabolite produces. The original CSV values are not part
+        of it, because they are attached to the record afterwards.
+
+        Args:
+            hmdb_id (str): HMDB ID
+            metabolite_name (str): Metabolite name
+
+        Returns:
+            str: Hex digest identifying the inputs of the enrichment
+        """
+        inputs = [
+            ENRICHER_VERSION, hmdb_id, metabolite_name,
+            self.use_perplexity_first, self.force_pubchem,
+            self.include_health_conditions, self.include_food_recommendations
+        ]
+        # Full runs keep their fingerprints from before field-restricted runs existed
+        if self.hmdb_fields is not None:
+            inputs.append(sorted(self.hmdb_fields))
+        return hashlib.sha256(json.dumps(inputs).encode('utf-8')).hexdigest()
+
+    def _reusable_records(self, tasks: List[Tuple[str, str]],
+                          previous_data: Dict[str, Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Find the tasks whose record in a previous by-ID output is still up to date.
+
+        A previous record is reused when it was enriched for the same name with the
+        same fingerprint. The previous output keeps one record per HMDB ID, so other
+        names sharing that HMDB ID are enriched again.
+
+        Args:
+            tasks (List[Tuple[str, str]]): (HMDB ID, name) pairs to look up
+            previous_data (Dict): Previous enriched data keyed by HMDB ID
+
+        Returns:
+            Dict: Reusable records keyed by (HMDB ID, name), without their original CSV data
+        """
+        reusable = {}
+        for hmdb_id, metabolite_name in tasks:
+            record = previous_data.get(hmdb_id)
+            if not record or record.get('original_name') != metabolite_name:
+                continue
+            metadata = record.get('enrichment_metadata', {})
+            if metadata.get('input_fingerprint') != self._enrichment_fingerprint(hmdb_id, metabolite_name):
+                continue
+            record = dict(record)
+            record.pop('original_data', None)
+            reusable[(hmdb_id, metabolite_name)] = record
+        return reusable
+
     def process_metabolites_from_csv(self, csv_file: str = "input/normal_ranges.csv",
-                                   sample_size: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+                                   sample_size: Optional[int] = None,
+                                   journal_file: Optional[str] = None,
+                                   resume: bool = False,
+                                   since: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
         """
         Process metabolites from CSV file and enrich them.
 
+        With more than one worker the metabolites are enriched concurrently, and the
+        results are merged back in input order so the output is identical to a
+        sequential run.
+
+        When a journal file is given, every finished metabolite is appended to it
+        immediately. With resume=True the journal of an interrupted run is replayed
+        and only the metabolites it does not contain are enriched.
+
+        With a previous by-ID output given as since, records whose inputs are
+        unchanged are spliced through as they are and only new or changed
+        (HMDB ID, name) pairs are enriched.
+
         Args:
             csv_file (str): Path to CSV file
             sample_size (Optional[int]): Limit processing to first N metabolites
+            journal_file (Optional[str]): Path to the completion journal
+            resume (bool): Continue from the existing journal instead of starting over
+            since (Optional[str]): Previous enriched JSON output to reuse unchanged records from
 
         Returns:
             Dict: Enriched metabolite data keyed by HMDB ID
         """
         try:
-            # Load CSV
-            df = pd.read_csv(csv_file)
-            logger.info(f"Loaded {len(df)} metabolites from {csv_file}")
+            plan = self._load_enrichment_plan(csv_file, sample_size)
 
-            # Sample if requested
-            if sample_size:
-                df = df.head(sample_size)
-                logger.info(f"Processing sample of {len(df)} metabolites")
+            journal = EnrichmentJournal(journal_file) if journal_file else None
+            try:
+                task_results = self._run_enrichment_plan(plan, journal, resume, since=since)
+            finally:
+                if journal:
+                    journal.close()
 
             enriched_data = {}
             enriched_data_by_name = {}
 
-            # Process each metabolite
-            for idx, row in df.iterrows():
-                hmdb_ids_combined = row['hmdb']
-                metabolite_name = row['chemical_name']
-                
-                # Check if the HMDB_ID field contains multiple IDs separated by spaces
-                if isinstance(hmdb_ids_combined, str):
-                    hmdb_ids = hmdb_ids_combined.split()
-                else:
-                    # Handle non-string values (like NaN)
-                    logger.warning(f"Non-string HMDB_ID value for {metabolite_name}: {hmdb_ids_combined}")
-                    continue
-                    
-                logger.info(f"Processing {metabolite_name} ({hmdb_ids_combined}) [{idx+1}/{len(df)}]")
-                
-                # Store original CSV data once
-                original_data = {
-                    'low_level': row.get('low_level', ''),
-                    'high_level': row.get('high_level', ''),
-                    'sd': row.get('sd', ''),
-                    'reference': row.get('reference', '')
-                }
-                
+            # Fan the results back out to every row, in input order, so the output
+            # does not depend on the worker count or on how much work was shared
+            remaining_uses = {}
+            for metabolite_name, hmdb_ids, _ in plan['rows']:
+                for hmdb_id in hmdb_ids:
+                    task = (hmdb_id, metabolite_name)
+                    remaining_uses[task] = remaining_uses.get(task, 0) + 1
+
+            for metabolite_name, hmdb_ids, original_data in plan['rows']:
                 # Initialize the by-name entry if it doesn't exist
                 if metabolite_name not in enriched_data_by_name:
                     # We'll populate this with the first HMDB ID's data and then just add other HMDB IDs to the list
@@ -1595,222 +2025,25 @@ Focus on providing accurate, scientific information from reliable biochemical an
                         'hmdb_id_list': [],
                         'original_data': original_data
                     }
-                
-                # Process each HMDB ID separately
-                for hmdb_id in hmdb_ids:
-                    logger.debug(f"  - Processing individual HMDB ID: {hmdb_id} for {metabolite_name}")
-                    
-                    # Enrich metabolite
-                    enriched_metabolite = self.enrich_metabolite(hmdb_id, metabolite_name)
-                    
-                    # Add original CSV data
-                    enriched_metabolite['original_data'] = original_data
-                    
-                    # Store in results dictionary
-                    enriched_data[hmdb_id] = enriched_metabolite
-                    
-                    # Add HMDB ID to the by-name structure's list
-                    enriched_data_by_name[metabolite_name]['hmdb_id_list'].append(hmdb_id)
-                    
-                    # If this is the first HMDB ID for this metabolite, initialize the structure
-                    if len(enriched_data_by_name[metabolite_name]['hmdb_id_list']) == 1:
-                        # Copy all keys except hmdb_id and original_data (which we've already set)
-                        for key, value in enriched_metabolite.items():
-                            if key not in ['hmdb_id', 'original_data']:
-                                enriched_data_by_name[metabolite_name][key] = value
-                        
-                        # Initialize timing data structure
-                        enriched_data_by_name[metabolite_name]['timing_data'] = {
-                            'total_enrichment_seconds': 0,
-                            'sources_by_hmdb': {}
-                        }
-                        
-                        # Initialize database_ids structure to store multiple HMDB IDs and their associated data
-                        enriched_data_by_name[metabolite_name]['database_ids'] = {
-                            'hmdb_ids': {},
-                            'pubchem_cids': {}
-                        }
-                        
-                        # Initialize lists for data that we'll merge from multiple HMDB IDs
-                        enriched_data_by_name[metabolite_name]['all_sources'] = []
-                    
-                    # Always add this HMDB ID's source information
-                    source_info = {
-                        'hmdb_id': hmdb_id,
-                        'enhanced_name': enriched_metabolite.get('enhanced_name', metabolite_name),
-                        'perplexity_success': enriched_metabolite.get('data_sources', {}).get('perplexity_success', False),
-                        'hmdb_success': enriched_metabolite.get('data_sources', {}).get('hmdb_success', False),
-                        'pubchem_success': enriched_metabolite.get('data_sources', {}).get('pubchem_success', False),
-                        'primary_source': enriched_metabolite.get('data_sources', {}).get('primary_source', '')
-                    }
-                    
-                    # Add timing information if available
-                    if 'timing_summary' in enriched_metabolite:
-                        source_info['timing'] = enriched_metabolite['timing_summary']
-                        
-                        # Add to the timing_data structure
-                        timing_data = enriched_data_by_name[metabolite_name]['timing_data']
-                        timing_data['sources_by_hmdb'][hmdb_id] = enriched_metabolite['timing_summary']
-                        
-                        # Update total enrichment time
-                        timing_data['total_enrichment_seconds'] += enriched_metabolite['timing_summary'].get('total_enrichment_seconds', 0)
-                    
-                    # Add source info to the list
-                    enriched_data_by_name[metabolite_name]['all_sources'].append(source_info)
-                    
-                    # Store database IDs for this HMDB ID
-                    if 'database_ids' in enriched_metabolite:
-                        # Store HMDB ID with its associated data
-                        enriched_data_by_name[metabolite_name]['database_ids']['hmdb_ids'][hmdb_id] = {
-                            'primary': enriched_metabolite['data_sources'].get('primary_source') == 'HMDB',
-                            'success': enriched_metabolite['data_sources'].get('hmdb_success', False)
-                        }
-                        
-                        # Store PubChem CID if available
-                        pubchem_cid = enriched_metabolite['database_ids'].get('pubchem_cid')
-                        if pubchem_cid:
-                            enriched_data_by_name[metabolite_name]['database_ids']['pubchem_cids'][pubchem_cid] = {
-                                'hmdb_id': hmdb_id,
-                                'primary': enriched_metabolite['data_sources'].get('primary_source') == 'PubChem',
-                                'success': enriched_metabolite['data_sources'].get('pubchem_success', False)
-                            }
-                    
-                    # Merge synonyms if they exist
-                    if 'all_synonyms' in enriched_metabolite and enriched_metabolite['all_synonyms']:
-                        current_synonyms = set(enriched_data_by_name[metabolite_name].get('all_synonyms', []))
-                        new_synonyms = set(enriched_metabolite['all_synonyms'])
-                        enriched_data_by_name[metabolite_name]['all_synonyms'] = list(current_synonyms.union(new_synonyms))
-                        
-                    # Merge chemical classes if they exist
-                    if 'chemical_classes' in enriched_metabolite and enriched_metabolite['chemical_classes']:
-                        current_classes = set(enriched_data_by_name[metabolite_name].get('chemical_classes', []))
-                        new_classes = set(enriched_metabolite['chemical_classes'])
-                        enriched_data_by_name[metabolite_name]['chemical_classes'] = list(current_classes.union(new_classes))
-                        
-                    # Merge biological roles if they exist
-                    if 'biological_roles' in enriched_metabolite and enriched_metabolite['biological_roles']:
-                        current_roles = set(enriched_data_by_name[metabolite_name].get('biological_roles', []))
-                        new_roles = set(enriched_metabolite['biological_roles'])
-                        enriched_data_by_name[metabolite_name]['biological_roles'] = list(current_roles.union(new_roles))
-                        
-                    # Merge descriptions
-                    if 'descriptions' in enriched_metabolite:
-                        if 'descriptions' not in enriched_data_by_name[metabolite_name]:
-                            enriched_data_by_name[metabolite_name]['descriptions'] = {}
-                            
-                        # Merge PubChem description if available
-                        if enriched_metabolite['descriptions'].get('pubchem_description') and not enriched_data_by_name[metabolite_name]['descriptions'].get('pubchem_description'):
-                            enriched_data_by_name[metabolite_name]['descriptions']['pubchem_description'] = enriched_metabolite['descriptions']['pubchem_description']
-                            
-                        # Merge HMDB description if available
-                        if enriched_metabolite['descriptions'].get('hmdb_description') and not enriched_data_by_name[metabolite_name]['descriptions'].get('hmdb_description'):
-                            enriched_data_by_name[metabolite_name]['descriptions']['hmdb_description'] = enriched_metabolite['descriptions']['hmdb_description']
-                    
-                    # Merge chemical properties
-                    if 'chemical_properties' in enriched_metabolite:
-                        if 'chemical_properties' not in enriched_data_by_name[metabolite_name]:
-                            enriched_data_by_name[metabolite_name]['chemical_properties'] = {}
-                            
-                        properties = enriched_data_by_name[metabolite_name]['chemical_properties']
-                        new_properties = enriched_metabolite['chemical_properties']
-                        
-                        # Fill in missing properties from this HMDB ID
-                        for prop_key, prop_value in new_properties.items():
-                            if prop_value and not properties.get(prop_key):
-                                properties[prop_key] = prop_value
-                                
-                        # Special handling for literature abstracts - merge them
-                        if 'literature_abstracts' in new_properties and new_properties['literature_abstracts']:
-                            if 'literature_abstracts' not in properties:
-                                properties['literature_abstracts'] = []
-                            properties['literature_abstracts'].extend(new_properties['literature_abstracts'])
-                    
-                    # Merge taxonomy information
-                    if 'taxonomy' in enriched_metabolite:
-                        if 'taxonomy' not in enriched_data_by_name[metabolite_name]:
-                            enriched_data_by_name[metabolite_name]['taxonomy'] = {}
-                            
-                        taxonomy = enriched_data_by_name[metabolite_name]['taxonomy']
-                        new_taxonomy = enriched_metabolite['taxonomy']
-                        
-                        # Fill in missing taxonomy fields
-                        for tax_key, tax_value in new_taxonomy.items():
-                            if tax_value and not taxonomy.get(tax_key):
-                                taxonomy[tax_key] = tax_value
-                                
-                    # Merge food recommendations if they exist
-                    if 'food_recommendations' in enriched_metabolite:
-                        if 'food_recommendations' not in enriched_data_by_name[metabolite_name]:
-                            enriched_data_by_name[metabolite_name]['food_recommendations'] = {
-                                'avoid_high': [],
-                                'consume_high': [],
-                                'avoid_low': [],
-                                'consume_low': []
-                            }
-                            
-                        food_recs = enriched_data_by_name[metabolite_name]['food_recommendations']
-                        new_food_recs = enriched_metabolite['food_recommendations']
-                        
-                        # Merge each category of food recommendations
-                        for category in ['avoid_high', 'consume_high', 'avoid_low', 'consume_low']:
-                            if category in new_food_recs and new_food_recs[category]:
-                                current_foods = set(food_recs.get(category, []))
-                                new_foods = set(new_food_recs[category])
-                                food_recs[category] = list(current_foods.union(new_foods))
-                                
-                    # Merge health conditions if they exist
-                    if 'health_conditions' in enriched_metabolite:
-                        if 'health_conditions' not in enriched_data_by_name[metabolite_name]:
-                            enriched_data_by_name[metabolite_name]['health_conditions'] = {
-                                'high_level': [],
-                                'low_level': []
-                            }
-                            
-                        health_conds = enriched_data_by_name[metabolite_name]['health_conditions']
-                        new_health_conds = enriched_metabolite['health_conditions']
-                        
-                        # Merge each category of health conditions
-                        for category in ['high_level', 'low_level']:
-                            if category in new_health_conds and new_health_conds[category]:
-                                current_conditions = set(health_conds.get(category, []))
-                                new_conditions = set(new_health_conds[category])
-                                health_conds[category] = list(current_conditions.union(new_conditions))
 
-                # Save cache periodically
-                if (idx + 1) % 10 == 0:
-                    self.save_cache()
-                    logger.info(f"Processed {idx + 1} metabolites, cache saved")
+                for hmdb_id in hmdb_ids:
+                    task = (hmdb_id, metabolite_name)
+                    enriched_metabolite = task_results[task]
+                    # Every occurrence gets its own untouched copy, exactly as if it had been
+                    # enriched separately; the last occurrence takes the original
+                    remaining_uses[task] -= 1
+                    if remaining_uses[task]:
+                        enriched_metabolite = copy.deepcopy(enriched_metabolite)
+                    self._merge_enriched_metabolite(enriched_data, enriched_data_by_name, metabolite_name,
+                                                    hmdb_id, enriched_metabolite, original_data)
 
             # Final cache save
             self.save_cache()
 
-            # Store in instance
             # Post-process the enriched_data_by_name to add summary information
-            for metabolite_name, metabolite_data in enriched_data_by_name.items():
-                # Create a summary of database IDs
-                if 'database_ids' in metabolite_data:
-                    # Get the primary HMDB ID (first one that was successful, or just the first one)
-                    hmdb_ids = metabolite_data['database_ids']['hmdb_ids']
-                    primary_hmdb_id = next(
-                        (hmdb_id for hmdb_id, data in hmdb_ids.items() if data.get('primary')),
-                        next(iter(hmdb_ids.keys()), '')
-                    )
-                    
-                    # Get the primary PubChem CID
-                    pubchem_cids = metabolite_data['database_ids']['pubchem_cids']
-                    primary_pubchem_cid = next(
-                        (cid for cid, data in pubchem_cids.items() if data.get('primary')),
-                        next(iter(pubchem_cids.keys()), '')
-                    )
-                    
-                    # Add a simple summary for backward compatibility
-                    metabolite_data['database_ids_summary'] = {
-                        'primary_hmdb_id': primary_hmdb_id,
-                        'primary_pubchem_cid': primary_pubchem_cid,
-                        'hmdb_id_count': len(hmdb_ids),
-                        'pubchem_cid_count': len(pubchem_cids)
-                    }
-            
+            self._add_database_ids_summary(enriched_data_by_name)
+
+            # Store in instance
             self.enriched_data = enriched_data
             self.enriched_data_by_name = enriched_data_by_name
 
@@ -1821,6 +2054,665 @@ Focus on providing accurate, scientific information from reliable biochemical an
             logger.error(f"Error processing metabolites from CSV: {e}")
             raise
 
+    def process_metabolites_streaming(self, csv_file: str = "input/normal_ranges.csv",
+                                      journal_file: str = JOURNAL_FILE,
+                                      json_file: str = ENRICHED_JSON_FILE,
+                                      by_name_file: str = ENRICHED_BY_NAME_JSON_FILE,
+                                      csv_output: str = ENRICHED_CSV_FILE,
+                                      sample_size: Optional[int] = None,
+                                      resume: bool = False,
+                                      since: Optional[str] = None) -> Dict[str, int]:
+        """
+        Process metabolites from CSV file in constant memory.
+
+        Each enriched metabolite is written to the JSON Lines journal as soon as it
+        finishes and is not kept in memory. Once everything is enriched, the by-ID
+        JSON, the by-name JSON and the CSV are built from the journal one record
+        (or one metabolite name) at a time.
+
+        Args:
+            csv_file (str): Path to CSV file
+            journal_file (str): Path to the JSON Lines journal the records are streamed to
+            json_file (str): Output JSON file keyed by HMDB ID
+            by_name_file (str): Output JSON file keyed by metabolite name
+            csv_output (str): Output CSV file
+            sample_size (Optional[int]): Limit processing to first N metabolites
+            resume (bool): Continue from the existing journal instead of starting over
+            since (Optional[str]): Previous enriched JSON output to reuse unchanged records from
+
+        Returns:
+            Dict[str, int]: Data source statistics of the written records
+        """
+        try:
+            plan = self._load_enrichment_plan(csv_file, sample_size)
+
+            journal = EnrichmentJournal(journal_file)
+            try:
+                self._run_enrichment_plan(plan, journal, resume, keep_results=False, since=since)
+                self.save_cache()
+                stats = self._write_streamed_outputs(plan, journal, json_file, by_name_file, csv_output)
+            finally:
+                journal.close()
+
+            logger.info(f"Successfully enriched {stats['total']} metabolites for {stats['names']} unique metabolite names")
+            return stats
+
+        except Exception as e:
+            logger.error(f"Error processing metabolites from CSV: {e}")
+            raise
+
+    def enrich_shard(self, shard_index: int, shard_count: int, csv_file: str = "input/normal_ranges.csv",
+                     journal_file: Optional[str] = None, sample_size: Optional[int] = None,
+                     resume: bool = False, since: Optional[str] = None) -> int:
+        """
+        Enrich one hash partition of the input, for running a panel across processes or machines.
+
+        Every (HMDB ID, name) pair goes to the shard given by shard_for_hmdb_id, so all
+        names of one HMDB ID, and therefore its HMDB record, stay in the same shard.
+        The enriched records are only written to the shard's journal; merge_shards
+        combines the journals of all shards into the usual outputs.
+
+        Args:
+            shard_index (int): Zero-based index of this shard
+            shard_count (int): Total number of shards
+            csv_file (str): Path to CSV file
+            journal_file (Optional[str]): Journal of this shard (default: derived from JOURNAL_FILE)
+            sample_size (Optional[int]): Limit processing to first N metabolites
+            resume (bool): Continue from the existing shard journal instead of starting over
+            since (Optional[str]): Previous enriched JSON output to reuse unchanged records from
+
+        Returns:
+            int: Number of (HMDB ID, name) pairs in this shard
+        """
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Invalid shard {shard_index} of {shard_count}")
+        journal_file = journal_file or shard_journal_path(JOURNAL_FILE, shard_index, shard_count)
+
+        plan = self._load_enrichment_plan(csv_file, sample_size)
+        plan['tasks'] = [task for task in plan['tasks'] if shard_for_hmdb_id(task[0], shard_count) == shard_index]
+        logger.info(f"Shard {shard_index + 1}/{shard_count}: {len(plan['tasks'])} (HMDB ID, name) pairs, journal {journal_file}")
+
+        journal = EnrichmentJournal(journal_file)
+        try:
+            self._run_enrichment_plan(plan, journal, resume, keep_results=False, since=since)
+        finally:
+            journal.close()
+        self.save_cache()
+        return len(plan['tasks'])
+
+    def merge_shards(self, shard_journals: List[str], csv_file: str = "input/normal_ranges.csv",
+                     journal_file: str = JOURNAL_FILE,
+                     json_file: str = ENRICHED_JSON_FILE,
+                     by_name_file: str = ENRICHED_BY_NAME_JSON_FILE,
+                     csv_output: str = ENRICHED_CSV_FILE,
+                     sample_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        Combine the journals of all shards into the outputs of a single-process run.
+
+        The outputs are built from the input CSV in input order, so they do not
+        depend on how the work was split or in which order the shards finished.
+
+        Args:
+            shard_journals (List[str]): Journals written by enrich_shard
+            csv_file (str): Path to the CSV file the shards were run on
+            journal_file (str): Path of the combined journal
+            json_file (str): Output JSON file keyed by HMDB ID
+            by_name_file (str): Output JSON file keyed by metabolite name
+            csv_output (str): Output CSV file
+            sample_size (Optional[int]): Limit to the first N metabolites, as in the shard runs
+
+        Returns:
+            Dict[str, int]: Data source statistics of the written records
+        """
+        plan = self._load_enrichment_plan(csv_file, sample_size)
+        merge_journals(shard_journals, journal_file)
+
+        journal = EnrichmentJournal(journal_file)
+        try:
+            completed = journal.open(resume=True)
+            missing = [task for task in plan['tasks'] if task not in completed]
+            if missing:
+                raise ValueError(f"{len(missing)} (HMDB ID, name) pairs are missing from the shard journals, "
+                                 f"e.g. {missing[0]}; rerun the failed shards with --resume")
+            stats = self._write_streamed_outputs(plan, journal, json_file, by_name_file, csv_output)
+        finally:
+            journal.close()
+
+        logger.info(f"Merged {len(shard_journals)} shards: {stats['total']} metabolites for {stats['names']} unique metabolite names")
+        return stats
+
+    def _load_enrichment_plan(self, csv_file: str, sample_size: Optional[int] = None) -> Dict[str, Any]:
+        """Load the input CSV and plan the enrichment work (see _plan_enrichment)."""
+        # Load CSV
+        df = pd.read_csv(csv_file)
+        logger.info(f"Loaded {len(df)} metabolites from {csv_file}")
+
+        # Sample if requested
+        if sample_size:
+            df = df.head(sample_size)
+            logger.info(f"Processing sample of {len(df)} metabolites")
+
+        # Parse, validate and deduplicate the whole input before fetching anything
+        plan = self._plan_enrichment(df)
+        self._log_enrichment_plan(plan)
+        return plan
+
+    def _run_enrichment_plan(self, plan: Dict[str, Any], journal: Optional[EnrichmentJournal] = None,
+                             resume: bool = False, keep_results: bool = True,
+                             since: Optional[str] = None) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Fetch and enrich every task of a plan that is not already in the journal
+        or up to date in a previous output.
+
+        Args:
+            plan (Dict): Output of _plan_enrichment
+            journal (Optional[EnrichmentJournal]): Journal to replay and record finished tasks in
+            resume (bool): Continue from the existing journal instead of starting over
+            keep_results (bool): Return the enriched records; when False they are only journaled
+            since (Optional[str]): Previous enriched JSON output to reuse unchanged records from
+
+        Returns:
+            Dict: Enriched records keyed by (HMDB ID, name), or an empty dict if keep_results is False
+        """
+        # Replay the journal of an interrupted run
+        completed = journal.open(resume=resume) if journal else {}
+        done_tasks = [task for task in plan['tasks'] if task in completed]
+        pending_tasks = [task for task in plan['tasks'] if task not in completed]
+        if done_tasks:
+            logger.info(f"Resuming: {len(done_tasks)} of {len(plan['tasks'])} tasks already completed, {len(pending_tasks)} remaining")
+
+        # Splice through the records of a previous run whose inputs have not changed
+        reused = {}
+        if since:
+            reused = self._reusable_records(pending_tasks, load_enriched_metabolite_data(since))
+            pending_tasks = [task for task in pending_tasks if task not in reused]
+            logger.info(f"Reusing {len(reused)} unchanged records from {since}, {len(pending_tasks)} new or changed to enrich")
+            if journal:
+                for (hmdb_id, metabolite_name), record in reused.items():
+                    journal.append(hmdb_id, metabolite_name, record)
+
+        # Fetch every unique HMDB record once, resolve each unique missing PubChem identifier once,
+        # then enrich every unique (HMDB ID, name) pair once
+        pending_ids = {hmdb_id for hmdb_id, _ in pending_tasks}
+        self._fetch_hmdb_records([hmdb_id for hmdb_id in plan['hmdb_ids_to_fetch'] if hmdb_id in pending_ids])
+        self._resolve_pubchem_cids(pending_tasks)
+        results = self._enrich_jobs(pending_tasks, journal, keep_results)
+
+        if not keep_results:
+            return {}
+        task_results = {task: journal.read_record(task) for task in done_tasks}
+        task_results.update(reused)
+        task_results.update(zip(pending_tasks, results))
+        return task_results
+
+    def _write_streamed_outputs(self, plan: Dict[str, Any], journal: EnrichmentJournal, json_file: str,
+                                by_name_file: str, csv_output: str) -> Dict[str, int]:
+        """
+        Build the JSON and CSV outputs from the journal, one record at a time.
+
+        Args:
+            plan (Dict): Output of _plan_enrichment
+            journal (EnrichmentJournal): Journal holding a record for every task of the plan
+            json_file (str): Output JSON file keyed by HMDB ID
+            by_name_file (str): Output JSON file keyed by metabolite name
+            csv_output (str): Output CSV file
+
+        Returns:
+            Dict[str, int]: Data source statistics of the written records
+        """
+        # An HMDB ID listed in several rows takes its by-ID record from the last of them,
+        # keeping the position of the first, just like repeated assignment to a dict
+        last_row = {}
+        rows_by_name = {}
+        for row_index, (metabolite_name, hmdb_ids, _) in enumerate(plan['rows']):
+            rows_by_name.setdefault(metabolite_name, []).append(row_index)
+            for hmdb_id in hmdb_ids:
+                last_row[hmdb_id] = row_index
+
+        stats = {}
+        csv_rows = []
+        csv_header = True
+        for path in (json_file, by_name_file, csv_output):
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(json_file, 'w') as json_out, open(csv_output, 'w', newline='') as csv_out:
+            json_out.write('{')
+            for hmdb_id, row_index in last_row.items():
+                metabolite_name, _, original_data = plan['rows'][row_index]
+                record = journal.read_record((hmdb_id, metabolite_name))
+                record['original_data'] = original_data
+                _write_json_object_item(json_out, hmdb_id, record, first=not stats)
+                _count_enrichment_sources(stats, record)
+
+                # Write the CSV in chunks so the DataFrame never holds more than a slice of the output
+                csv_rows.append(self._enriched_csv_row(hmdb_id, record))
+                if len(csv_rows) >= STREAM_CSV_CHUNK_SIZE:
+                    pd.DataFrame(csv_rows).to_csv(csv_out, index=False, header=csv_header)
+                    csv_rows = []
+                    csv_header = False
+            json_out.write('\n}' if stats else '}')
+            if csv_rows:
+                pd.DataFrame(csv_rows).to_csv(csv_out, index=False, header=csv_header)
+        logger.info(f"Saved enriched data for {len(last_row)} metabolites to {json_file} and {csv_output}")
+
+        # Each by-name entry only depends on the rows with that name, so build and write one name at a time
+        with open(by_name_file, 'w') as by_name_out:
+            by_name_out.write('{')
+            for name_index, (metabolite_name, row_indices) in enumerate(rows_by_name.items()):
+                enriched_data_by_name = {metabolite_name: {
+                    'metabolite_name': metabolite_name,
+                    'hmdb_id_list': [],
+                    'original_data': plan['rows'][row_indices[0]][2]
+                }}
+                for row_index in row_indices:
+                    _, hmdb_ids, original_data = plan['rows'][row_index]
+                    for hmdb_id in hmdb_ids:
+                        self._merge_enriched_metabolite({}, enriched_data_by_name, metabolite_name, hmdb_id,
+                                                        journal.read_record((hmdb_id, metabolite_name)), original_data)
+                self._add_database_ids_summary(enriched_data_by_name)
+                _write_json_object_item(by_name_out, metabolite_name, enriched_data_by_name[metabolite_name],
+                                        first=name_index == 0)
+            by_name_out.write('\n}' if rows_by_name else '}')
+        logger.info(f"Saved enriched data by name for {len(rows_by_name)} metabolites to {by_name_file}")
+
+        stats['names'] = len(rows_by_name)
+        return stats
+
+    def _plan_enrichment(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Parse, validate and deduplicate the input rows into the unique work to do.
+
+        Rows may hold several space-separated HMDB IDs, and the same HMDB ID or
+        (HMDB ID, name) pair often appears in several rows. The plan lists each
+        unique entity once so that it is fetched and enriched only once.
+
+        Args:
+            df (pd.DataFrame): Input rows with 'chemical_name' and 'hmdb' columns
+
+        Returns:
+            Dict: Plan with the input rows, the unique (HMDB ID, name) tasks, the
+                  unique HMDB IDs, names and known PubChem CIDs, and cache statistics
+        """
+        from metabolite_hmdb_lookup import is_valid_hmdb_id
+
+        rows = []
+        skipped_rows = 0
+        id_occurrences = 0
+        hmdb_ids_seen = {}
+        tasks = {}
+        names = {}
+        invalid_ids = {}
+
+        for idx, row in df.iterrows():
+            hmdb_ids_combined = row['hmdb']
+            metabolite_name = row['chemical_name']
+
+            # Check if the HMDB_ID field contains multiple IDs separated by spaces
+            if isinstance(hmdb_ids_combined, str):
+                hmdb_ids = hmdb_ids_combined.split()
+            else:
+                # Handle non-string values (like NaN)
+                logger.warning(f"Non-string HMDB_ID value for {metabolite_name}: {hmdb_ids_combined}")
+                skipped_rows += 1
+                continue
+
+            # Store original CSV data once
+            original_data = {
+                'low_level': row.get('low_level', ''),
+                'high_level': row.get('high_level', ''),
+                'sd': row.get('sd', ''),
+                'reference': row.get('reference', '')
+            }
+            rows.append((metabolite_name, hmdb_ids, original_data))
+            names.setdefault(metabolite_name, None)
+
+            for hmdb_id in hmdb_ids:
+                id_occurrences += 1
+                if 'NOID' not in hmdb_id and not is_valid_hmdb_id(hmdb_id):
+                    invalid_ids.setdefault(hmdb_id, None)
+                hmdb_ids_seen.setdefault(hmdb_id, None)
+                tasks.setdefault((hmdb_id, metabolite_name), None)
+
+        # NOID placeholders have no HMDB record to fetch
+        fetchable_ids = [hmdb_id for hmdb_id in hmdb_ids_seen if 'NOID' not in hmdb_id]
+        with self._cache_lock:
+            cached_ids = [hmdb_id for hmdb_id in fetchable_ids if hmdb_id in self.cache]
+            cids = {}
+            for hmdb_id in cached_ids:
+                cid = self.cache[hmdb_id].get('pubchem_cid', '')
+                if cid:
+                    cids.setdefault(str(cid), None)
+
+        # Entries cached before the cross-references were kept are fetched again as well
+        with self._cache_lock:
+            hmdb_ids_to_fetch = fetchable_ids if self.refresh_cache else [
+                hmdb_id for hmdb_id in fetchable_ids
+                if hmdb_id not in self.cache or self._needs_hmdb_refetch(self.cache[hmdb_id])
+            ]
+
+        return {
+            'rows': rows,
+            'skipped_rows': skipped_rows,
+            'id_occurrences': id_occurrences,
+            'tasks': list(tasks),
+            'hmdb_ids': list(hmdb_ids_seen),
+            'hmdb_ids_to_fetch': hmdb_ids_to_fetch,
+            'cached_hmdb_ids': len(cached_ids),
+            'names': list(names),
+            'cids': list(cids),
+            'invalid_ids': list(invalid_ids)
+        }
+
+    def _log_enrichment_plan(self, plan: Dict[str, Any]) -> None:
+        """Print a summary of the enrichment plan."""
+        occurrences = plan['id_occurrences']
+        tasks = len(plan['tasks'])
+        logger.info("Enrichment plan:")
+        logger.info(f"  Input rows: {len(plan['rows'])} ({plan['skipped_rows']} skipped without HMDB IDs)")
+        logger.info(f"  HMDB ID occurrences: {occurrences} -> {len(plan['hmdb_ids'])} unique HMDB IDs")
+        logger.info(f"  HMDB records: {plan['cached_hmdb_ids']} already cached, {len(plan['hmdb_ids_to_fetch'])} to fetch")
+        logger.info(f"  Unique (HMDB ID, name) pairs to enrich: {tasks} ({occurrences - tasks} duplicate occurrences reused)")
+        logger.info(f"  Unique metabolite names: {len(plan['names'])}")
+        logger.info(f"  PubChem CIDs already known from cached HMDB records: {len(plan['cids'])}")
+        if plan['invalid_ids']:
+            logger.warning(f"  HMDB IDs with an unexpected format: {', '.join(plan['invalid_ids'])}")
+
+    def _fetch_hmdb_records(self, hmdb_ids: List[str]) -> None:
+        """
+        Fetch HMDB records into the cache ahead of enrichment.
+
+        Args:
+            hmdb_ids (List[str]): Unique HMDB IDs that are not cached yet
+        """
+        if not hmdb_ids:
+            return
+
+        logger.info(f"Fetching {len(hmdb_ids)} HMDB records")
+        if self.workers <= 1:
+            for hmdb_id in hmdb_ids:
+                self.get_hmdb_info(hmdb_id)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hmdb') as executor:
+                list(executor.map(self.get_hmdb_info, hmdb_ids))
+        self.save_cache()
+
+        if self.hmdb_lookup is not None:
+            stats = self.hmdb_lookup.get_request_stats()
+            logger.info(f"HMDB downloads: {stats['requests']} requests over {stats['connections_opened']} connections "
+                        f"({stats['connections_reused']} on reused connections)")
+
+    def _enrich_jobs(self, jobs: List[Tuple[str, str]], journal: Optional[EnrichmentJournal] = None,
+                     keep_results: bool = True) -> List[Optional[Dict[str, Any]]]:
+        """
+        Enrich a list of (HMDB ID, metabolite name) pairs.
+
+        Runs sequentially with a single worker, otherwise on a bounded thread pool.
+        The per-service concurrency caps in service_limits still apply to every
+        upstream request, whatever the worker count.
+
+        Args:
+            jobs (List[Tuple[str, str]]): (HMDB ID, metabolite name) pairs
+            journal (Optional[EnrichmentJournal]): Journal to record each finished pair in
+            keep_results (bool): Keep the records in memory; when False they are only journaled
+
+        Returns:
+            List[Dict]: Enriched metabolite records in the same order as jobs (None when not kept)
+        """
+        total = len(jobs)
+        results: List[Optional[Dict[str, Any]]] = [None] * total
+
+        if self.workers <= 1 or total <= 1:
+            for index, (hmdb_id, metabolite_name) in enumerate(jobs):
+                logger.info(f"Processing {metabolite_name} ({hmdb_id}) [{index + 1}/{total}]")
+                enriched_metabolite = self.enrich_metabolite(hmdb_id, metabolite_name)
+                if journal:
+                    journal.append(hmdb_id, metabolite_name, enriched_metabolite)
+                if keep_results:
+                    results[index] = enriched_metabolite
+
+                # Save cache periodically
+                if (index + 1) % 10 == 0:
+                    self.save_cache()
+                    logger.info(f"Processed {index + 1} metabolites, cache saved")
+            return results
+
+        logger.info(f"Enriching {total} metabolites with {self.workers} workers")
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='enricher')
+        try:
+            futures = {
+                executor.submit(self.enrich_metabolite, hmdb_id, metabolite_name): index
+                for index, (hmdb_id, metabolite_name) in enumerate(jobs)
+            }
+            for completed, future in enumerate(as_completed(futures), start=1):
+                index = futures[future]
+                hmdb_id, metabolite_name = jobs[index]
+                enriched_metabolite = future.result()
+                if journal:
+                    journal.append(hmdb_id, metabolite_name, enriched_metabolite)
+                if keep_results:
+                    results[index] = enriched_metabolite
+                logger.info(f"Processed {metabolite_name} ({hmdb_id}) [{completed}/{total}]")
+
+                # Save cache periodically
+                if completed % 10 == 0:
+                    self.save_cache()
+                    logger.info(f"Processed {completed} metabolites, cache saved")
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        executor.shutdown(wait=True)
+        return results
+
+    def _merge_enriched_metabolite(self, enriched_data: Dict[str, Any], enriched_data_by_name: Dict[str, Any],
+                                   metabolite_name: str, hmdb_id: str, enriched_metabolite: Dict[str, Any],
+                                   original_data: Dict[str, Any]) -> None:
+        """
+        Add one enriched HMDB ID to the by-ID and by-name result structures.
+
+        Args:
+            enriched_data (Dict): Results keyed by HMDB ID
+            enriched_data_by_name (Dict): Results keyed by metabolite name
+            metabolite_name (str): Metabolite name from the input row
+            hmdb_id (str): Individual HMDB ID from the input row
+            enriched_metabolite (Dict): Output of enrich_metabolite for this pair
+            original_data (Dict): Original CSV values for the input row
+        """
+        # Add original CSV data
+        enriched_metabolite['original_data'] = original_data
+
+        # Store in results dictionary
+        enriched_data[hmdb_id] = enriched_metabolite
+
+        # Add HMDB ID to the by-name structure's list
+        enriched_data_by_name[metabolite_name]['hmdb_id_list'].append(hmdb_id)
+
+        # If this is the first HMDB ID for this metabolite, initialize the structure
+        if len(enriched_data_by_name[metabolite_name]['hmdb_id_list']) == 1:
+            # Copy all keys except hmdb_id and original_data (which we've already set). The values
+            # are copied so that merging later HMDB IDs never alters this HMDB ID's own record.
+            for key, value in enriched_metabolite.items():
+                if key not in ['hmdb_id', 'original_data']:
+                    enriched_data_by_name[metabolite_name][key] = copy.deepcopy(value)
+
+            # Initialize timing data structure
+            enriched_data_by_name[metabolite_name]['timing_data'] = {
+                'total_enrichment_seconds': 0,
+                'sources_by_hmdb': {}
+            }
+
+            # Initialize database_ids structure to store multiple HMDB IDs and their associated data
+            enriched_data_by_name[metabolite_name]['database_ids'] = {
+                'hmdb_ids': {},
+                'pubchem_cids': {}
+            }
+
+            # Initialize lists for data that we'll merge from multiple HMDB IDs
+            enriched_data_by_name[metabolite_name]['all_sources'] = []
+
+        # Always add this HMDB ID's source information
+        source_info = {
+            'hmdb_id': hmdb_id,
+            'enhanced_name': enriched_metabolite.get('enhanced_name', metabolite_name),
+            'perplexity_success': enriched_metabolite.get('data_sources', {}).get('perplexity_success', False),
+            'hmdb_success': enriched_metabolite.get('data_sources', {}).get('hmdb_success', False),
+            'pubchem_success': enriched_metabolite.get('data_sources', {}).get('pubchem_success', False),
+            'primary_source': enriched_metabolite.get('data_sources', {}).get('primary_source', '')
+        }
+
+        # Add timing information if available
+        if 'timing_summary' in enriched_metabolite:
+            source_info['timing'] = enriched_metabolite['timing_summary']
+
+            # Add to the timing_data structure
+            timing_data = enriched_data_by_name[metabolite_name]['timing_data']
+            timing_data['sources_by_hmdb'][hmdb_id] = enriched_metabolite['timing_summary']
+
+            # Update total enrichment time
+            timing_data['total_enrichment_seconds'] += enriched_metabolite['timing_summary'].get('total_enrichment_seconds', 0)
+
+        # Add source info to the list
+        enriched_data_by_name[metabolite_name]['all_sources'].append(source_info)
+
+        # Store database IDs for this HMDB ID
+        if 'database_ids' in enriched_metabolite:
+            # Store HMDB ID with its associated data
+            enriched_data_by_name[metabolite_name]['database_ids']['hmdb_ids'][hmdb_id] = {
+                'primary': enriched_metabolite['data_sources'].get('primary_source') == 'HMDB',
+                'success': enriched_metabolite['data_sources'].get('hmdb_success', False)
+            }
+
+            # Store PubChem CID if available
+            pubchem_cid = enriched_metabolite['database_ids'].get('pubchem_cid')
+            if pubchem_cid:
+                enriched_data_by_name[metabolite_name]['database_ids']['pubchem_cids'][pubchem_cid] = {
+                    'hmdb_id': hmdb_id,
+                    'primary': enriched_metabolite['data_sources'].get('primary_source') == 'PubChem',
+                    'success': enriched_metabolite['data_sources'].get('pubchem_success', False)
+                }
+
+        # Merge synonyms if they exist
+        if 'all_synonyms' in enriched_metabolite and enriched_metabolite['all_synonyms']:
+            enriched_data_by_name[metabolite_name]['all_synonyms'] = self._merge_unique(enriched_data_by_name[metabolite_name].get('all_synonyms', []), enriched_metabolite['all_synonyms'])
+
+        # Merge chemical classes if they exist
+        if 'chemical_classes' in enriched_metabolite and enriched_metabolite['chemical_classes']:
+            enriched_data_by_name[metabolite_name]['chemical_classes'] = self._merge_unique(enriched_data_by_name[metabolite_name].get('chemical_classes', []), enriched_metabolite['chemical_classes'])
+
+        # Merge biological roles if they exist
+        if 'biological_roles' in enriched_metabolite and enriched_metabolite['biological_roles']:
+            enriched_data_by_name[metabolite_name]['biological_roles'] = self._merge_unique(enriched_data_by_name[metabolite_name].get('biological_roles', []), enriched_metabolite['biological_roles'])
+
+        # Merge descriptions
+        if 'descriptions' in enriched_metabolite:
+            if 'descriptions' not in enriched_data_by_name[metabolite_name]:
+                enriched_data_by_name[metabolite_name]['descriptions'] = {}
+
+            # Merge PubChem description if available
+            if enriched_metabolite['descriptions'].get('pubchem_description') and not enriched_data_by_name[metabolite_name]['descriptions'].get('pubchem_description'):
+                enriched_data_by_name[metabolite_name]['descriptions']['pubchem_description'] = enriched_metabolite['descriptions']['pubchem_description']
+
+            # Merge HMDB description if available
+            if enriched_metabolite['descriptions'].get('hmdb_description') and not enriched_data_by_name[metabolite_name]['descriptions'].get('hmdb_description'):
+                enriched_data_by_name[metabolite_name]['descriptions']['hmdb_description'] = enriched_metabolite['descriptions']['hmdb_description']
+
+        # Merge chemical properties
+        if 'chemical_properties' in enriched_metabolite:
+            if 'chemical_properties' not in enriched_data_by_name[metabolite_name]:
+                enriched_data_by_name[metabolite_name]['chemical_properties'] = {}
+
+            properties = enriched_data_by_name[metabolite_name]['chemical_properties']
+            new_properties = enriched_metabolite['chemical_properties']
+
+            # Fill in missing properties from this HMDB ID
+            for prop_key, prop_value in new_properties.items():
+                if prop_value and not properties.get(prop_key):
+                    properties[prop_key] = prop_value
+
+            # Special handling for literature abstracts - merge them
+            if 'literature_abstracts' in new_properties and new_properties['literature_abstracts']:
+                if 'literature_abstracts' not in properties:
+                    properties['literature_abstracts'] = []
+                properties['literature_abstracts'].extend(new_properties['literature_abstracts'])
+
+        # Merge taxonomy information
+        if 'taxonomy' in enriched_metabolite:
+            if 'taxonomy' not in enriched_data_by_name[metabolite_name]:
+                enriched_data_by_name[metabolite_name]['taxonomy'] = {}
+
+            taxonomy = enriched_data_by_name[metabolite_name]['taxonomy']
+            new_taxonomy = enriched_metabolite['taxonomy']
+
+            # Fill in missing taxonomy fields
+            for tax_key, tax_value in new_taxonomy.items():
+                if tax_value and not taxonomy.get(tax_key):
+                    taxonomy[tax_key] = tax_value
+
+        # Merge food recommendations if they exist
+        if 'food_recommendations' in enriched_metabolite:
+            if 'food_recommendations' not in enriched_data_by_name[metabolite_name]:
+                enriched_data_by_name[metabolite_name]['food_recommendations'] = {
+                    'avoid_high': [],
+                    'consume_high': [],
+                    'avoid_low': [],
+                    'consume_low': []
+                }
+
+            food_recs = enriched_data_by_name[metabolite_name]['food_recommendations']
+            new_food_recs = enriched_metabolite['food_recommendations']
+
+            # Merge each category of food recommendations
+            for category in ['avoid_high', 'consume_high', 'avoid_low', 'consume_low']:
+                if category in new_food_recs and new_food_recs[category]:
+                    food_recs[category] = self._merge_unique(food_recs.get(category, []), new_food_recs[category])
+
+        # Merge health conditions if they exist
+        if 'health_conditions' in enriched_metabolite:
+            if 'health_conditions' not in enriched_data_by_name[metabolite_name]:
+                enriched_data_by_name[metabolite_name]['health_conditions'] = {
+                    'high_level': [],
+                    'low_level': []
+                }
+
+            health_conds = enriched_data_by_name[metabolite_name]['health_conditions']
+            new_health_conds = enriched_metabolite['health_conditions']
+
+            # Merge each category of health conditions
+            for category in ['high_level', 'low_level']:
+                if category in new_health_conds and new_health_conds[category]:
+                    health_conds[category] = self._merge_unique(health_conds.get(category, []), new_health_conds[category])
+
+    @staticmethod
+    def _merge_unique(current: List[Any], new: List[Any]) -> List[Any]:
+        """Union of two lists that keeps first-seen order, so merged output is deterministic."""
+        return list(dict.fromkeys(list(current) + list(new)))
+
+    def _add_database_ids_summary(self, enriched_data_by_name: Dict[str, Any]) -> None:
+        """Add a database_ids_summary to every by-name entry that has database IDs."""
+        # Post-process the enriched_data_by_name to add summary information
+        for metabolite_name, metabolite_data in enriched_data_by_name.items():
+            # Create a summary of database IDs
+            if 'database_ids' in metabolite_data:
+                # Get the primary HMDB ID (first one that was successful, or just the first one)
+                hmdb_ids = metabolite_data['database_ids']['hmdb_ids']
+                primary_hmdb_id = next(
+                    (hmdb_id for hmdb_id, data in hmdb_ids.items() if data.get('primary')),
+                    next(iter(hmdb_ids.keys()), '')
+                )
+
+                # Get the primary PubChem CID
+                pubchem_cids = metabolite_data['database_ids']['pubchem_cids']
+                primary_pubchem_cid = next(
+                    (cid for cid, data in pubchem_cids.items() if data.get('primary')),
+                    next(iter(pubchem_cids.keys()), '')
+                )
+
+                # Add a simple summary for backward compatibility
+                metabolite_data['database_ids_summary'] = {
+                    'primary_hmdb_id': primary_hmdb_id,
+                    'primary_pubchem_cid': primary_pubchem_cid,
+                    'hmdb_id_count': len(hmdb_ids),
+                    'pubchem_cid_count': len(pubchem_cids)
+                }
     def save_enriched_data_to_json(self, output_file=None):
         """Save the enriched data to a JSON file."""
         if output_file is None:
@@ -1839,7 +2731,7 @@ Focus on providing accurate, scientific information from reliable biochemical an
             logger.error(f"Error saving enriched data to JSON: {e}")
             return False
 
-    def save_enriched_data_by_name_to_json(self, output_file: str = "data/metabolite_enriched_data_by_name.json") -> bool:
+    def save_enriched_data_by_name_to_json(self, output_file: str = ENRICHED_BY_NAME_JSON_FILE) -> bool:
         """
         Save enriched data organized by metabolite name to JSON file.
 
@@ -1929,37 +2821,7 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 return False
 
             # Convert enriched data to DataFrame format
-            rows = []
-            for hmdb_id, data in self.enriched_data.items():
-                row = {
-                    'chemical_name': data['original_name'],
-                    'hmdb': hmdb_id,
-                    'low_level': data['original_data'].get('low_level', ''),
-                    'high_level': data['original_data'].get('high_level', ''),
-                    'sd': data['original_data'].get('sd', ''),
-                    'reference': data['original_data'].get('reference', ''),
-                    'enhanced_name': data['enhanced_name'],
-                    'synonyms': '; '.join(data['all_synonyms']),
-                    'chemical_classes': '; '.join(data['chemical_classes']),
-                    'description': data['descriptions']['hmdb_description'],
-                    'contextual_description': data['descriptions']['contextual_description'],
-                    'llm_description': data['descriptions']['llm_description'],
-                    'iupac_name': data['chemical_properties']['iupac_name'],
-                    'common_name': data['chemical_properties']['common_name'],
-                    'molecular_formula': data['chemical_properties']['molecular_formula'],
-                    'molecular_weight': data['chemical_properties']['molecular_weight'],
-                    'pubchem_cid': data['database_ids']['pubchem_cid'],
-                    'kingdom': data['taxonomy']['kingdom'],
-                    'super_class': data['taxonomy']['super_class'],
-                    'class': data['taxonomy']['class'],
-                    'sub_class': data['taxonomy']['sub_class'],
-                    'direct_parent': data['taxonomy']['direct_parent'],
-                    'hmdb_success': data['data_sources']['hmdb_success'],
-                    'pubchem_success': data['data_sources']['pubchem_success'],
-                    'has_contextual_info': data['data_sources']['has_contextual_info'],
-                    'enriched_timestamp': data['enrichment_metadata']['enriched_timestamp']
-                }
-                rows.append(row)
+            rows = [self._enriched_csv_row(hmdb_id, data) for hmdb_id, data in self.enriched_data.items()]
 
             # Create DataFrame and save
             df = pd.DataFrame(rows)
@@ -1973,6 +2835,88 @@ Focus on providing accurate, scientific information from reliable biochemical an
             logger.error(f"Error saving enriched data to CSV: {e}")
             return False
 
+    @staticmethod
+    def _enriched_csv_row(hmdb_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Flatten one enriched record into a row of the compatibility CSV."""
+        return {
+            'chemical_name': data['original_name'],
+            'hmdb': hmdb_id,
+            'low_level': data['original_data'].get('low_level', ''),
+            'high_level': data['original_data'].get('high_level', ''),
+            'sd': data['original_data'].get('sd', ''),
+            'reference': data['original_data'].get('reference', ''),
+            'enhanced_name': data['enhanced_name'],
+            'synonyms': '; '.join(data['all_synonyms']),
+            'chemical_classes': '; '.join(data['chemical_classes']),
+            'description': data['descriptions']['hmdb_description'],
+            'contextual_description': data['descriptions']['contextual_description'],
+            'llm_description': data['descriptions']['llm_description'],
+            'iupac_name': data['chemical_properties']['iupac_name'],
+            'common_name': data['chemical_properties']['common_name'],
+            'molecular_formula': data['chemical_properties']['molecular_formula'],
+            'molecular_weight': data['chemical_properties']['molecular_weight'],
+            'pubchem_cid': data['database_ids']['pubchem_cid'],
+            'kingdom': data['taxonomy']['kingdom'],
+            'super_class': data['taxonomy']['super_class'],
+            'class': data['taxonomy']['class'],
+            'sub_class': data['taxonomy']['sub_class'],
+            'direct_parent': data['taxonomy']['direct_parent'],
+            'hmdb_success': data['data_sources']['hmdb_success'],
+            'pubchem_success': data['data_sources']['pubchem_success'],
+            'has_contextual_info': data['data_sources']['has_contextual_info'],
+            'enriched_timestamp': data['enrichment_metadata']['enriched_timestamp']
+        }
+
+
+def shard_for_hmdb_id(hmdb_id: str, shard_count: int) -> int:
+    """
+    Stable shard assignment of an HMDB ID.
+
+    Uses CRC32 rather than hash(), which is salted per process, so every process
+    and machine agrees on the partition.
+    """
+    return zlib.crc32(hmdb_id.encode('utf-8')) % shard_count
+
+
+def shard_journal_path(journal_file: str, shard_index: int, shard_count: int) -> str:
+    """Journal path of one shard, e.g. data/journal.shard-1-of-4.jsonl for shard index 0."""
+    base, ext = os.path.splitext(journal_file)
+    return f"{base}.shard-{shard_index + 1}-of-{shard_count}{ext}"
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Parse a one-based 'i/N' shard specification.
+
+    Returns:
+        Tuple[int, int]: (zero-based shard index, shard count)
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {value!r}")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 1 and N, got {value!r}")
+    return index - 1, count
+
+
+def _write_json_object_item(f, key: str, value: Any, first: bool) -> None:
+    """Write one item of a JSON object, formatted exactly like json.dump(..., indent=2) of the whole object."""
+    f.write('\n  ' if first else ',\n  ')
+    f.write(json.dumps(key) + ': ' + json.dumps(value, indent=2).replace('\n', '\n  '))
+
+
+def _count_enrichment_sources(stats: Dict[str, int], data: Dict[str, Any]) -> None:
+    """Add one enriched record to the data source statistics."""
+    data_sources = data.get('data_sources', {})
+    stats['total'] = stats.get('total', 0) + 1
+    for key in ('perplexity_success', 'hmdb_success', 'pubchem_success', 'has_contextual_info'):
+        stats[key] = stats.get(key, 0) + bool(data_sources.get(key, False))
+    for source in ('perplexity', 'hmdb'):
+        key = f'{source}_primary'
+        stats[key] = stats.get(key, 0) + (data_sources.get('primary_source') == source)
+
+
 def load_enriched_metabolite_data(json_file: str = ENRICHED_JSON_FILE) -> Dict[str, Dict[str, Any]]:
     """
     Load enriched metabolite data from JSON file.
@@ -1998,6 +2942,25 @@ def load_enriched_metabolite_data(json_file: str = ENRICHED_JSON_FILE) -> Dict[s
         logger.error(f"Error loading enriched data: {e}")
         return {}
 
+def is_full_enriched_output(json_file: str) -> bool:
+    """
+    Check whether an enriched JSON output holds records built from every HMDB field.
+
+    A field-restricted run (hmdb_fields) leaves the other HMDB fields empty, so its
+    output must not replace such a file.
+
+    Args:
+        json_file (str): Path to enriched metabolite JSON file
+
+    Returns:
+        bool: True if the file exists and has a record without 'hmdb_fields' in its enrichment metadata
+    """
+    if not Path(json_file).exists():
+        return False
+    data = load_enriched_metabolite_data(json_file)
+    return any('hmdb_fields' not in record.get('enrichment_metadata', {}) for record in data.values())
+
+
 def get_metabolite_enriched_info(hmdb_id: str, enriched_data: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Get enriched information for a specific metabolite.
@@ -2108,7 +3071,7 @@ def main():
     Main entry point for the script.
     """
     parser = argparse.ArgumentParser(description="Enrich metabolite data with additional information.")
-    parser.add_argument("--input", default="src/input/normal_ranges_with_all_HMDB_IDs.csv", 
+    parser.add_argument("--input", default=DEFAULT_INPUT_CSV,
                        help="Input CSV file with metabolite data")
     parser.add_argument("--output", default="data/metabolite_enriched_data.json",
                        help="Output JSON file for enriched data")
@@ -2122,9 +3085,43 @@ def main():
     parser.add_argument('--include-food-recommendations', action='store_true', help='Include food recommendations for high/low metabolite concentrations')
     parser.add_argument("--sample-size", type=int, help="Process only a sample of metabolites")
     parser.add_argument("--cache-file", help="Custom cache file location")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Number of metabolites to enrich concurrently (default: 1)")
+    parser.add_argument("--journal-file", default=JOURNAL_FILE,
+                       help="Append-only journal of finished metabolites, used by --resume")
+    parser.add_argument("--resume", action="store_true",
+                       help="Resume an interrupted run from the journal instead of starting over")
+    parser.add_argument("--since", metavar="PREVIOUS_JSON",
+                       help="Previous metabolite_enriched_data.json; only new or changed metabolites are enriched "
+                            "and unchanged records are reused as they are")
+    parser.add_argument("--parallel-sources", action="store_true",
+                       help="Fetch the independent data sources of each metabolite concurrently")
+    parser.add_argument("--race-cid-strategies", action="store_true",
+                       help="Run the PubChem CID search strategies of each metabolite concurrently; "
+                            "cuts the latency of slow misses at the cost of extra PubChem requests")
+    parser.add_argument("--hmdb-fields", nargs="+", choices=EXTRACTABLE_FIELDS, metavar="FIELD",
+                       help="Only parse these HMDB XML fields (e.g. synonyms), reading each record lazily; "
+                            "the InChIKey, InChI and SMILES are always read for the PubChem lookup. "
+                            "Refuses to overwrite an --output enriched from every field")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                       help="Only enrich shard I of N (1-based) hash partitions of the HMDB IDs into a shard journal; "
+                            "combine the shards afterwards with --merge-shards")
+    parser.add_argument("--merge-shards", nargs="+", metavar="JOURNAL",
+                       help="Build the outputs from the journals of all shard runs")
+    parser.add_argument("--stream", action="store_true",
+                       help="Stream each enriched metabolite to the journal and build the outputs from it, "
+                            "keeping memory flat for large inputs")
+    parser.add_argument("--prefetch-hmdb", action="store_true",
+                       help="Download all missing HMDB XML files concurrently before enriching")
 
     args = parser.parse_args()
 
+    if args.hmdb_fields and not args.shard and is_full_enriched_output(args.output):
+        logger.error(f"{args.output} holds records enriched from every HMDB field; a run restricted to "
+                     f"--hmdb-fields {' '.join(args.hmdb_fields)} would replace them with partial records. "
+                     f"Write to another --output instead")
+        return 1
+
     try:
         # Initialize the enricher
         enricher = MetaboliteDataEnricher(
@@ -2133,63 +3130,110 @@ def main():
             refresh_cache=args.refresh_cache,
             force_pubchem=args.force_pubchem,
             include_health_conditions=args.include_health_conditions,
-            include_food_recommendations=args.include_food_recommendations
+            include_food_recommendations=args.include_food_recommendations,
+            workers=args.workers,
+            parallel_sources=args.parallel_sources,
+            race_cid_strategies=args.race_cid_strategies,
+            hmdb_fields=args.hmdb_fields
         )
 
-        # Process metabolites
-        enriched_data = enricher.process_metabolites_from_csv(
-            csv_file=args.input,
-            sample_size=args.sample_size
-        )
-
-        # Save to JSON
-        if enricher.save_enriched_data_to_json():
-            json_output_status = "✓"
-        else:
-            json_output_status = "✗"
-        
-        # Save enriched data by name to JSON
-        if enricher.save_enriched_data_by_name_to_json():
-            json_by_name_output_status = "✓"
+        if args.prefetch_hmdb and not args.merge_shards:
+            from hmdb_prefetch import prefetch_hmdb_xml, read_hmdb_ids
+            hmdb_ids = read_hmdb_ids(args.input, args.sample_size)
+            if args.shard:
+                hmdb_ids = [hmdb_id for hmdb_id in hmdb_ids
+                            if shard_for_hmdb_id(hmdb_id, args.shard[1]) == args.shard[0]]
+            prefetch_hmdb_xml(hmdb_ids, lookup=enricher._get_hmdb_lookup())
+
+        if args.shard:
+            shard_index, shard_count = args.shard
+            journal_file = args.journal_file
+            if journal_file == JOURNAL_FILE:
+                journal_file = shard_journal_path(JOURNAL_FILE, shard_index, shard_count)
+            tasks = enricher.enrich_shard(
+                shard_index, shard_count,
+                csv_file=args.input,
+                journal_file=journal_file,
+                sample_size=args.sample_size,
+                resume=args.resume,
+                since=args.since
+            )
+            logger.info(f"Shard {shard_index + 1}/{shard_count} completed: {tasks} metabolites written to {journal_file}")
+            return 0
+
+        if args.merge_shards:
+            stats = enricher.merge_shards(
+                args.merge_shards,
+                csv_file=args.input,
+                journal_file=args.journal_file,
+                json_file=args.output,
+                by_name_file=ENRICHED_BY_NAME_JSON_FILE,
+                csv_output=args.output_csv,
+                sample_size=args.sample_size
+            )
+            json_output_status = json_by_name_output_status = csv_output_status = "✓"
+        elif args.stream:
+            # Write the outputs straight from the journal
+            stats = enricher.process_metabolites_streaming(
+                csv_file=args.input,
+                journal_file=args.journal_file,
+                json_file=args.output,
+                by_name_file=ENRICHED_BY_NAME_JSON_FILE,
+                csv_output=args.output_csv,
+                sample_size=args.sample_size,
+                resume=args.resume,
+                since=args.since
+            )
+            json_output_status = json_by_name_output_status = csv_output_status = "✓"
         else:
-            json_by_name_output_status = "✗"
-            
-        # Save to CSV for compatibility
-        if enricher.save_enriched_data_to_csv():
-            csv_output_status = "✓"
-        else:
-            csv_output_status = "✗"
+            # Process metabolites
+            enriched_data = enricher.process_metabolites_from_csv(
+                csv_file=args.input,
+                sample_size=args.sample_size,
+                journal_file=args.journal_file,
+                resume=args.resume,
+                since=args.since
+            )
+
+            # Save to JSON
+            if enricher.save_enriched_data_to_json():
+                json_output_status = "✓"
+            else:
+                json_output_status = "✗"
+
+            # Save enriched data by name to JSON
+            if enricher.save_enriched_data_by_name_to_json():
+                json_by_name_output_status = "✓"
+            else:
+                json_by_name_output_status = "✗"
+
+            # Save to CSV for compatibility
+            if enricher.save_enriched_data_to_csv():
+                csv_output_status = "✓"
+            else:
+                csv_output_status = "✗"
+
+            stats = {}
+            for data in enriched_data.values():
+                _count_enrichment_sources(stats, data)
 
         # Show summary
+        total = stats.get('total', 0)
         logger.info("Metabolite enrichment completed successfully!")
-        logger.info(f"Total metabolites processed: {len(enriched_data)}")
+        logger.info(f"Total metabolites processed: {total}")
         logger.info(f"JSON output: {json_output_status} {args.output}")
-        logger.info(f"JSON by name output: {json_by_name_output_status} data/metabolite_enriched_data_by_name.json")
+        logger.info(f"JSON by name output: {json_by_name_output_status} {ENRICHED_BY_NAME_JSON_FILE}")
         logger.info(f"CSV output: {csv_output_status} {args.output_csv}")
 
         # Show statistics
-        perplexity_success = sum(1 for data in enriched_data.values()
-                               if data.get('data_sources', {}).get('perplexity_success', False))
-        hmdb_success = sum(1 for data in enriched_data.values()
-                         if data.get('data_sources', {}).get('hmdb_success', False))
-        pubchem_success = sum(1 for data in enriched_data.values()
-                            if data.get('data_sources', {}).get('pubchem_success', False))
-        contextual_info = sum(1 for data in enriched_data.values()
-                            if data.get('data_sources', {}).get('has_contextual_info', False))
-
-        logger.info(f"Perplexity enrichment success: {perplexity_success} ({perplexity_success/len(enriched_data)*100:.1f}%)")
-        logger.info(f"HMDB enrichment success: {hmdb_success} ({hmdb_success/len(enriched_data)*100:.1f}%)")
-        logger.info(f"PubChem enrichment success: {pubchem_success} ({pubchem_success/len(enriched_data)*100:.1f}%)")
-        logger.info(f"Contextual enrichment: {contextual_info} ({contextual_info/len(enriched_data)*100:.1f}%)")
+        logger.info(f"Perplexity enrichment success: {stats['perplexity_success']} ({stats['perplexity_success']/total*100:.1f}%)")
+        logger.info(f"HMDB enrichment success: {stats['hmdb_success']} ({stats['hmdb_success']/total*100:.1f}%)")
+        logger.info(f"PubChem enrichment success: {stats['pubchem_success']} ({stats['pubchem_success']/total*100:.1f}%)")
+        logger.info(f"Contextual enrichment: {stats['has_contextual_info']} ({stats['has_contextual_info']/total*100:.1f}%)")
 
         # Show primary source distribution
-        perplexity_primary = sum(1 for data in enriched_data.values()
-                               if data.get('data_sources', {}).get('primary_source') == 'perplexity')
-        hmdb_primary = sum(1 for data in enriched_data.values()
-                         if data.get('data_sources', {}).get('primary_source') == 'hmdb')
-
-        logger.info(f"Primary source - Perplexity: {perplexity_primary} ({perplexity_primary/len(enriched_data)*100:.1f}%)")
-        logger.info(f"Primary source - HMDB: {hmdb_primary} ({hmdb_primary/len(enriched_data)*100:.1f}%)")
+        logger.info(f"Primary source - Perplexity: {stats['perplexity_primary']} ({stats['perplexity_primary']/total*100:.1f}%)")
+        logger.info(f"Primary source - HMDB: {stats['hmdb_primary']} ({stats['hmdb_primary']/total*100:.1f}%)")
 
         return 0
 
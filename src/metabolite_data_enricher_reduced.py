@@ -37,6 +37,8 @@ from pubchem_data_retriever import (
     get_compound_synonyms,
     HEADERS
 )
+from pubchem_cid_cache import get_shared_cid_cache
+from service_limits import service_call, PUBCHEM_HOST, OPENROUTER_HOST
 
 # Constants
 ENRICHED_CSV_FILE = 'data/metabolite_enriched_data.csv'
@@ -70,7 +72,6 @@ logger.debug(f"Environment variable source confirmation - OPENROUTER_API_KEY is
 CACHE_FILE = "data/metabolite_enrichment_cache.pkl"
 ENRICHED_JSON_FILE = "data/metabolite_enriched_data.json"
 ENRICHED_CSV_FILE = "data/enriched_normal_ranges.csv"
-RATE_LIMIT_DELAY = 2  # Seconds between API calls
 
 # Perplexity models via OpenRouter for metabolite enrichment
 PERPLEXITY_FALLBACK_MODELS = [
@@ -210,9 +211,6 @@ class MetaboliteDataEnricher:
                 # Cache the result
                 self.cache[cache_key] = info
 
-                # Rate limiting
-                time.sleep(RATE_LIMIT_DELAY)
-
                 return info
             else:
                 logger.warning(f"No response from Perplexity for {metabolite_name}")
@@ -346,12 +344,13 @@ Focus on providing accurate, scientific information from reliable biochemical an
                 }
 
                 logger.debug(f"Sending request to OpenRouter API with model {model}")
-                response = requests.post(
-                    'https://openrouter.ai/api/v1/chat/completions',
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
-                )
+                with service_call(OPENROUTER_HOST):
+                    response = requests.post(
+                        'https://openrouter.ai/api/v1/chat/completions',
+                        headers=headers,
+                        json=payload,
+                        timeout=timeout
+                    )
 
                 if response.status_code == 200:
                     data = response.json()
@@ -712,16 +711,29 @@ Focus on providing accurate, scientific information from reliable biochemical an
         return enriched_metabolite
 
     def _search_pubchem_by_name(self, metabolite_name: str) -> Optional[str]:
-        """Search PubChem for a compound by name and return the CID."""
+        """Search PubChem for a compound by name and return the CID, consulting the shared CID cache first."""
+        cid_cache = get_shared_cid_cache()
+        cached = cid_cache.get('name', metabolite_name) if cid_cache is not None else None
+        if cached is not None:
+            if cached:
+                logger.info(f"Found PubChem CID {cached} for {metabolite_name} in the CID cache.")
+                return cached
+            logger.warning(f"Could not find PubChem CID for {metabolite_name} by name search (cached miss).")
+            return None
         try:
             search_url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{metabolite_name}/cids/JSON"
-            response = requests.get(search_url, headers=HEADERS, timeout=15)
+            with service_call(PUBCHEM_HOST):
+                response = requests.get(search_url, headers=HEADERS, timeout=15)
             if response.status_code == 200:
                 data = response.json()
                 if 'IdentifierList' in data and 'CID' in data['IdentifierList']:
                     cid = str(data['IdentifierList']['CID'][0])
                     logger.info(f"Found PubChem CID {cid} for {metabolite_name} by name search.")
+                    if cid_cache is not None:
+                        cid_cache.put('name', metabolite_name, cid)
                     return cid
+            if response.status_code == 404 and cid_cache is not None:
+                cid_cache.put('name', metabolite_name, '')
             logger.warning(f"Could not find PubChem CID for {metabolite_name} by name search.")
             return None
         except Exception as e:
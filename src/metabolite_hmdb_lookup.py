@@ -8,6 +8,7 @@ Functions:
     - get_hmdb_id_from_name: Convert metabolite name to HMDB ID
     - get_metabolite_name_from_hmdb_id: Convert HMDB ID to metabolite name
     - get_metabolite_info_by_hmdb_id: Get metabolite info from CSV by HMDB ID
+    - find_metabolites_by_hmdb_id: Get every CSV row that lists an HMDB ID
     - get_diet_advice_by_hmdb_id: Get diet advice by HMDB ID and status
     - is_valid_hmdb_id: Validate HMDB ID format
 """
@@ -92,6 +93,62 @@ def _load_normal_ranges_csv(csv_path: str = "input/normal_ranges.csv") -> pd.Dat
         raise
 
 
+def _load_normal_ranges_index(csv_path: str = "input/normal_ranges.csv") -> Dict[str, Dict[str, Any]]:
+    """
+    Build (once per CSV file) the lookup indexes of the normal ranges table.
+
+    Lookups used to scan the whole table with a boolean mask on every call; the
+    indexes map each key straight to the position of its row instead. Where
+    several rows share a key, the first row wins, as with the mask scan.
+
+    Args:
+        csv_path (str): Path to normal ranges CSV file
+
+    Returns:
+        Dict: Indexes of row positions:
+              'hmdb' - exact value of the hmdb column,
+              'hmdb_member' - each space-separated ID of the hmdb column (all rows),
+              'name' - lowercased chemical_name
+    """
+    cache_key = f"normal_ranges_index_{csv_path}"
+
+    if cache_key in _data_cache:
+        return _data_cache[cache_key]
+
+    df = _load_normal_ranges_csv(csv_path)
+
+    by_hmdb: Dict[str, int] = {}
+    by_member: Dict[str, List[int]] = {}
+    by_name: Dict[str, int] = {}
+    for position, (hmdb_value, name) in enumerate(zip(df['hmdb'], df['chemical_name'])):
+        if isinstance(hmdb_value, str):
+            by_hmdb.setdefault(hmdb_value, position)
+            for hmdb_id in hmdb_value.split():
+                rows = by_member.setdefault(hmdb_id, [])
+                if not rows or rows[-1] != position:
+                    rows.append(position)
+        if isinstance(name, str):
+            by_name.setdefault(name.lower(), position)
+
+    index = {'hmdb': by_hmdb, 'hmdb_member': by_member, 'name': by_name}
+    _data_cache[cache_key] = index
+    logger.debug(f"Indexed {len(by_hmdb)} HMDB values, {len(by_member)} HMDB IDs and {len(by_name)} names from {csv_path}")
+
+    return index
+
+
+def _row_info(df: pd.DataFrame, position: int) -> Dict[str, Any]:
+    """Row of the normal ranges table as a dict, with NaN values replaced by None."""
+    info = df.iloc[position].to_dict()
+
+    # Replace NaN values with None for JSON serialization
+    for key, value in info.items():
+        if pd.isna(value):
+            info[key] = None
+
+    return info
+
+
 def _load_diet_advice_json(json_path: str) -> Dict[str, Any]:
     """
     Load diet advice JSON file with caching.
@@ -149,13 +206,10 @@ def get_hmdb_id_from_name(metabolite_name: str, csv_path: str = "input/normal_ra
         df = _load_normal_ranges_csv(csv_path)
 
         # Case-insensitive exact match first
-        metabolite_name_lower = metabolite_name.strip().lower()
-        df_lower = df['chemical_name'].str.lower()
-
-        matches = df[df_lower == metabolite_name_lower]
+        position = _load_normal_ranges_index(csv_path)['name'].get(metabolite_name.strip().lower())
 
-        if not matches.empty:
-            hmdb_id = matches.iloc[0]['hmdb']
+        if position is not None:
+            hmdb_id = df['hmdb'].iat[position]
 
             # Validate the HMDB ID format
             if is_valid_hmdb_id(hmdb_id):
@@ -191,10 +245,10 @@ def get_metabolite_name_from_hmdb_id(hmdb_id: str, csv_path: str = "input/normal
     try:
         df = _load_normal_ranges_csv(csv_path)
 
-        matches = df[df['hmdb'] == hmdb_id]
+        position = _load_normal_ranges_index(csv_path)['hmdb'].get(hmdb_id)
 
-        if not matches.empty:
-            metabolite_name = matches.iloc[0]['chemical_name']
+        if position is not None:
+            metabolite_name = df['chemical_name'].iat[position]
             logger.debug(f"Found metabolite name '{metabolite_name}' for HMDB ID {hmdb_id}")
             return metabolite_name
 
@@ -224,19 +278,10 @@ def get_metabolite_info_by_hmdb_id(hmdb_id: str, csv_path: str = "input/normal_r
     try:
         df = _load_normal_ranges_csv(csv_path)
 
-        matches = df[df['hmdb'] == hmdb_id]
-
-        if not matches.empty:
-            row = matches.iloc[0]
-
-            # Convert to dictionary and handle NaN values
-            info = row.to_dict()
-
-            # Replace NaN values with None for JSON serialization
-            for key, value in info.items():
-                if pd.isna(value):
-                    info[key] = None
+        position = _load_normal_ranges_index(csv_path)['hmdb'].get(hmdb_id)
 
+        if position is not None:
+            info = _row_info(df, position)
             logger.debug(f"Found metabolite info for HMDB ID {hmdb_id}")
             return info
 
@@ -248,6 +293,35 @@ def get_metabolite_info_by_hmdb_id(hmdb_id: str, csv_path: str = "input/normal_r
         return {}
 
 
+def find_metabolites_by_hmdb_id(hmdb_id: str, csv_path: str = "input/normal_ranges.csv") -> List[Dict[str, Any]]:
+    """
+    Get every row of the CSV whose hmdb column lists an HMDB ID.
+
+    Unlike get_metabolite_info_by_hmdb_id, which matches the whole hmdb value,
+    this also finds rows with several space-separated IDs, such as summed
+    metabolite panels.
+
+    Args:
+        hmdb_id (str): HMDB ID
+        csv_path (str): Path to normal ranges CSV file
+
+    Returns:
+        List[Dict[str, Any]]: Matching rows in file order, empty if none
+    """
+    if not is_valid_hmdb_id(hmdb_id):
+        logger.warning(f"Invalid HMDB ID format: {hmdb_id}")
+        return []
+
+    try:
+        df = _load_normal_ranges_csv(csv_path)
+        positions = _load_normal_ranges_index(csv_path)['hmdb_member'].get(hmdb_id, [])
+        return [_row_info(df, position) for position in positions]
+
+    except Exception as e:
+        logger.error(f"Error finding metabolites for HMDB ID {hmdb_id}: {e}")
+        return []
+
+
 def get_diet_advice_by_hmdb_id(hmdb_id: str, status: str) -> Dict[str, Any]:
     """
     Get diet advice by HMDB ID and concentration status.
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+PubChem CID Cache
+
+Durable cache of identifier -> PubChem CID resolutions, shared by every PubChem
+client: MetaboliteDataEnricher (through PubChemCIDResolver), PubChemLookup in
+improved_pubchem_lookup and the reduced enricher's name search.
+
+Entries are keyed by (identifier type, normalized identifier), e.g.
+('name', 'glycine') or ('inchikey', 'DHMQDGOQFOQNFH-UHFFFAOYSA-N'). A CID that
+was found is kept for good. A miss, such as a name that does not resolve
+(lipid shorthand like 'PC(36:2)'), is kept for NEGATIVE_TTL_SECONDS and then
+asked about again, in case PubChem has gained the synonym since. Failed
+requests are never cached.
+
+The cache is a SQLite database in WAL mode, so the processes of a sharded run
+can share one file.
+
+Usage:
+    python src/pubchem_cid_cache.py stats
+    python src/pubchem_cid_cache.py purge
+"""
+
+import argparse
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Constants
+PUBCHEM_CID_CACHE_FILE = 'data/pubchem_cid_cache.sqlite'
+NEGATIVE_TTL_SECONDS = 30 * 24 * 3600  # Misses are asked about again after 30 days
+# Identifier types: PUG REST compound namespaces, and 'hmdb' for the RegistryID cross-reference
+ID_TYPES = ('inchikey', 'inchi', 'smiles', 'name', 'hmdb')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cid_resolutions (
+    id_type TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    resolved_at REAL NOT NULL,
+    PRIMARY KEY (id_type, identifier)
+);
+"""
+
+_shared_caches: Dict[str, 'PubChemCIDCache'] = {}
+_shared_lock = threading.Lock()
+
+
+def normalize_identifier(id_type: str, identifier: str) -> str:
+    """
+    Normalize an identifier, so spellings PubChem treats alike share one entry.
+
+    Args:
+        id_type (str): One of ID_TYPES
+        identifier (str): Identifier of that type
+
+    Returns:
+        str: Normalized identifier; names are matched case-insensitively by PubChem
+    """
+    if id_type not in ID_TYPES:
+        raise ValueError(f"Unknown identifier type {id_type!r}, expected one of {ID_TYPES}")
+    identifier = identifier.strip()
+    if id_type == 'name':
+        return identifier.lower()
+    if id_type in ('inchikey', 'hmdb'):
+        return identifier.upper()
+    return identifier
+
+
+class PubChemCIDCache:
+    """SQLite cache of identifier -> PubChem CID resolutions, with expiring negative entries."""
+
+    def __init__(self, path: str = PUBCHEM_CID_CACHE_FILE, negative_ttl: float = NEGATIVE_TTL_SECONDS):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path (str): Path to the SQLite database
+            negative_ttl (float): Seconds a miss is remembered for
+        """
+        self.path = path
+        self.negative_ttl = negative_ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # A single connection shared by all threads, serialized by the lock; other processes
+        # may write to the same file, so wait for their transactions instead of failing
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, id_type: str, identifier: str) -> Optional[str]:
+        """
+        Get a cached resolution.
+
+        Args:
+            id_type (str): One of ID_TYPES
+            identifier (str): Identifier of that type
+
+        Returns:
+            Optional[str]: CID, '' for a miss that has not expired, or None if the identifier
+                           has to be resolved
+        """
+        key = (id_type, normalize_identifier(id_type, identifier))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cid, resolved_at FROM cid_resolutions WHERE id_type = ? AND identifier = ?", key
+            ).fetchone()
+        if row is None:
+            return None
+        cid, resolved_at = row
+        if not cid and time.time() - resolved_at > self.negative_ttl:
+            return None
+        return cid
+
+    def put(self, id_type: str, identifier: str, cid: str) -> None:
+        """
+        Store a resolution.
+
+        Args:
+            id_type (str): One of ID_TYPES
+            identifier (str): Identifier of that type
+            cid (str): PubChem CID, or '' if PubChem does not know the identifier
+        """
+        self.put_many([(id_type, identifier, cid)])
+
+    def put_many(self, resolutions: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Store many resolutions in one transaction.
+
+        Args:
+            resolutions (Iterable[Tuple[str, str, str]]): (identifier type, identifier, CID or '') triples
+        """
+        now = time.time()
+        rows = [(id_type, normalize_identifier(id_type, identifier), str(cid or ''), now)
+                for id_type, identifier, cid in resolutions]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cid_resolutions (id_type, identifier, cid, resolved_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def purge_expired(self) -> int:
+        """
+        Delete the misses whose TTL has passed.
+
+        Returns:
+            int: Number of entries deleted
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM cid_resolutions WHERE cid = '' AND resolved_at < ?", (time.time() - self.negative_ttl,)
+            )
+        return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Count the entries of the cache.
+
+        Returns:
+            Dict[str, int]: Found CIDs and misses per identifier type, and expired misses in total
+        """
+        stats = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id_type, cid != '', COUNT(*) FROM cid_resolutions GROUP BY id_type, cid != ''"
+            ).fetchall()
+            stats['expired'] = self._conn.execute(
+                "SELECT COUNT(*) FROM cid_resolutions WHERE cid = '' AND resolved_at < ?",
+                (time.time() - self.negative_ttl,)
+            ).fetchone()[0]
+        for id_type, found, count in rows:
+            stats[f"{id_type}_{'found' if found else 'missing'}"] = count
+        return stats
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cid_resolutions").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def get_shared_cid_cache(path: str = PUBCHEM_CID_CACHE_FILE) -> Optional[PubChemCIDCache]:
+    """
+    Get the cache at a path, opened once per process and shared by all PubChem clients.
+
+    Args:
+        path (str): Path to the SQLite database
+
+    Returns:
+        Optional[PubChemCIDCache]: The cache, or None if it cannot be opened (resolutions are then not cached)
+    """
+    with _shared_lock:
+        if path not in _shared_caches:
+            try:
+                _shared_caches[path] = PubChemCIDCache(path)
+            except sqlite3.Error as e:
+                logger.error(f"Error opening PubChem CID cache {path}: {e}")
+                return None
+        return _shared_caches[path]
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Inspect and maintain the PubChem CID cache.")
+    parser.add_argument("--cache", default=PUBCHEM_CID_CACHE_FILE, help="Path to the SQLite CID cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Count the cached resolutions")
+    subparsers.add_parser("purge", help="Delete the misses whose TTL has passed")
+    args = parser.parse_args()
+
+    try:
+        cache = PubChemCIDCache(args.cache)
+        if args.command == "stats":
+            for name, count in sorted(cache.get_stats().items()):
+                print(f"{name}\t{count}")
+        else:
+            logger.info(f"Deleted {cache.purge_expired()} expired misses from {args.cache}")
+        cache.close()
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error running PubChem CID cache command: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
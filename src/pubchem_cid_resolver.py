@@ -0,0 +1,284 @@
+"""
+PubChem CID Resolver
+
+Resolves compound identifiers (InChIKeys, InChIs, SMILES and names) to PubChem
+CIDs through PUG REST, and remembers every answer for the rest of the run.
+
+Resolution is deduplicated and concurrent, not batched: every unique identifier
+costs one PUG REST request. PUG REST only takes lists of identifiers for
+numeric IDs, and the name, InChI, InChIKey and SMILES namespaces answer one
+identifier per request. The identifiers of all pending metabolites are
+collected and deduplicated against each other and against everything resolved
+so far. What is left is resolved concurrently over one pooled keep-alive
+session. A cold run with N distinct identifiers still makes N requests, and
+service_limits caps PubChem at 5 requests per second, so it takes at least
+N / 5 seconds. What cuts requests is reuse: the in-run memo, the durable
+cache and the InChIKey index below. PubChem's asynchronous ID Exchange service,
+which maps many identifiers per job, is not used.
+
+Each metabolite has a list of candidate identifiers in priority order.
+resolve_candidates works through the lists tier by tier: every round resolves
+the next untried candidate of each metabolite that is still unresolved. It
+makes the same requests as trying the candidates one after another, minus the
+duplicates, and get_pubchem_info then finds the answers in memory.
+
+Answers are also written to the durable PubChem CID cache (see
+pubchem_cid_cache), so later runs resolve them without any request. Misses
+expire there after a TTL. InChIKeys are first looked up in the offline index
+built from PubChem's bulk CID-InChI-Key file (see inchikey_cid_index), when it
+has been built.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from inchikey_cid_index import InChIKeyCIDIndex
+from pubchem_cid_cache import PubChemCIDCache, normalize_identifier
+from service_limits import service_call, PUBCHEM_HOST, SERVICE_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# Constants
+PUG_REST_URL = 'https://pubchem.ncbi.nlm.nih.gov/rest/pug'
+NAMESPACES = ('inchikey', 'inchi', 'smiles', 'name')
+# Namespaces sent as a POST body, so InChI layers, SMILES and names with '/' or '#' need no URL escaping
+POST_NAMESPACES = ('inchi', 'smiles', 'name')
+REQUEST_TIMEOUT = 20
+# Statuses with which PubChem answers an identifier it cannot resolve; they are remembered as misses
+NOT_FOUND_STATUSES = (400, 404)
+DEFAULT_WORKERS = SERVICE_CONCURRENCY[PUBCHEM_HOST]
+
+HEADERS = {
+    'User-Agent': 'MetaboliteDataEnricher/1.0 (research project; contact@example.com)'
+}
+
+Identifier = Tuple[str, str]
+
+
+class PubChemCIDResolver:
+    """Thread-safe, memoizing resolver of compound identifiers to PubChem CIDs."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, session: Optional[requests.Session] = None,
+                 cid_cache: Optional[PubChemCIDCache] = None, inchikey_index: Optional[InChIKeyCIDIndex] = None,
+                 refresh: bool = False):
+        """
+        Initialize the resolver.
+
+        Args:
+            workers (int): Maximum number of concurrent requests while resolving many identifiers
+            session (Optional[requests.Session]): Session to send requests with; a pooled one by default
+            cid_cache (Optional[PubChemCIDCache]): Durable cache consulted before PubChem and
+                                                   updated with every answer; None to disable
+            inchikey_index (Optional[InChIKeyCIDIndex]): Offline index consulted first for InChIKeys;
+                                                         keys it does not hold are resolved as usual
+            refresh (bool): Resolve identifiers again instead of reading the durable cache, which
+                            is still updated with the new answers
+        """
+        self.workers = max(1, workers)
+        self.cid_cache = cid_cache
+        self.inchikey_index = inchikey_index
+        self.refresh = refresh
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+            session.mount('https://', adapter)
+        self.session = session
+        self._cids: Dict[Identifier, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'hits': 0, 'index_hits': 0, 'cache_hits': 0, 'errors': 0}
+
+    @staticmethod
+    def _key(namespace: str, identifier: str) -> Identifier:
+        """Normalize an identifier (see pubchem_cid_cache.normalize_identifier)."""
+        if namespace not in NAMESPACES:
+            raise ValueError(f"Unknown PubChem namespace {namespace!r}, expected one of {NAMESPACES}")
+        return namespace, normalize_identifier(namespace, identifier)
+
+    def lookup(self, namespace: str, identifier: str) -> Optional[str]:
+        """
+        Get an already resolved identifier without making a request, from the InChIKey index,
+        memory or the durable cache.
+
+        Args:
+            namespace (str): One of NAMESPACES
+            identifier (str): Identifier in that namespace
+
+        Returns:
+            Optional[str]: CID, '' if PubChem does not know the identifier, or None if it was not resolved yet
+        """
+        key = self._key(namespace, identifier)
+        if namespace == 'inchikey' and self.inchikey_index is not None:
+            cid = self.inchikey_index.get(key[1])
+            if cid is not None:
+                with self._lock:
+                    self._stats['index_hits'] += 1
+                return cid
+
+        with self._lock:
+            cid = self._cids.get(key)
+        if cid is not None or self.cid_cache is None or self.refresh:
+            return cid
+
+        cid = self.cid_cache.get(*key)
+        if cid is not None:
+            with self._lock:
+                self._cids[key] = cid
+                self._stats['cache_hits'] += 1
+        return cid
+
+    def resolve(self, namespace: str, identifier: str) -> str:
+        """
+        Resolve a single identifier, from memory if it was resolved before.
+
+        Args:
+            namespace (str): One of NAMESPACES
+            identifier (str): Identifier in that namespace
+
+        Returns:
+            str: PubChem CID or empty string if not found
+        """
+        key = self._key(namespace, identifier)
+        if not key[1]:
+            return ""
+        cid = self.lookup(*key)
+        if cid is not None:
+            with self._lock:
+                self._stats['hits'] += 1
+            return cid
+        return self._fetch(key) or ""
+
+    def resolve_many(self, identifiers: Iterable[Identifier]) -> Dict[Identifier, str]:
+        """
+        Resolve many identifiers, each unique one at most once, with concurrent requests.
+
+        Args:
+            identifiers (Iterable[Tuple[str, str]]): (namespace, identifier) pairs
+
+        Returns:
+            Dict[Tuple[str, str], str]: CID (or '' if not found) for every given pair
+        """
+        keys = {pair: self._key(*pair) for pair in identifiers}
+        known = {key: self.lookup(*key) for key in set(keys.values())}
+        known.update(self._fetch_missing(key for key, cid in known.items() if cid is None))
+        return {pair: known[key] or "" for pair, key in keys.items()}
+
+    def resolve_candidates(self, candidates: Dict[Hashable, List[Identifier]]) -> Dict[Hashable, str]:
+        """
+        Resolve the first candidate identifier with a CID, for many compounds at once.
+
+        Candidates are tried in order, as one-by-one lookups would, but one tier at a
+        time across all compounds: each round resolves the unique identifiers of that
+        tier concurrently, one request per identifier that is not known yet.
+
+        Args:
+            candidates (Dict[Hashable, List[Tuple[str, str]]]): Candidate (namespace, identifier)
+                                                                pairs per compound, in priority order
+
+        Returns:
+            Dict[Hashable, str]: CID of every compound that one of its candidates resolved
+        """
+        pending = {compound: 0 for compound, pairs in candidates.items() if pairs}
+        attempted: Dict[Identifier, str] = {}
+        found: Dict[Hashable, str] = {}
+        rounds = 0
+
+        while pending:
+            to_fetch = set()
+            for compound, index in list(pending.items()):
+                pairs = candidates[compound]
+                while index < len(pairs):
+                    key = self._key(*pairs[index])
+                    cid = attempted.get(key) if key in attempted else self.lookup(*key)
+                    if not key[1]:
+                        cid = ""
+                    if cid is None:
+                        to_fetch.add(key)
+                        break
+                    if cid:
+                        found[compound] = cid
+                        break
+                    index += 1
+                if compound in found or index >= len(pairs):
+                    del pending[compound]
+                else:
+                    pending[compound] = index
+
+            if to_fetch:
+                rounds += 1
+                logger.info(f"Resolving {len(to_fetch)} PubChem identifiers for {len(pending)} compounds (round {rounds})")
+                # Failed requests count as misses here, so every compound moves on to its next candidate
+                attempted.update({key: cid or "" for key, cid in self._fetch_missing(to_fetch).items()})
+
+        logger.info(f"Resolved PubChem CIDs for {len(found)} of {len(candidates)} compounds in {rounds} rounds")
+        return found
+
+    def _fetch_missing(self, keys: Iterable[Identifier]) -> Dict[Identifier, Optional[str]]:
+        """Fetch the keys that are not resolved yet, concurrently; returns the fetched results."""
+        with self._lock:
+            missing = [key for key in keys if key[1] and key not in self._cids]
+        if not missing:
+            return {}
+        if self.workers <= 1 or len(missing) == 1:
+            return {key: self._fetch(key) for key in missing}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pubchem-cid') as executor:
+            return dict(zip(missing, executor.map(self._fetch, missing)))
+
+    def _fetch(self, key: Identifier) -> Optional[str]:
+        """
+        Resolve one normalized identifier through PUG REST and remember the answer.
+
+        Args:
+            key (Tuple[str, str]): Normalized (namespace, identifier)
+
+        Returns:
+            Optional[str]: CID, '' if PubChem does not know the identifier, or None if the
+                           request failed (not remembered, so it is tried again later)
+        """
+        namespace, identifier = key
+        try:
+            with service_call(PUBCHEM_HOST):
+                if namespace in POST_NAMESPACES:
+                    response = self.session.post(f"{PUG_REST_URL}/compound/{namespace}/cids/JSON",
+                                                 data={namespace: identifier}, timeout=REQUEST_TIMEOUT)
+                else:
+                    response = self.session.get(f"{PUG_REST_URL}/compound/{namespace}/{quote(identifier)}/cids/JSON",
+                                                timeout=REQUEST_TIMEOUT)
+            with self._lock:
+                self._stats['requests'] += 1
+
+            if response.status_code in NOT_FOUND_STATUSES:
+                cid = ""
+            else:
+                response.raise_for_status()
+                cid_list = response.json().get("IdentifierList", {}).get("CID", [])
+                # CID 0 means the structure is valid but not in PubChem
+                cid = str(cid_list[0]) if cid_list and cid_list[0] else ""
+        except Exception as e:
+            logger.debug(f"Error resolving PubChem CID by {namespace} {identifier[:60]}: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+            return None
+
+        with self._lock:
+            self._cids[key] = cid
+        if self.cid_cache is not None:
+            self.cid_cache.put(namespace, identifier, cid)
+        return cid
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get resolution statistics.
+
+        Returns:
+            Dict[str, int]: Identifiers remembered, requests made, answers served from memory, the
+                            InChIKey index and the durable cache, failed requests
+        """
+        with self._lock:
+            return {'identifiers': len(self._cids), **self._stats}
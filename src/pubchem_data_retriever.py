@@ -4,17 +4,35 @@ PubChem Data Retriever Module
 
 This module provides functionality to retrieve compound information from PubChem,
 cache the data in JSON format, and parse it for use in enrichment processes.
+
+A PUG-View record is loaded and walked once per CID: each top-level section is
+handed to the extractor for its TOCHeading, and the combined result is memoized
+for the rest of the run, so the individual getters share a single parse.
+
+Records are pruned before they are cached: only the sections, keys and
+literature entries the extractors read are kept, and the result is stored as
+compact JSON. In the 'headings' fetch mode only those sections are downloaded,
+one PUG-View ?heading= request each. Caches written before pruning are shrunk with:
+
+    python src/pubchem_data_retriever.py migrate
 """
 
+import argparse
+import copy
+import glob
 import logging
 import os
 import json
+import sys
+import threading
 import time
 from typing import Dict, Any, List, Optional
 from urllib.parse import quote
 import requests
 from pathlib import Path
 
+from service_limits import service_call, PUBCHEM_HOST
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,7 +42,38 @@ logger = logging.getLogger(__name__)
 
 # Constants
 PUBCHEM_CACHE_DIR = 'data/pubchem_cache'
-RATE_LIMIT_DELAY = 0.5  # seconds between API calls to avoid rate limiting
+MAX_SYNONYMS = 20
+MAX_LITERATURE_ENTRIES = 5
+SYNONYM_SECTIONS = ('MeSH Synonyms', 'Depositor-Supplied Synonyms')
+LITERATURE_SECTIONS = ('Consolidated References', 'NLM Curated PubMed Citations',
+                       'Springer Nature References', 'Thieme References', 'Wiley References')
+MAX_LITERATURE_ABSTRACTS = 10
+
+# Top-level PUG-View sections read by get_compound_data; all others are pruned before caching
+USED_HEADINGS = ('Names and Identifiers', 'Chemical and Physical Properties', 'Chemical Taxonomy',
+                 'Biological Test Results', 'Literature')
+# Subsections read within a used section (sections not listed here are kept whole)
+USED_SUBSECTIONS = {
+    'Chemical and Physical Properties': ('Computed Properties',),
+    'Chemical Taxonomy': ('Classification',),
+}
+# Keys read by the extractors
+SECTION_KEYS = ('TOCHeading', 'Information', 'Section')
+INFORMATION_KEYS = ('Name', 'Value', 'Reference')
+VALUE_KEYS = ('String', 'StringWithMarkup')
+RECORD_KEYS = ('RecordType', 'RecordNumber', 'RecordTitle')
+
+# Increment when the pruning keeps less, so records pruned by an older version are fetched again
+PRUNE_VERSION = 1
+PRUNE_VERSION_KEY = 'PruneVersion'
+
+# 'prune': fetch the full record and prune it; 'headings': fetch only the used headings
+FETCH_MODES = ('prune', 'headings')
+PUBCHEM_FETCH_MODE = 'prune'
+
+# Extracted compound data per CID, shared by all retrievers for the rest of the run
+_compound_data_memo: Dict[str, Dict[str, Any]] = {}
+_compound_data_lock = threading.Lock()
 
 # Headers for HTTP requests
 HEADERS = {
@@ -36,17 +85,28 @@ class PubChemRetriever:
     Class for retrieving and caching PubChem data.
     """
     
-    def __init__(self):
-        """Initialize the PubChemRetriever."""
+    def __init__(self, cache_dir: str = PUBCHEM_CACHE_DIR, fetch_mode: str = PUBCHEM_FETCH_MODE):
+        """
+        Initialize the PubChemRetriever.
+        
+        Args:
+            cache_dir (str): Directory of the cached PUG-View records
+            fetch_mode (str): 'prune' to download full records and prune them before caching,
+                              'headings' to download only the used headings (see FETCH_MODES)
+        """
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(f"Unknown PubChem fetch mode {fetch_mode!r}, expected one of {FETCH_MODES}")
         self.cache = {}
+        self.cache_dir = cache_dir
+        self.fetch_mode = fetch_mode
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
         # Create cache directory
-        os.makedirs(PUBCHEM_CACHE_DIR, exist_ok=True)
+        os.makedirs(cache_dir, exist_ok=True)
     
     def _get_cache_path(self, cid: str) -> str:
         """Get the file path for cached PubChem data."""
-        return os.path.join(PUBCHEM_CACHE_DIR, f"pubchem_{cid}.json")
+        return os.path.join(self.cache_dir, f"pubchem_{cid}.json")
     
     def _load_from_cache(self, cid: str) -> Optional[Dict[str, Any]]:
         """Load PubChem data from cache if available."""
@@ -55,6 +115,10 @@ class PubChemRetriever:
             try:
                 with open(cache_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
+                # Pruned by an older version, which may have dropped sections that are read now
+                if data.get(PRUNE_VERSION_KEY, PRUNE_VERSION) != PRUNE_VERSION:
+                    logger.info(f"Cached PubChem data for CID {cid} is outdated, fetching it again")
+                    return None
                 logger.info(f"Loaded cached PubChem data for CID {cid}")
                 return data
             except Exception as e:
@@ -63,32 +127,70 @@ class PubChemRetriever:
         return None
     
     def _save_to_cache(self, cid: str, data: Dict[str, Any]) -> bool:
-        """Save PubChem data to cache."""
+        """Save PubChem data to cache as compact JSON, replacing the cached file atomically."""
         cache_path = self._get_cache_path(cid)
+        temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(temp_path, cache_path)
             logger.info(f"Saved PubChem data to cache for CID {cid}")
             return True
         except Exception as e:
             logger.error(f"Error saving data to cache for CID {cid}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             return False
     
     def _fetch_pubchem_data(self, cid: str) -> Dict[str, Any]:
-        """Fetch PubChem data from API."""
+        """Fetch PubChem data from API, prune it and cache it."""
         try:
             url = f"https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{cid}/JSON"
             logger.info(f"Fetching PubChem data for CID {cid}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            if self.fetch_mode == 'headings':
+                data = self._fetch_used_headings(cid, url)
+            else:
+                with service_call(PUBCHEM_HOST):
+                    response = self.session.get(url, timeout=30)
+                    response.raise_for_status()
+                    data = response.json()
+            data = prune_pug_view_record(data)
             self._save_to_cache(cid, data)
-            time.sleep(RATE_LIMIT_DELAY)
             return data
         except Exception as e:
             logger.error(f"Error fetching PubChem data for CID {cid}: {e}")
             return {}
     
+    def _fetch_used_headings(self, cid: str, url: str) -> Dict[str, Any]:
+        """
+        Fetch only the used top-level sections of a record, with one ?heading= request each.
+        
+        A heading the compound does not have is answered with 404 and skipped; any other
+        error fails the whole fetch, so an incomplete record is never cached.
+        
+        Args:
+            cid (str): PubChem Compound ID
+            url (str): PUG-View URL of the record
+            
+        Returns:
+            Dict[str, Any]: PUG-View record with the used sections
+        """
+        record = None
+        for heading in USED_HEADINGS:
+            with service_call(PUBCHEM_HOST):
+                response = self.session.get(url, params={'heading': heading}, timeout=30)
+                if response.status_code == 404:
+                    continue
+                response.raise_for_status()
+                data = response.json()
+            if record is None:
+                record = data['Record']
+            else:
+                record.setdefault('Section', []).extend(data['Record'].get('Section', []))
+        if record is None:
+            raise ValueError(f"none of the headings {USED_HEADINGS} found for CID {cid}")
+        return {'Record': record}
+    
     def get_compound_description(self, cid: str) -> Dict[str, Any]:
         """
         Get compound description and properties from PubChem.
@@ -99,34 +201,10 @@ class PubChemRetriever:
         Returns:
             Dict[str, Any]: Dictionary containing description and properties
         """
-        data = self._load_from_cache(cid)
-        if not data:
-            data = self._fetch_pubchem_data(cid)
-        
-        if not data or 'Record' not in data:
-            logger.warning(f"No valid data found for CID {cid}")
-            return {'description': '', 'properties': {}}
-        
-        description = ""
-        properties = {}
-        
-        if 'Section' in data['Record']:
-            for section in data['Record']['Section']:
-                if section.get('TOCHeading') == 'Names and Identifiers':
-                    description = self._extract_any_text_from_section(section)
-                elif section.get('TOCHeading') == 'Chemical and Physical Properties':
-                    for subsection in section.get('Section', []):
-                        if subsection.get('TOCHeading') == 'Computed Properties':
-                            for info in subsection.get('Information', []):
-                                if 'Name' in info and 'Value' in info:
-                                    if info['Name'] == 'Molecular Weight':
-                                        properties['molecular_weight'] = info['Value'].get('String', '')
-                                    elif info['Name'] == 'Molecular Formula':
-                                        properties['molecular_formula'] = info['Value'].get('String', '')
-        
+        data = self.get_compound_data(cid)
         return {
-            'description': description,
-            'properties': properties
+            'description': data['description'],
+            'properties': data['properties']
         }
     
     def get_compound_classifications(self, cid: str) -> Dict[str, Any]:
@@ -139,34 +217,10 @@ class PubChemRetriever:
         Returns:
             Dict[str, Any]: Dictionary containing classifications and taxonomy
         """
-        data = self._load_from_cache(cid)
-        if not data:
-            data = self._fetch_pubchem_data(cid)
-        
-        if not data or 'Record' not in data:
-            logger.warning(f"No valid data found for CID {cid}")
-            return {'classifications': {}, 'taxonomy': {}}
-        
-        classifications = {}
-        taxonomy = {}
-        
-        if 'Section' in data['Record']:
-            for section in data['Record']['Section']:
-                if section.get('TOCHeading') == 'Chemical Taxonomy':
-                    for subsection in section.get('Section', []):
-                        if subsection.get('TOCHeading') == 'Classification':
-                            for info in subsection.get('Information', []):
-                                if 'Name' in info and 'Value' in info:
-                                    if info['Name'] == 'Kingdom':
-                                        taxonomy['kingdom'] = info['Value'].get('String', '')
-                                    elif info['Name'] == 'Super Class':
-                                        classifications['superclass'] = info['Value'].get('String', '')
-                                    elif info['Name'] == 'Class':
-                                        classifications['class'] = info['Value'].get('String', '')
-        
+        data = self.get_compound_data(cid)
         return {
-            'classifications': classifications,
-            'taxonomy': taxonomy
+            'classifications': data['classifications'],
+            'taxonomy': data['taxonomy']
         }
     
     def get_compound_bioactivity(self, cid: str) -> Dict[str, Any]:
@@ -179,25 +233,8 @@ class PubChemRetriever:
         Returns:
             Dict[str, Any]: Dictionary containing bioactivity data
         """
-        data = self._load_from_cache(cid)
-        if not data:
-            data = self._fetch_pubchem_data(cid)
-        
-        if not data or 'Record' not in data:
-            logger.warning(f"No valid data found for CID {cid}")
-            return {'bioactivity': []}
-        
-        bioactivity = []
-        
-        if 'Section' in data['Record']:
-            for section in data['Record']['Section']:
-                if section.get('TOCHeading') == 'Biological Test Results':
-                    bioactivity_text = self._extract_any_text_from_section(section)
-                    if bioactivity_text:
-                        bioactivity.append(bioactivity_text)
-        
         return {
-            'bioactivity': bioactivity
+            'bioactivity': self.get_compound_data(cid)['bioactivity']
         }
     
     def get_compound_literature(self, cid: str) -> Dict[str, Any]:
@@ -210,25 +247,8 @@ class PubChemRetriever:
         Returns:
             Dict[str, Any]: Dictionary containing literature data
         """
-        data = self._load_from_cache(cid)
-        if not data:
-            data = self._fetch_pubchem_data(cid)
-        
-        if not data or 'Record' not in data:
-            logger.warning(f"No valid data found for CID {cid}")
-            return {'literature': []}
-        
-        literature = []
-        
-        if 'Section' in data['Record']:
-            for section in data['Record']['Section']:
-                if section.get('TOCHeading') == 'Literature':
-                    literature_data = self._extract_pubchem_literature_enhanced(section)
-                    if literature_data:
-                        literature.extend(literature_data)
-        
         return {
-            'literature': literature[:5]  # Limit to 5 entries
+            'literature': self.get_compound_data(cid)['literature']
         }
     
     def get_compound_synonyms(self, cid: str) -> Dict[str, Any]:
@@ -241,45 +261,64 @@ class PubChemRetriever:
         Returns:
             Dict[str, Any]: Dictionary containing synonyms
         """
-        data = self._load_from_cache(cid)
-        if not data:
-            data = self._fetch_pubchem_data(cid)
-        
-        if not data or 'Record' not in data:
-            logger.warning(f"No valid data found for CID {cid}")
-            return {'synonyms': []}
-        
-        synonyms = []
-        
-        if 'Section' in data['Record']:
-            for section in data['Record']['Section']:
-                if section.get('TOCHeading') == 'Names and Identifiers':
-                    for subsection in section.get('Section', []):
-                        if subsection.get('TOCHeading') == 'Synonyms':
-                            for subsubsection in subsection.get('Section', []):
-                                if subsubsection.get('TOCHeading') in ['MeSH Synonyms', 'Depositor-Supplied Synonyms']:
-                                    for info in subsubsection.get('Information', []):
-                                        if 'Value' in info and 'StringWithMarkup' in info['Value']:
-                                            for markup in info['Value']['StringWithMarkup']:
-                                                if 'String' in markup:
-                                                    synonyms.append(markup['String'])
-                                        elif 'Value' in info and 'String' in info['Value']:
-                                            synonyms.append(info['Value']['String'])
-        
-        # Clean up synonyms and remove duplicates
-        cleaned_synonyms = []
-        seen = set()
-        for syn in synonyms:
-            cleaned = syn.strip()
-            if cleaned and cleaned.lower() not in seen and len(cleaned) < 100:
-                cleaned_synonyms.append(cleaned)
-                seen.add(cleaned.lower())
-        
-        logger.info(f"Extracted {len(cleaned_synonyms)} unique synonyms from PubChem for CID {cid}")
         return {
-            'synonyms': cleaned_synonyms[:20]  # Limit to top 20 synonyms
+            'synonyms': self.get_compound_data(cid)['synonyms']
         }
     
+    def _extract_names_section(self, section: Dict, result: Dict[str, Any]) -> None:
+        """Extract the description and the raw synonyms from the 'Names and Identifiers' section."""
+        result['description'] = self._extract_any_text_from_section(section)
+        for subsection in section.get('Section', []):
+            if subsection.get('TOCHeading') != 'Synonyms':
+                continue
+            for subsubsection in subsection.get('Section', []):
+                if subsubsection.get('TOCHeading') not in SYNONYM_SECTIONS:
+                    continue
+                for info in subsubsection.get('Information', []):
+                    if 'Value' in info and 'StringWithMarkup' in info['Value']:
+                        for markup in info['Value']['StringWithMarkup']:
+                            if 'String' in markup:
+                                result['synonyms'].append(markup['String'])
+                    elif 'Value' in info and 'String' in info['Value']:
+                        result['synonyms'].append(info['Value']['String'])
+    
+    def _extract_properties_section(self, section: Dict, result: Dict[str, Any]) -> None:
+        """Extract the molecular weight and formula from the 'Chemical and Physical Properties' section."""
+        properties = result['properties']
+        for subsection in section.get('Section', []):
+            if subsection.get('TOCHeading') == 'Computed Properties':
+                for info in subsection.get('Information', []):
+                    if 'Name' in info and 'Value' in info:
+                        if info['Name'] == 'Molecular Weight':
+                            properties['molecular_weight'] = info['Value'].get('String', '')
+                        elif info['Name'] == 'Molecular Formula':
+                            properties['molecular_formula'] = info['Value'].get('String', '')
+    
+    def _extract_taxonomy_section(self, section: Dict, result: Dict[str, Any]) -> None:
+        """Extract the classifications and taxonomy from the 'Chemical Taxonomy' section."""
+        for subsection in section.get('Section', []):
+            if subsection.get('TOCHeading') == 'Classification':
+                for info in subsection.get('Information', []):
+                    if 'Name' in info and 'Value' in info:
+                        if info['Name'] == 'Kingdom':
+                            result['taxonomy']['kingdom'] = info['Value'].get('String', '')
+                        elif info['Name'] == 'Super Class':
+                            result['classifications']['superclass'] = info['Value'].get('String', '')
+                        elif info['Name'] == 'Class':
+                            result['classifications']['class'] = info['Value'].get('String', '')
+    
+    def _extract_bioactivity_section(self, section: Dict, result: Dict[str, Any]) -> None:
+        """Extract the text of the 'Biological Test Results' section."""
+        bioactivity_text = self._extract_any_text_from_section(section)
+        if bioactivity_text:
+            result['bioactivity'].append(bioactivity_text)
+    
+    def _extract_literature_section(self, section: Dict, result: Dict[str, Any]) -> None:
+        """Extract the abstracts of the 'Literature' section."""
+        literature_data = self._extract_pubchem_literature_enhanced(section)
+        if literature_data:
+            result['literature'].extend(literature_data)
+    
     def _extract_any_text_from_section(self, section: Dict) -> str:
         """
         Extract any text content from a PubChem PUG-View section.
@@ -321,79 +360,303 @@ class PubChemRetriever:
         
         if 'Section' in section:
             for subsection in section['Section']:
-                subsection_name = subsection.get('TOCHeading', '')
-                
-                if subsection_name in ['Consolidated References', 'NLM Curated PubMed Citations', 
-                                     'Springer Nature References', 'Thieme References', 'Wiley References']:
-                    
+                if subsection.get('TOCHeading', '') in LITERATURE_SECTIONS:
                     if 'Information' in subsection:
                         for info in subsection['Information']:
-                            abstract = {}
-                            
-                            if 'Reference' in info:
-                                reference = info['Reference']
-                                abstract.update({
-                                    'title': reference.get('Title', ''),
-                                    'authors': ', '.join(reference.get('Author', [])),
-                                    'journal': reference.get('Journal', ''),
-                                    'year': str(reference.get('Year', '')),
-                                    'doi': reference.get('DOI', ''),
-                                    'pubmed_id': reference.get('PMID', ''),
-                                    'abstract': ''
-                                })
-                            
-                            if 'Value' in info:
-                                if 'StringWithMarkup' in info['Value']:
-                                    for markup in info['Value']['StringWithMarkup']:
-                                        if 'String' in markup:
-                                            if not abstract.get('abstract'):
-                                                abstract['abstract'] = markup['String']
-                                            else:
-                                                abstract['abstract'] += " " + markup['String']
-                                
-                                elif 'String' in info['Value']:
-                                    if not abstract.get('abstract'):
-                                        abstract['abstract'] = info['Value']['String']
-                            
-                            if 'Name' in info and not abstract.get('title'):
-                                abstract['title'] = info['Name']
-                            
-                            if abstract.get('title') or abstract.get('abstract') or abstract.get('pubmed_id'):
+                            abstract = _literature_abstract(info)
+                            if abstract:
                                 abstracts.append(abstract)
                                 
-                            if len(abstracts) >= 10:
+                            if len(abstracts) >= MAX_LITERATURE_ABSTRACTS:
                                 break
                 
-                if len(abstracts) >= 10:
+                if len(abstracts) >= MAX_LITERATURE_ABSTRACTS:
                     break
         
         return abstracts
     
-    def get_compound_data(self, cid: str) -> Dict[str, Any]:
+    def _load_record(self, cid: str) -> Dict[str, Any]:
+        """Load the PUG-View record of a CID from the cache, fetching it if it is not cached."""
+        data = self._load_from_cache(cid)
+        if not data:
+            data = self._fetch_pubchem_data(cid)
+        return data
+    
+    def _extract_compound_data(self, cid: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Get comprehensive compound data from PubChem by combining all available information.
+        Extract all compound data from a PUG-View record in a single walk over its sections.
         
         Args:
             cid (str): PubChem Compound ID
+            data (Dict[str, Any]): PUG-View record
             
         Returns:
             Dict[str, Any]: Comprehensive dictionary of compound data
         """
-        description_data = self.get_compound_description(cid)
-        classifications_data = self.get_compound_classifications(cid)
-        bioactivity_data = self.get_compound_bioactivity(cid)
-        literature_data = self.get_compound_literature(cid)
-        synonyms_data = self.get_compound_synonyms(cid)
+        extractors = {
+            'Names and Identifiers': self._extract_names_section,
+            'Chemical and Physical Properties': self._extract_properties_section,
+            'Chemical Taxonomy': self._extract_taxonomy_section,
+            'Biological Test Results': self._extract_bioactivity_section,
+            'Literature': self._extract_literature_section,
+        }
+        result = self._empty_compound_data()
+        for section in data['Record'].get('Section', []):
+            extractor = extractors.get(section.get('TOCHeading'))
+            if extractor is not None:
+                extractor(section, result)
         
+        # Clean up synonyms and remove duplicates
+        cleaned_synonyms = []
+        seen = set()
+        for syn in result['synonyms']:
+            cleaned = syn.strip()
+            if cleaned and cleaned.lower() not in seen and len(cleaned) < 100:
+                cleaned_synonyms.append(cleaned)
+                seen.add(cleaned.lower())
+        logger.info(f"Extracted {len(cleaned_synonyms)} unique synonyms from PubChem for CID {cid}")
+        
+        result['synonyms'] = cleaned_synonyms[:MAX_SYNONYMS]
+        result['literature'] = result['literature'][:MAX_LITERATURE_ENTRIES]
+        return result
+    
+    @staticmethod
+    def _empty_compound_data() -> Dict[str, Any]:
+        """Create the compound data structure for a CID without data."""
         return {
-            'description': description_data.get('description', ''),
-            'properties': description_data.get('properties', {}),
-            'classifications': classifications_data.get('classifications', {}),
-            'taxonomy': classifications_data.get('taxonomy', {}),
-            'bioactivity': bioactivity_data.get('bioactivity', []),
-            'literature': literature_data.get('literature', []),
-            'synonyms': synonyms_data.get('synonyms', [])
+            'description': '',
+            'properties': {},
+            'classifications': {},
+            'taxonomy': {},
+            'bioactivity': [],
+            'literature': [],
+            'synonyms': []
         }
+    
+    def get_compound_data(self, cid: str) -> Dict[str, Any]:
+        """
+        Get comprehensive compound data from PubChem by combining all available information.
+        
+        The PUG-View record is loaded and parsed once; the result is memoized per CID
+        for the rest of the run. Callers get a deep copy, so changing its lists or dicts
+        never reaches the memo. CIDs without valid data are not memoized, so they are
+        retried on the next call.
+        
+        Args:
+            cid (str): PubChem Compound ID
+            
+        Returns:
+            Dict[str, Any]: Comprehensive dictionary of compound data
+        """
+        cid = str(cid)
+        with _compound_data_lock:
+            memoized = _compound_data_memo.get(cid)
+        if memoized is not None:
+            return copy.deepcopy(memoized)
+        
+        data = self._load_record(cid)
+        if not data or 'Record' not in data:
+            logger.warning(f"No valid data found for CID {cid}")
+            return self._empty_compound_data()
+        
+        result = self._extract_compound_data(cid, data)
+        with _compound_data_lock:
+            _compound_data_memo[cid] = copy.deepcopy(result)
+        return result
+
+
+def _literature_abstract(info: Dict) -> Optional[Dict[str, str]]:
+    """
+    Build the abstract of one entry of a literature subsection.
+    
+    Args:
+        info (Dict): Information entry from PUG-View
+        
+    Returns:
+        Optional[Dict[str, str]]: Abstract, or None if the entry has no title, text or PubMed ID
+    """
+    abstract = {}
+    
+    if 'Reference' in info:
+        reference = info['Reference']
+        abstract.update({
+            'title': reference.get('Title', ''),
+            'authors': ', '.join(reference.get('Author', [])),
+            'journal': reference.get('Journal', ''),
+            'year': str(reference.get('Year', '')),
+            'doi': reference.get('DOI', ''),
+            'pubmed_id': reference.get('PMID', ''),
+            'abstract': ''
+        })
+    
+    if 'Value' in info:
+        if 'StringWithMarkup' in info['Value']:
+            for markup in info['Value']['StringWithMarkup']:
+                if 'String' in markup:
+                    if not abstract.get('abstract'):
+                        abstract['abstract'] = markup['String']
+                    else:
+                        abstract['abstract'] += " " + markup['String']
+        
+        elif 'String' in info['Value']:
+            if not abstract.get('abstract'):
+                abstract['abstract'] = info['Value']['String']
+    
+    if 'Name' in info and not abstract.get('title'):
+        abstract['title'] = info['Name']
+    
+    if abstract.get('title') or abstract.get('abstract') or abstract.get('pubmed_id'):
+        return abstract
+    return None
+
+
+def _prune_information(info: Dict) -> Dict:
+    """Keep the keys of an Information entry that the extractors read, dropping markup details."""
+    pruned = {key: info[key] for key in INFORMATION_KEYS if key in info and key != 'Value'}
+    if isinstance(info.get('Value'), dict):
+        value = {key: info['Value'][key] for key in VALUE_KEYS if key in info['Value']}
+        if 'StringWithMarkup' in value:
+            value['StringWithMarkup'] = [
+                {'String': markup['String']} if 'String' in markup else {}
+                for markup in value['StringWithMarkup']
+            ]
+        pruned['Value'] = value
+    elif 'Value' in info:
+        pruned['Value'] = info['Value']
+    return pruned
+
+
+def _prune_section(section: Dict, subsections: Optional[tuple] = None) -> Dict:
+    """
+    Keep the keys of a section that the extractors read, recursively.
+    
+    Args:
+        section (Dict): PUG-View section
+        subsections (Optional[tuple]): TOCHeadings of the direct subsections to keep; None keeps all
+        
+    Returns:
+        Dict: Pruned section
+    """
+    pruned = {key: section[key] for key in SECTION_KEYS if key in section}
+    if 'Information' in pruned:
+        pruned['Information'] = [_prune_information(info) for info in pruned['Information']]
+    if 'Section' in pruned:
+        pruned['Section'] = [
+            _prune_section(subsection) for subsection in pruned['Section']
+            if subsections is None or subsection.get('TOCHeading') in subsections
+        ]
+    return pruned
+
+
+def _prune_literature_section(section: Dict) -> Dict:
+    """
+    Keep the literature subsections the extractor reads, up to the entry where it stops.
+    
+    The extractor reads at most MAX_LITERATURE_ABSTRACTS abstracts across all subsections,
+    so later entries (often thousands of references) are dropped.
+    """
+    pruned = {'TOCHeading': section.get('TOCHeading')}
+    if 'Section' not in section:
+        return pruned
+    
+    pruned['Section'] = []
+    count = 0
+    for subsection in section['Section']:
+        if count >= MAX_LITERATURE_ABSTRACTS:
+            break
+        if subsection.get('TOCHeading', '') not in LITERATURE_SECTIONS:
+            continue
+        kept = {'TOCHeading': subsection.get('TOCHeading')}
+        if 'Information' in subsection:
+            kept['Information'] = []
+            for info in subsection['Information']:
+                kept['Information'].append(_prune_information(info))
+                if _literature_abstract(info):
+                    count += 1
+                if count >= MAX_LITERATURE_ABSTRACTS:
+                    break
+        pruned['Section'].append(kept)
+    return pruned
+
+
+def prune_pug_view_record(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a PUG-View record to the parts get_compound_data reads.
+    
+    The pruned record yields exactly the same compound data as the full one.
+    
+    Args:
+        data (Dict[str, Any]): Full (or heading-filtered) PUG-View record
+        
+    Returns:
+        Dict[str, Any]: Pruned record, marked with the PRUNE_VERSION
+    """
+    record = data['Record']
+    pruned_record = {key: record[key] for key in RECORD_KEYS if key in record}
+    sections = []
+    for section in record.get('Section', []):
+        heading = section.get('TOCHeading')
+        if heading not in USED_HEADINGS:
+            continue
+        if heading == 'Literature':
+            sections.append(_prune_literature_section(section))
+        else:
+            sections.append(_prune_section(section, USED_SUBSECTIONS.get(heading)))
+    pruned_record['Section'] = sections
+    return {'Record': pruned_record, PRUNE_VERSION_KEY: PRUNE_VERSION}
+
+
+def migrate_pubchem_cache(cache_dir: str = PUBCHEM_CACHE_DIR) -> Dict[str, int]:
+    """
+    Prune the cached PUG-View records of a cache directory in place.
+    
+    Records that are already pruned with the current PRUNE_VERSION are skipped, so an
+    interrupted migration can simply be run again.
+    
+    Args:
+        cache_dir (str): Directory with pubchem_{cid}.json files
+        
+    Returns:
+        Dict[str, int]: Number of files migrated, skipped and failed, and bytes before and after
+    """
+    start_time = time.time()
+    stats = {'migrated': 0, 'skipped': 0, 'failed': 0, 'bytes_before': 0, 'bytes_after': 0}
+    retriever = PubChemRetriever(cache_dir=cache_dir)
+    
+    for path in sorted(glob.glob(os.path.join(cache_dir, 'pubchem_*.json'))):
+        cid = os.path.basename(path)[len('pubchem_'):-len('.json')]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading cached data for CID {cid}: {e}")
+            stats['failed'] += 1
+            continue
+        if data.get(PRUNE_VERSION_KEY) == PRUNE_VERSION or 'Record' not in data:
+            stats['skipped'] += 1
+            continue
+        
+        stats['bytes_before'] += os.path.getsize(path)
+        if not retriever._save_to_cache(cid, prune_pug_view_record(data)):
+            stats['failed'] += 1
+            continue
+        stats['bytes_after'] += os.path.getsize(path)
+        stats['migrated'] += 1
+        if stats['migrated'] % 1000 == 0:
+            logger.info(f"Pruned {stats['migrated']} cached PubChem records")
+    
+    ratio = stats['bytes_before'] / stats['bytes_after'] if stats['bytes_after'] else 0
+    logger.info(f"Pruned {stats['migrated']} cached PubChem records in {cache_dir} "
+                f"({stats['skipped']} already pruned, {stats['failed']} failed) "
+                f"in {time.time() - start_time:.1f} seconds: {stats['bytes_before'] / 1e6:.1f} MB -> "
+                f"{stats['bytes_after'] / 1e6:.1f} MB ({ratio:.1f}x)")
+    return stats
+
+
+def clear_compound_data_cache() -> None:
+    """Forget the memoized compound data, e.g. after the PubChem cache files changed."""
+    with _compound_data_lock:
+        _compound_data_memo.clear()
 
 def get_compound_description(cid: str) -> Dict[str, Any]:
     """Wrapper function for backward compatibility."""
@@ -419,3 +682,26 @@ def get_compound_synonyms(cid: str) -> Dict[str, Any]:
     """Wrapper function for backward compatibility."""
     retriever = PubChemRetriever()
     return retriever.get_compound_synonyms(cid)
+
+
+def main():
+    """
+    Main entry point for the script.
+    """
+    parser = argparse.ArgumentParser(description="Maintain the PubChem PUG-View cache.")
+    parser.add_argument("--cache-dir", default=PUBCHEM_CACHE_DIR, help="Directory of the cached PUG-View records")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Prune the cached records to the sections that are read")
+    args = parser.parse_args()
+
+    try:
+        stats = migrate_pubchem_cache(args.cache_dir)
+        return 1 if stats['failed'] else 0
+
+    except Exception as e:
+        logger.error(f"Error running PubChem cache command: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,9 @@ import os
 import sys
 from pathlib import Path
 
-from metabolite_data_enricher import MetaboliteDataEnricher
+from metabolite_data_enricher import MetaboliteDataEnricher, DEFAULT_INPUT_CSV, is_full_enriched_output
+from hmdb_prefetch import prefetch_hmdb_xml, read_hmdb_ids
+from hmdb_xml_extractor import EXTRACTABLE_FIELDS
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +27,12 @@ def main():
     parser.add_argument('--single-metabolite', type=str, help='Process only a single metabolite by name')
     parser.add_argument('--limit', type=int, help='Limit the number of metabolites to process')
     parser.add_argument('--cache-dir', type=str, default='cache', help='Directory for caching API responses')
+    parser.add_argument('--workers', type=int, default=1, help='Number of metabolites to enrich concurrently')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted batch run from its journal')
+    parser.add_argument('--parallel-sources', action='store_true', help='Fetch the data sources of each metabolite concurrently')
+    parser.add_argument('--prefetch-hmdb', action='store_true', help='Download all missing HMDB XML files concurrently before enriching')
+    parser.add_argument('--race-cid-strategies', action='store_true', help='Run the PubChem CID search strategies of each metabolite concurrently')
+    parser.add_argument('--hmdb-fields', nargs='+', choices=EXTRACTABLE_FIELDS, metavar='FIELD', help='Only parse these HMDB XML fields (e.g. synonyms)')
     
     args = parser.parse_args()
     
@@ -32,6 +40,10 @@ def main():
     if not args.single_metabolite and not args.input:
         parser.error('Either --single-metabolite or --input must be provided')
 
+    if args.hmdb_fields and is_full_enriched_output(os.path.join(args.output_dir, 'metabolite_enriched_data.json')):
+        parser.error(f'{args.output_dir} holds records enriched from every HMDB field; '
+                     f'write the --hmdb-fields run to another --output-dir')
+
     # Create output and cache directories
     os.makedirs(args.output_dir, exist_ok=True)
     os.makedirs(args.cache_dir, exist_ok=True)
@@ -39,7 +51,11 @@ def main():
     # Initialize enricher
     enricher = MetaboliteDataEnricher(
         cache_file=os.path.join(args.cache_dir, 'enricher_cache.pkl'),
-        refresh_cache=True
+        refresh_cache=True,
+        workers=args.workers,
+        parallel_sources=args.parallel_sources,
+        race_cid_strategies=args.race_cid_strategies,
+        hmdb_fields=args.hmdb_fields
     )
     
     # Set output directory
@@ -49,7 +65,7 @@ def main():
         if args.single_metabolite:
             # Single metabolite mode
             logger.info(f"Processing single metabolite: {args.single_metabolite}")
-            result = enricher.process_single_metabolite(args.single_metabolite)
+            result = enricher.process_single_metabolite(args.single_metabolite, csv_file=args.input or DEFAULT_INPUT_CSV)
             if result:
                 logger.info(f"Successfully processed {args.single_metabolite}")
             else:
@@ -57,9 +73,13 @@ def main():
         else:
             # Batch mode
             logger.info(f"Processing metabolites from {args.input}")
+            if args.prefetch_hmdb:
+                prefetch_hmdb_xml(read_hmdb_ids(args.input, args.limit), lookup=enricher._get_hmdb_lookup())
             enricher.process_metabolites_from_csv(
                 args.input,
-                sample_size=args.limit
+                sample_size=args.limit,
+                journal_file=os.path.join(args.cache_dir, 'enrichment_journal.jsonl'),
+                resume=args.resume
             )
             # Save enriched data to combined JSON files in the specified output directory
             enricher.save_enriched_data_to_json(os.path.join(args.output_dir, 'metabolite_enriched_data.json'))
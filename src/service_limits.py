@@ -0,0 +1,183 @@
+"""
+Per-service limits for outbound HTTP calls.
+
+Every network request to an upstream service (HMDB, PubChem, OpenRouter) is wrapped
+in ``service_call(host)``, which enforces two limits per host:
+
+- a concurrency cap, so a pool of enrichment workers never opens more in-flight
+  requests to a service than it tolerates, regardless of the worker count;
+- a token-bucket rate limit, so a token is only spent when a real request is made
+  (cache hits and local file reads cost nothing) and idle time builds up burst
+  capacity instead of being lost to fixed sleeps.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Upstream hosts
+HMDB_HOST = 'hmdb.ca'
+PUBCHEM_HOST = 'pubchem.ncbi.nlm.nih.gov'
+OPENROUTER_HOST = 'openrouter.ai'
+
+# Maximum number of in-flight requests per host
+SERVICE_CONCURRENCY = {
+    HMDB_HOST: 2,
+    PUBCHEM_HOST: 5,       # PubChem allows at most 5 requests per second
+    OPENROUTER_HOST: 4
+}
+DEFAULT_CONCURRENCY = 2
+
+# Token-bucket rate limits per host: (requests per second, burst capacity)
+SERVICE_RATE_LIMITS = {
+    HMDB_HOST: (0.5, 5),
+    PUBCHEM_HOST: (5.0, 5),  # PubChem usage policy: no more than 5 requests per second
+    OPENROUTER_HOST: (1.0, 4)
+}
+DEFAULT_RATE_LIMIT = (1.0, 1)
+
+_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_buckets: Dict[str, 'TokenBucket'] = {}
+_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the bucket full, so a fresh run can start with a burst.
+
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens the bucket can hold
+        """
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"Invalid token bucket settings: rate={rate}, capacity={capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last update."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens if available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before retrying
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Block until the tokens are available and take them.
+
+        Returns:
+            float: Total seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+def _get_bucket(host: str) -> TokenBucket:
+    """Get (or lazily create) the token bucket for a host."""
+    bucket = _buckets.get(host)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.get(host)
+            if bucket is None:
+                rate, capacity = SERVICE_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+                bucket = TokenBucket(rate, capacity)
+                _buckets[host] = bucket
+    return bucket
+
+
+def _get_semaphore(host: str) -> threading.BoundedSemaphore:
+    """Get (or lazily create) the concurrency semaphore for a host."""
+    semaphore = _semaphores.get(host)
+    if semaphore is None:
+        with _lock:
+            semaphore = _semaphores.get(host)
+            if semaphore is None:
+                limit = SERVICE_CONCURRENCY.get(host, DEFAULT_CONCURRENCY)
+                semaphore = threading.BoundedSemaphore(limit)
+                _semaphores[host] = semaphore
+    return semaphore
+
+
+def set_service_concurrency(host: str, limit: int) -> None:
+    """
+    Override the concurrency cap for a host.
+
+    Must be called before any worker starts issuing requests to that host.
+
+    Args:
+        host (str): Upstream host name (e.g. 'pubchem.ncbi.nlm.nih.gov')
+        limit (int): Maximum number of concurrent requests
+    """
+    if limit < 1:
+        raise ValueError(f"Concurrency limit for {host} must be at least 1, got {limit}")
+    with _lock:
+        SERVICE_CONCURRENCY[host] = limit
+        _semaphores[host] = threading.BoundedSemaphore(limit)
+    logger.debug(f"Concurrency limit for {host} set to {limit}")
+
+
+def set_service_rate_limit(host: str, rate: float, capacity: float) -> None:
+    """
+    Override the token-bucket rate limit for a host.
+
+    Args:
+        host (str): Upstream host name
+        rate (float): Requests per second
+        capacity (float): Burst capacity (maximum tokens saved up while idle)
+    """
+    bucket = TokenBucket(rate, capacity)
+    with _lock:
+        SERVICE_RATE_LIMITS[host] = (rate, capacity)
+        _buckets[host] = bucket
+    logger.debug(f"Rate limit for {host} set to {rate}/s (burst {capacity})")
+
+
+@contextmanager
+def service_call(host: str) -> Iterator[None]:
+    """
+    Context manager for a single network request to a host.
+
+    Spends one token from the host's rate-limit bucket (waiting if the bucket is
+    empty), then holds one of the host's concurrency slots for the duration of
+    the request.
+
+    Args:
+        host (str): Upstream host name
+    """
+    waited = _get_bucket(host).acquire()
+    if waited:
+        logger.debug(f"Rate limited request to {host} for {waited:.2f} seconds")
+    semaphore = _get_semaphore(host)
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
@@ -0,0 +1,147 @@
+"""
+Chemical synonym filter.
+
+Filters the synonym lists of HMDB records down to chemical names, dropping
+terms that describe taxonomy, biology, sources or processes (e.g. 'soy flora',
+'blood serum') rather than the compound.
+
+The rules are compiled once: all skip terms are combined into a single regex,
+shaped as a trie of the terms so the engine only follows branches that match
+the text so far. Each synonym costs one scan of its lowercased text instead of
+one substring search per term. A synonym is kept when it is 2 to 100
+characters long and contains no skip term, and at most MAX_SYNONYMS synonyms
+are kept per record.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Maximum number of synonyms kept per record
+MAX_SYNONYMS = 20
+MIN_SYNONYM_LENGTH = 2
+MAX_SYNONYM_LENGTH = 100
+
+# Substrings (matched in the lowercased synonym) that indicate non-synonym content
+SKIP_TERMS = frozenset({
+    # Taxonomic terms
+    'flora', 'fauna', 'kingdom', 'class', 'family', 'species', 'genus',
+    'gramineae', 'papilionoideae', 'legume', 'soy', 'cucurbits', 'gourds',
+    # Medical/biological terms
+    'disease', 'leukaemia', 'digestion', 'stool', 'fecal', 'faecal', 'faeces',
+    'cytoplasm', 'cytoplasma', 'cell', 'tissue', 'organ', 'enzyme', 'protein',
+    # General descriptive terms
+    'extract', 'powder', 'liquid', 'solution', 'mixture', 'derivative',
+    'sample', 'preparation', 'fraction', 'component',
+    # Locations/sources
+    'plant', 'animal', 'human', 'bacterial', 'fungal', 'blood', 'urine',
+    'serum', 'plasma', 'saliva', 'cerebrospinal', 'csf',
+    # Process terms
+    'metabolism', 'synthesis', 'degradation', 'pathway', 'cycle',
+    # Biological roles/effects
+    'inhibitor', 'activator', 'substrate', 'cofactor', 'vitamin',
+    'hormone', 'neurotransmitter', 'receptor'
+})
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """
+    Regex matching any of the terms, built as a trie ('cell|cycle' -> 'c(?:ell|ycle)').
+
+    Only whether some term occurs matters, so a term that extends a shorter one
+    ('cytoplasma' after 'cytoplasm') is dropped.
+
+    Args:
+        terms (Iterable[str]): Literal terms
+
+    Returns:
+        str: Regex pattern
+    """
+    trie: Dict[str, dict] = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    # No terms: a pattern that never matches
+    return build(trie) if trie else '(?!)'
+
+
+class SynonymFilter:
+    """Compiled synonym filtering rules."""
+
+    def __init__(self, skip_terms: Iterable[str] = SKIP_TERMS, max_synonyms: Optional[int] = MAX_SYNONYMS):
+        """
+        Compile the rules.
+
+        Args:
+            skip_terms (Iterable[str]): Lowercase substrings that disqualify a synonym
+            max_synonyms (Optional[int]): Maximum number of synonyms kept per list; None for no limit
+        """
+        self._skip = re.compile(_trie_pattern(skip_terms)).search
+        self.max_synonyms = max_synonyms
+
+    def is_chemical_synonym(self, synonym: str) -> bool:
+        """
+        Check a single synonym against the rules.
+
+        Args:
+            synonym (str): Synonym to check
+
+        Returns:
+            bool: True if the synonym is kept
+        """
+        return (
+            bool(synonym)
+            and MIN_SYNONYM_LENGTH <= len(synonym) <= MAX_SYNONYM_LENGTH
+            and self._skip(synonym.lower()) is None
+        )
+
+    def filter(self, synonyms: Optional[List[str]]) -> List[str]:
+        """
+        Filter one synonym list.
+
+        Args:
+            synonyms (Optional[List[str]]): Synonyms of a record, in document order
+
+        Returns:
+            List[str]: Kept synonyms in their original order, at most max_synonyms of them
+        """
+        if not synonyms:
+            return []
+
+        skip = self._skip
+        limit = self.max_synonyms
+        filtered = []
+        for synonym in synonyms:
+            if not synonym or not MIN_SYNONYM_LENGTH <= len(synonym) <= MAX_SYNONYM_LENGTH:
+                continue
+            if skip(synonym.lower()) is not None:
+                continue
+            filtered.append(synonym)
+            # Later synonyms cannot make it into the list any more
+            if limit is not None and len(filtered) >= limit:
+                break
+        return filtered
+
+    def filter_many(self, synonym_lists: Iterable[Optional[List[str]]]) -> List[List[str]]:
+        """
+        Filter the synonym lists of many records at once.
+
+        Args:
+            synonym_lists (Iterable[Optional[List[str]]]): One synonym list per record
+
+        Returns:
+            List[List[str]]: Filtered lists, in the same order
+        """
+        return [self.filter(synonyms) for synonyms in synonym_lists]
+
+
+# Shared filter with the default rules
+CHEMICAL_SYNONYM_FILTER = SynonymFilter()